@@ -1,74 +1,222 @@
+import startup  # First, so that its fallback launch time is as early as possible
+import argparse
 import keyboard
 import socket
+import threading
 import time
 
+import settings
+from protocol import (DOWN, LEFT, MSG_ACK, MSG_INPUT_STATE, MSG_JOIN, MSG_PAUSE, MSG_RESTART, MSG_SNAPSHOT, RIGHT,
+                      UP, MessageDecoder, encode_frame)
+from snapshot import INTERPOLATION_DELAY, SnapshotReceiver
+from stats import percentile
+from udp_transport import RECV_SIZE, InputPacketSender, NetworkConditions
 
-def client_program():
+# Movement keys and their direction bits
+KEY_DIRECTIONS = {'w': UP, 's': DOWN, 'a': LEFT, 'd': RIGHT}
+
+
+# Turns keyboard hook events into protocol frames and sends them as soon as the key state changes
+class InputSender:
+    def __init__(self, client_socket):
+        self.client_socket = client_socket
+        self.lock = threading.Lock()  # Hook callbacks run on the keyboard library's thread
+        self.held_keys = set()
+        self.directions = 0
+        self.latencies = []  # Seconds from the key event to the frame being handed to the socket
+
+    def on_key(self, event):
+        name = (event.name or '').lower()
+        pressed = event.event_type == keyboard.KEY_DOWN
+
+        with self.lock:
+            if pressed:
+                if name in self.held_keys:
+                    return  # Auto-repeat of a key that is already down
+                self.held_keys.add(name)
+            else:
+                self.held_keys.discard(name)
+
+            command = None
+            if name in KEY_DIRECTIONS:
+                # Held movement keys as one bitmask (diagonals are two bits)
+                directions = 0
+                for key, bit in KEY_DIRECTIONS.items():
+                    if key in self.held_keys:
+                        directions |= bit
+                if directions != self.directions:
+                    self.directions = directions
+                    command = (MSG_INPUT_STATE, directions)
+            elif pressed and name == 'q':
+                print("Pausing the game...")
+                command = (MSG_PAUSE, 0)
+            elif pressed and name == 'r':
+                command = (MSG_RESTART, 0)  # restart game
+
+            if command is None:
+                return
+            try:
+                self.send_command(*command)
+            except OSError:
+                return  # The main thread notices the closed connection
+            self.latencies.append(time.time() - event.time)
+
+    def send_command(self, msg_type, value=0):
+        # One frame to the server (on_key calls this with the lock held)
+        self.client_socket.sendall(encode_frame(msg_type, value))
+
+    def send_ack(self, seq):
+        # Acknowledge an applied snapshot, so the server sends the next ones as deltas against it
+        with self.lock:
+            self.client_socket.sendall(encode_frame(MSG_ACK, seq & 0xFFFF))
+
+    def report(self):
+        if not self.latencies:
+            return
+        samples = sorted(self.latencies)
+        print(f"Input-to-send latency over {len(samples)} messages: "
+              f"p50 {percentile(samples, 0.5) * 1000:.3f} ms, "
+              f"p99 {percentile(samples, 0.99) * 1000:.3f} ms, "
+              f"max {samples[-1] * 1000:.3f} ms")
+
+
+# Sends the same input over UDP, in sequenced packets that repeat the newest frames (udp_transport.py)
+class UdpInputSender(InputSender):
+    def __init__(self, packets):
+        super().__init__(packets.sock)
+        self.packets = packets
+
+    def send_command(self, msg_type, value=0):
+        self.packets.send(msg_type, value)
+
+    def send_ack(self, seq):
+        self.packets.send_frame(encode_frame(MSG_ACK, seq & 0xFFFF))
+
+
+# Apply the server's snapshots until it closes the connection
+def receive_snapshots(client_socket, sender, receiver, recv_size=4096):
+    decoder = MessageDecoder()
+    while True:
+        try:
+            data = client_socket.recv(recv_size)
+        except OSError:
+            return  # Closed on our side
+        if not data:
+            return
+        for msg_type, payload in decoder.feed(data):
+            if msg_type == MSG_SNAPSHOT:
+                snapshot = receiver.apply(payload, time.perf_counter())
+                if snapshot is not None:
+                    try:
+                        sender.send_ack(snapshot.seq)
+                    except OSError:
+                        return
+
+
+def report_snapshots(receiver):
+    if receiver.received:
+        print(f"Received {receiver.received} snapshots ({receiver.full} full), "
+              f"{receiver.received_bytes / receiver.received:.0f} bytes each on average")
+
+
+def report_startup(event, udp):
+    # Print the time from process launch to event, the first time it happens
+    elapsed = startup.mark(event)
+    if elapsed is not None:
+        print(f"Startup: {event} after {elapsed * 1e3:.0f} ms ({'UDP' if udp else 'TCP'})")
+
+
+def client_program(room=None, render=False, interpolation_delay=INTERPOLATION_DELAY, udp=False, conditions=None,
+                   host=settings.DEFAULT_CONNECT_HOST, port=settings.DEFAULT_PORT):
     print("Bucket Catch Game - Client")
     print("Trying to connect to server...")
-    host = "192.168.68.50"  # Updated to match server's IP
-    port = 5000  # socket server port number
 
-    client_socket = socket.socket()  # instantiate
-    
+    receiver = SnapshotReceiver(interpolation_delay=interpolation_delay)
+    resends_stopped = threading.Event()
+    if udp:
+        client_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        packets = InputPacketSender(client_socket, (host, port), conditions)
+        sender = UdpInputSender(packets)
+        recv_size = RECV_SIZE
+    else:
+        client_socket = socket.socket()  # instantiate
+        client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # Send small frames immediately
+        sender = InputSender(client_socket)
+        recv_size = 4096
+
     try:
-        client_socket.connect((host, port))  # connect to the server
-        print("Connected to server!")
-        print("Controls: WASD to move bucket, Q to pause")
+        if udp:
+            # There is no connection; the first packet introduces us to the server
+            packets.send(MSG_INPUT_STATE, 0)
+            threading.Thread(target=packets.run_resends, args=(resends_stopped,), daemon=True).start()
+            print(f"Sending input over UDP to {host}:{port}")
+        else:
+            client_socket.connect((host, port))  # connect to the server
+            print("Connected to server!")
+        report_startup('connected', udp)
         
-        while True:
-            # Check for quit key
-            if keyboard.is_pressed('q'):
-                print("Pausing the game...")
-                client_socket.send('q'.encode())
-                time.sleep(0.05)
-                
-            # Check for combined movement keys (diagonals)
-            # Using a more efficient approach to handle diagonals
-            up = keyboard.is_pressed('w')
-            down = keyboard.is_pressed('s')
-            left = keyboard.is_pressed('a')
-            right = keyboard.is_pressed('d')
-            
-            # Send combined movement commands
-            if up and left:
-                client_socket.send('ul'.encode())  # up-left diagonal
-            elif up and right:
-                client_socket.send('ur'.encode())  # up-right diagonal
-            elif down and left:
-                client_socket.send('dl'.encode())  # down-left diagonal
-            elif down and right:
-                client_socket.send('dr'.encode())  # down-right diagonal
-            # Single direction movements
-            elif up:
-                client_socket.send('w'.encode())  # move up
-            elif down:
-                client_socket.send('s'.encode())  # move down
-            elif left:
-                client_socket.send('a'.encode())  # move left
-            elif right:
-                client_socket.send('d'.encode())  # move right
-                
-            # Add a small delay after any movement command
-            if up or down or left or right:
-                time.sleep(0.05)
-
-            # Check for restart key
-            if keyboard.is_pressed('r'):
-                client_socket.send('r'.encode())  # restart game
-                time.sleep(0.05)  # Longer delay for restart to prevent multiple triggers
-                
-            # Small sleep to reduce CPU usage
-            time.sleep(0.01)
-            
+        # Room servers (rooms.py) host many games; pick one before sending input
+        if room is not None:
+            sender.send_command(MSG_JOIN, room)
+            print(f"Joined room {room}")
+        print("Controls: WASD to move bucket, Q to pause")
+
+        # Key presses and releases are sent from the keyboard hook as they happen
+        keyboard.hook(sender.on_key)
+
+        if render:
+            # Receive on a background thread and draw the game in a pygame window on this one
+            import client_renderer
+            receiving = threading.Thread(target=receive_snapshots, args=(client_socket, sender, receiver, recv_size),
+                                         daemon=True)
+            receiving.start()
+            client_renderer.run(receiver, receiving.is_alive)
+            if not receiving.is_alive():
+                print("Server closed the connection")
+        else:
+            # Keep the snapshots coming (and acknowledged) until the server closes the connection
+            receive_snapshots(client_socket, sender, receiver, recv_size)
+            print("Server closed the connection")
+
     except ConnectionRefusedError:
         print("Could not connect to server. Make sure the server is running.")
+    except KeyboardInterrupt:
+        pass
     except Exception as e:
         print(f"An error occurred: {e}")
     finally:
+        keyboard.unhook_all()
+        resends_stopped.set()
         client_socket.close()  # close the connection
         print("Connection closed")
+        sender.report()
+        report_snapshots(receiver)
+        if conditions is not None:
+            print(f"Simulated network dropped {conditions.dropped} of {conditions.sent} packets")
 
 
 if __name__ == '__main__':
-    client_program()
+    parser = argparse.ArgumentParser(description="Bucket Catch Game client")
+    parser.add_argument("--config", default=None,
+                        help=f"settings file with a [client] host and port (default: {settings.CONFIG_FILE} if present)")
+    parser.add_argument("--host", default=None,
+                        help=f"server address to connect to (default: {settings.DEFAULT_CONNECT_HOST})")
+    parser.add_argument("--port", type=int, default=None,
+                        help=f"server port (default: {settings.DEFAULT_PORT})")
+    parser.add_argument("--room", type=int, default=None, help="room to join on a multi-room server")
+    parser.add_argument("--render", action="store_true", help="show the game from the server's snapshots")
+    parser.add_argument("--interpolation-delay", type=float, default=INTERPOLATION_DELAY,
+                        help="seconds to render behind the newest snapshot (default: %(default)s)")
+    parser.add_argument("--udp", action="store_true", help="send input over UDP (the server needs --udp too)")
+    parser.add_argument("--loss", type=float, default=0.0,
+                        help="simulated loss rate of packets sent over UDP, e.g. 0.1 (default: %(default)s)")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="simulated one-way latency in seconds for packets sent over UDP (default: %(default)s)")
+    parser.add_argument("--jitter", type=float, default=0.0,
+                        help="simulated extra random latency in seconds over UDP (default: %(default)s)")
+    args = parser.parse_args()
+    conditions = None
+    if args.loss or args.latency or args.jitter:
+        conditions = NetworkConditions(args.loss, args.latency, args.jitter)
+    host, port = settings.address(settings.load_config(args.config), 'client', args.host, args.port)
+    client_program(args.room, args.render, args.interpolation_delay, args.udp, conditions, host, port)
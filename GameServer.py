@@ -1,81 +1,129 @@
+import startup  # First, so that its fallback launch time is as early as possible
+import argparse
 import threading
 import pygame
-import socket
 import sys
-import random
 import time
 import math
 
-# Game variables
-SCREEN_WIDTH = 800
-SCREEN_HEIGHT = 600
-BORDER_WIDTH = SCREEN_WIDTH // 6  # 1/6 of screen width for each border
-GAME_AREA_WIDTH = SCREEN_WIDTH - (2 * BORDER_WIDTH)  # 4/6 of screen width for game area
-BUCKET_WIDTH = 80
-BUCKET_HEIGHT = 60
-OBJECT_SIZE = 30
-INITIAL_OBJECT_SPEED = 2
-INITIAL_BUCKET_SPEED = 8
-DIFFICULTY_INCREASE_RATE = 0.1  # Speed increase per second
-MAX_LIVES = 3
-
-# Upgrade variables
-upgrade_points = 0
-bucket_size_level = 1
-bucket_speed_level = 1
-lives_level = 1
-catch_value_level = 1
-
-# Shared game state variables
-bucket_x = BORDER_WIDTH + (GAME_AREA_WIDTH // 2) - (BUCKET_WIDTH // 2)  # Center in game area
-bucket_y = SCREEN_HEIGHT - 100
-target_bucket_x = bucket_x  # For smooth lerp movement
-target_bucket_y = bucket_y
-game_score = 0
-prv_score = 0
-high_score = 0
-game_over = False
-objects = []  # List to store falling objects (x, y, speed)
-object_speed_multiplier = 1.0
-bucket_speed_multiplier = 1.0
-lives = MAX_LIVES
-last_spawn_time = 0
-game_start_time = 0
-
-restart_requested = False
-paused = False
-
-# Lock for thread-safe access to shared variables
-game_lock = threading.Lock()
+import game_log
+import settings
+import shading
+from command_queue import CommandQueue
+from dirty_rects import DirtyRectRenderer
+from frame_profiler import METRICS_INTERVAL, FrameProfiler, MetricsExporter, ProfilerOverlay
+from game_background import render_game_background
+from leaderboard import Leaderboard
+from network_server import InputServer
+from progress_store import LOAD_TIMEOUT, PROGRESS_DB, ProgressStore
+from protocol import MSG_ACK, MSG_INPUT_STATE, MSG_PAUSE, MSG_PING, MSG_RESTART, describe_frame, encode_pong
+from render_cache import PHASE_STEPS, SpriteCache, SurfaceCache, quantize_phase
+from simulation import (BORDER_WIDTH, DEFAULT_TICK_RATE, OBJECT_SIZE, SCREEN_HEIGHT, SCREEN_WIDTH,
+                        FixedTimestep, GameSimulation, PlayerProgress)
+from replay import Recorder
+from snapshot import DEFAULT_SNAPSHOT_RATE, SnapshotHistory
+from udp_transport import NetworkConditions, UdpInputServer, UdpPeer
+from text_cache import get_font, render_text
+
+# Game variables (the game rules and their constants live in simulation.py)
+BACKGROUND_CACHE_SIZE = 2 * PHASE_STEPS  # Room for one full wave period of both game and menu backgrounds
+SPRITE_CACHE_SIZE = 16  # Object colors plus a few bucket sizes
+DIRTY_RECT_RENDERING = False  # Only push changed regions to the display (enable with --dirty-rects)
+TICK_RATE = DEFAULT_TICK_RATE  # Fixed simulation ticks per second (--tick-rate)
+FRAME_RATE = 60  # Rendered frames per second cap, e.g. 120 or 144 for fast displays (--fps)
+SNAPSHOT_RATE = DEFAULT_SNAPSHOT_RATE  # State snapshots broadcast to clients per second, 0 for none (--snapshot-rate)
+USE_UDP = False  # Serve clients over UDP instead of TCP (--udp)
+NETWORK_CONDITIONS = None  # Simulated loss and latency for packets sent over UDP (--loss, --latency, --jitter)
+INPUT_LOG_RATE = game_log.INPUT_LOG_RATE  # Input traffic lines per second at debug level (--log-input-rate)
+SERVER_HOST = settings.DEFAULT_BIND_HOST  # Address the server listens on (--host or the config file)
+SERVER_PORT = settings.DEFAULT_PORT  # Port number above 1024 (--port or the config file)
+RECORD_DIR = None  # Directory to record every game to, for replay.py (--record)
+PROFILE_OVERLAY = False  # Show the frame profiler overlay from the start; F3 toggles it (--profile-overlay)
+PLAYER_NAME = 'player'  # Whose progress is loaded and saved (--player)
+
+log = game_log.get_logger('server')
+
+# Upgrades, upgrade points and high score
+progress = PlayerProgress()
+
+# Saves progress to disk from a background thread; None when progress is not persisted (--no-save)
+progress_store = None
+progress_restored = False  # Whether the saved progress has been applied, so saving cannot overwrite it
+
+# Every player's best score, filled from the progress store in the background
+leaderboard = Leaderboard()
+LEADERBOARD_SHOWN = 5  # Top entries on the game over screen
+
+# Game state, only ever changed by the game thread
+sim = GameSimulation(progress)
+
+# Client commands from the server thread, applied by the game thread once per tick (no lock needed)
+commands = CommandQueue()
+
+# Immutable copy of the game after the game thread's latest ticks; the server thread reads this
+# for snapshots instead of touching sim
+current_state = sim.state()
+
+# Recent snapshots sent to clients, for delta encoding (only used by the server thread)
+snapshots = SnapshotHistory()
+
+# Recording of the current game's seed and commands, when RECORD_DIR is set (game thread only)
+recorder = None
+
+# Per-phase timing of the game thread's frames, for the F3 overlay and the metrics export
+profiler = FrameProfiler()
+
+# Pre-rendered background layers, keyed by quantized wave phase
+background_cache = SurfaceCache(BACKGROUND_CACHE_SIZE)
+
+# Pre-rendered object and bucket sprites, keyed by color and size
+sprite_cache = SpriteCache(SPRITE_CACHE_SIZE)
 
 def reset_game():
     # """Reset the game state for a new game."""
-    global bucket_x, bucket_y, target_bucket_x, target_bucket_y, game_score, game_over, objects
-    global object_speed_multiplier, bucket_speed_multiplier, lives
-    global last_spawn_time, game_start_time, restart_requested
-    
-    with game_lock:
-        bucket_x = BORDER_WIDTH + (GAME_AREA_WIDTH // 2) - (BUCKET_WIDTH // 2)  # Center in game area
-        bucket_y = SCREEN_HEIGHT - 100
-        target_bucket_x = bucket_x
-        target_bucket_y = bucket_y
-        game_score = 0
-        game_over = False
-        objects = []
-        object_speed_multiplier = 1.0
-        bucket_speed_multiplier = 1.0
-        lives = MAX_LIVES + (lives_level - 1)
-        last_spawn_time = pygame.time.get_ticks()
-        game_start_time = pygame.time.get_ticks()
-        restart_requested = False
-
-def spawn_object():
-    # """Spawn a new falling object at a random x position, avoiding corners."""
-    with game_lock:
-        margin = BUCKET_WIDTH // 2  # Prevent spawning too close to edges
-        # Adjust x position to be within the game area
-        x = random.randint(BORDER_WIDTH + OBJECT_SIZE + margin, BORDER_WIDTH + GAME_AREA_WIDTH - OBJECT_SIZE - margin)
-        objects.append([x, 0, INITIAL_OBJECT_SPEED * object_speed_multiplier])
+    global current_state, recorder
+    save_recording()
+    sim.reset()
+    current_state = sim.state()
+    if RECORD_DIR:
+        recorder = Recorder(sim, TICK_RATE)
+
+def save_recording():
+    # Write out the recording of the game that just ended, if any
+    global recorder
+    if recorder is not None:
+        path = recorder.save(RECORD_DIR, sim)
+        log.info("Recorded game to %s", path, ticks=recorder.ticks, seed=recorder.seed)
+        recorder = None
+
+def restore_progress(timeout=0.0):
+    # Apply the player's saved progress once the store has read it
+    global progress_store, progress_restored
+    if progress_store is None or progress_restored:
+        return
+    progress_restored = progress_store.restore(PLAYER_NAME, progress, timeout)
+    if not progress_restored and timeout:
+        # Applying it later would overwrite this session's progress, so go on without the store
+        log.warning("Saved progress not loaded after %.1f s; this session's progress will not be saved", timeout,
+                    player=PLAYER_NAME)
+        progress_store = None
+
+def save_progress():
+    # Hand the current progress to the store's writer thread (only copies it when it changed)
+    if progress_store is not None and progress_restored:
+        progress_store.save(PLAYER_NAME, progress)
+
+def submit_score(score):
+    # Add a finished game to the leaderboard, and save it when it is the player's best
+    achieved = time.time()
+    if leaderboard.submit(PLAYER_NAME, score, achieved) and progress_store is not None:
+        progress_store.save_score(PLAYER_NAME, score, achieved)
+
+def resume_game():
+    # Leave the pause menu (recorded, as it changes the game from outside a tick)
+    sim.paused = False
+    if recorder is not None:
+        recorder.resume()
 
 # Button class for UI elements
 class Button:
@@ -87,21 +135,30 @@ class Button:
         self.is_hovered = False
         self.animation_offset = 0
         
+        # Pre-rendered normal and hover surfaces, rebuilt when the text, size, colors or font change
+        self._surfaces = None
+        self._surface_key = None
+        
+    def _render_surface(self, color, font):
+        # Gradient background with the text label on top
+        surface = pygame.Surface(self.rect.size)
+        shading.fill_shaded(surface, surface.get_rect(), color, 0.3)
+        text_surf = font.render(self.text, True, (0, 0, 0))
+        surface.blit(text_surf, text_surf.get_rect(center=surface.get_rect().center))
+        return surface
+        
+    def get_surface(self, font):
+        key = (self.text, self.rect.size, self.color, self.hover_color, font)
+        if key != self._surface_key:
+            self._surfaces = (self._render_surface(self.color, font), self._render_surface(self.hover_color, font))
+            self._surface_key = key
+        return self._surfaces[1] if self.is_hovered else self._surfaces[0]
+        
     def draw(self, screen, font):
-        # Draw button with hover effect and gradient
-        current_color = self.hover_color if self.is_hovered else self.color
-        
-        # Create gradient effect
-        for i in range(self.rect.height):
-            factor = i / self.rect.height
-            r = int(current_color[0] * (1 - factor * 0.3))
-            g = int(current_color[1] * (1 - factor * 0.3))
-            b = int(current_color[2] * (1 - factor * 0.3))
-            pygame.draw.line(screen, (r, g, b), 
-                            (self.rect.left, self.rect.top + i), 
-                            (self.rect.right, self.rect.top + i))
-        
-        # Add pulsing animation when hovered
+        # Draw the cached button surface for the current hover state
+        screen.blit(self.get_surface(font), self.rect)
+        
+        # Add pulsing animation when hovered (only the border is animated)
         border_width = 3 if self.is_hovered else 2
         if self.is_hovered:
             self.animation_offset = (self.animation_offset + 0.05) % (2 * math.pi)
@@ -109,11 +166,6 @@ class Button:
         
         pygame.draw.rect(screen, (0, 0, 0), self.rect, border_width)  # Border
         
-        # Render text
-        text_surf = font.render(self.text, True, (0, 0, 0))
-        text_rect = text_surf.get_rect(center=self.rect.center)
-        screen.blit(text_surf, text_rect)
-        
     def check_hover(self, mouse_pos):
         self.is_hovered = self.rect.collidepoint(mouse_pos)
         return self.is_hovered
@@ -121,66 +173,42 @@ class Button:
     def is_clicked(self, mouse_pos, mouse_click):
         return self.rect.collidepoint(mouse_pos) and mouse_click
 
-# Helper function to create gradient background for main game area
-def draw_game_area_gradient(screen, border_width, time_value):
-    # Draw gradient for game area only
-    game_area_rect = pygame.Rect(border_width, 0, SCREEN_WIDTH - 2 * border_width, SCREEN_HEIGHT)
-    
-    # Create vertical gradient with subtle animation
-    for y in range(SCREEN_HEIGHT):
-        # Calculate color with slight wave effect
-        factor = y / SCREEN_HEIGHT
-        wave = (math.sin(time_value * 0.5 + factor * 2) + 1) / 8  # Subtle wave
-        
-        # Ensure RGB values are between 0 and 255
-        r = min(255, max(0, int(135 - 20 * factor + 10 * wave)))  # Light blue to slightly darker
-        g = min(255, max(0, int(206 - 20 * factor + 10 * wave)))
-        b = min(255, max(0, int(250 - 10 * factor + 10 * wave)))
-        
-        pygame.draw.line(screen, (r, g, b), 
-                        (border_width, y), 
-                        (SCREEN_WIDTH - border_width, y))
-
-# Helper function to create gradient borders
-def draw_borders(screen, border_width):
-    # Define border rectangles
-    left_border_rect = pygame.Rect(0, 0, border_width, SCREEN_HEIGHT)
-    right_border_rect = pygame.Rect(SCREEN_WIDTH - border_width, 0, border_width, SCREEN_HEIGHT)
-    
-    # Fill left border with solid color
-    pygame.draw.rect(screen, (80, 80, 120), left_border_rect)
-    
-    # Fill right border with solid color
-    pygame.draw.rect(screen, (80, 80, 120), right_border_rect)
-    
-    # Draw border outlines
-    pygame.draw.rect(screen, (40, 40, 80), left_border_rect, 2)
-    pygame.draw.rect(screen, (40, 40, 80), right_border_rect, 2)
-
 # Helper function to create full screen gradient for menus
 def draw_full_screen_gradient(screen, top_color, bottom_color, time_value=0):
-    height = screen.get_height()
-    for y in range(height):
-        # Calculate color for this line
-        factor = y / height
-        wave = (math.sin(time_value * 0.5 + factor * 2) + 1) / 8  # Subtle wave
-        
-        # Ensure RGB values are between 0 and 255
-        r = min(255, max(0, int(top_color[0] * (1 - factor) + bottom_color[0] * factor + 10 * wave)))
-        g = min(255, max(0, int(top_color[1] * (1 - factor) + bottom_color[1] * factor + 10 * wave)))
-        b = min(255, max(0, int(top_color[2] * (1 - factor) + bottom_color[2] * factor + 10 * wave)))
-        
-        pygame.draw.line(screen, (r, g, b), (0, y), (screen.get_width(), y))
+    shading.fill_wave_gradient(screen, screen.get_rect(), top_color, bottom_color, time_value)
+
+# Get the cached in-game background layer (solid fill, borders and game area gradient).
+# Returns the cache key together with the layer so callers can tell when it changes
+def get_game_background(size, time_value):
+    step, phase_time = quantize_phase(time_value)
+
+    key = ("game", size, step)
+    return key, background_cache.get(key, size, lambda layer: render_game_background(layer, phase_time))
+
+# Draw the in-game background as one cached blit
+def draw_game_background(screen, time_value):
+    _, layer = get_game_background(screen.get_size(), time_value)
+    screen.blit(layer, (0, 0))
+
+# Draw a menu background gradient as one cached blit
+def draw_menu_background(screen, top_color, bottom_color, time_value=0):
+    step, phase_time = quantize_phase(time_value)
+    size = screen.get_size()
+
+    def render(layer):
+        draw_full_screen_gradient(layer, top_color, bottom_color, phase_time)
+
+    key = ("menu", size, top_color, bottom_color, step)
+    screen.blit(background_cache.get(key, size, render), (0, 0))
 
 #Start Screen
 def play_screen(screen, font):
-    global high_score, upgrade_points
-    
     # Create buttons
     play_button = Button(SCREEN_WIDTH // 2 - 100, SCREEN_HEIGHT // 2 - 50, 200, 60, "Play")
     upgrade_button = Button(SCREEN_WIDTH // 2 - 100, SCREEN_HEIGHT // 2 + 30, 200, 60, "Upgrades")
     
-    title_font = pygame.font.SysFont('Arial', 60, bold=True)
+    title_font = get_font('Arial', 60, bold=True)
+    hint_font = get_font('Arial', 20)
     start_time = pygame.time.get_ticks() / 1000.0  # For animations
     
     while True:
@@ -199,29 +227,34 @@ def play_screen(screen, font):
                 if event.button == 1:  # Left mouse button
                     mouse_clicked = True
             elif event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:
+                restore_progress(LOAD_TIMEOUT)
                 return  # Keep space key functionality
         
         # Check button interactions
         play_button.check_hover(mouse_pos)
         upgrade_button.check_hover(mouse_pos)
         
+        # Saved progress is read in the background; it has to be in place before it can change
+        restore_progress()
         if play_button.is_clicked(mouse_pos, mouse_clicked):
+            restore_progress(LOAD_TIMEOUT)
             return  # Start the game
         
         if upgrade_button.is_clicked(mouse_pos, mouse_clicked):
+            restore_progress(LOAD_TIMEOUT)
             upgrade_screen(screen, font)  # Go to upgrade screen
         
         # Draw the screen with full screen gradient (no borders)
-        draw_full_screen_gradient(screen, (135, 206, 250), (100, 180, 255), animation_time)
+        draw_menu_background(screen, (135, 206, 250), (100, 180, 255), animation_time)
         
         # Draw title with subtle animation
-        title_text = title_font.render("Bucket Catch Game", True, (0, 0, 0))
+        title_text = render_text(title_font, "Bucket Catch Game", True, (0, 0, 0))
         title_y_offset = math.sin(animation_time * 2) * 5  # Gentle floating effect
         screen.blit(title_text, (SCREEN_WIDTH // 2 - title_text.get_width() // 2, 
                                 SCREEN_HEIGHT // 4 + title_y_offset))
         
         # Draw score and upgrade points
-        score_text = font.render(f"High Score: {high_score}   Upgrade Points: {upgrade_points}", True, (0, 0, 0))
+        score_text = render_text(font, f"High Score: {progress.high_score}   Upgrade Points: {progress.upgrade_points}", True, (0, 0, 0))
         screen.blit(score_text, (SCREEN_WIDTH // 2 - score_text.get_width() // 2, SCREEN_HEIGHT // 3 + 20))
         
         # Draw buttons
@@ -229,27 +262,24 @@ def play_screen(screen, font):
         upgrade_button.draw(screen, font)
         
         # Add hint text
-        hint_font = pygame.font.SysFont('Arial', 20)
-        hint_text = hint_font.render("Press SPACE to start immediately", True, (80, 80, 80))
+        hint_text = render_text(hint_font, "Press SPACE to start immediately", True, (80, 80, 80))
         screen.blit(hint_text, (SCREEN_WIDTH // 2 - hint_text.get_width() // 2, SCREEN_HEIGHT - 50))
         
         pygame.display.flip()
+        log_startup('first frame')
         pygame.time.delay(10)  # Small delay to reduce CPU usage
 
 # Upgrade screen
 def upgrade_screen(screen, font):
-    global upgrade_points, bucket_size_level, bucket_speed_level, lives_level, catch_value_level
-    global BUCKET_WIDTH, BUCKET_HEIGHT, INITIAL_BUCKET_SPEED, MAX_LIVES
-    
     # Create upgrade buttons
-    bucket_size_button = Button(SCREEN_WIDTH // 2 - 150, SCREEN_HEIGHT // 2 - 120, 300, 50, f"Bucket Size (Level {bucket_size_level})")
-    bucket_speed_button = Button(SCREEN_WIDTH // 2 - 150, SCREEN_HEIGHT // 2 - 50, 300, 50, f"Bucket Speed (Level {bucket_speed_level})")
-    lives_button = Button(SCREEN_WIDTH // 2 - 150, SCREEN_HEIGHT // 2 + 20, 300, 50, f"Extra Lives (Level {lives_level})")
-    catch_value_button = Button(SCREEN_WIDTH // 2 - 150, SCREEN_HEIGHT // 2 + 90, 300, 50, f"Catch Value (Level {catch_value_level})")
+    bucket_size_button = Button(SCREEN_WIDTH // 2 - 150, SCREEN_HEIGHT // 2 - 120, 300, 50, f"Bucket Size (Level {progress.bucket_size_level})")
+    bucket_speed_button = Button(SCREEN_WIDTH // 2 - 150, SCREEN_HEIGHT // 2 - 50, 300, 50, f"Bucket Speed (Level {progress.bucket_speed_level})")
+    lives_button = Button(SCREEN_WIDTH // 2 - 150, SCREEN_HEIGHT // 2 + 20, 300, 50, f"Extra Lives (Level {progress.lives_level})")
+    catch_value_button = Button(SCREEN_WIDTH // 2 - 150, SCREEN_HEIGHT // 2 + 90, 300, 50, f"Catch Value (Level {progress.catch_value_level})")
     back_button = Button(SCREEN_WIDTH // 2 - 100, SCREEN_HEIGHT - 100, 200, 50, "Back to Menu")
     
-    title_font = pygame.font.SysFont('Arial', 48, bold=True)
-    info_font = pygame.font.SysFont('Arial', 20)
+    title_font = get_font('Arial', 48, bold=True)
+    info_font = get_font('Arial', 20)
     
     start_time = pygame.time.get_ticks() / 1000.0  # For animations
     
@@ -279,41 +309,32 @@ def upgrade_screen(screen, font):
         back_button.check_hover(mouse_pos)
         
         # Handle button clicks
-        if bucket_size_button.is_clicked(mouse_pos, mouse_clicked) and upgrade_points > 0:
-            upgrade_points -= 1
-            bucket_size_level += 1
-            BUCKET_WIDTH = 80 + (bucket_size_level - 1) * 10
-            BUCKET_HEIGHT = 60 + (bucket_size_level - 1) * 5
-            bucket_size_button.text = f"Bucket Size (Level {bucket_size_level})"
+        if bucket_size_button.is_clicked(mouse_pos, mouse_clicked) and progress.buy_upgrade('bucket_size'):
+            bucket_size_button.text = f"Bucket Size (Level {progress.bucket_size_level})"
             
-        if bucket_speed_button.is_clicked(mouse_pos, mouse_clicked) and upgrade_points > 0:
-            upgrade_points -= 1
-            bucket_speed_level += 1
-            INITIAL_BUCKET_SPEED = 8 + (bucket_speed_level - 1) * 1
-            bucket_speed_button.text = f"Bucket Speed (Level {bucket_speed_level})"
+        if bucket_speed_button.is_clicked(mouse_pos, mouse_clicked) and progress.buy_upgrade('bucket_speed'):
+            bucket_speed_button.text = f"Bucket Speed (Level {progress.bucket_speed_level})"
             
-        if lives_button.is_clicked(mouse_pos, mouse_clicked) and upgrade_points > 0:
-            upgrade_points -= 1
-            lives_level += 1
-            lives_button.text = f"Extra Lives (Level {lives_level})"
+        if lives_button.is_clicked(mouse_pos, mouse_clicked) and progress.buy_upgrade('lives'):
+            lives_button.text = f"Extra Lives (Level {progress.lives_level})"
             
-        if catch_value_button.is_clicked(mouse_pos, mouse_clicked) and upgrade_points > 0:
-            upgrade_points -= 1
-            catch_value_level += 1
-            catch_value_button.text = f"Catch Value (Level {catch_value_level})"
+        if catch_value_button.is_clicked(mouse_pos, mouse_clicked) and progress.buy_upgrade('catch_value'):
+            catch_value_button.text = f"Catch Value (Level {progress.catch_value_level})"
+        
+        save_progress()
             
         if back_button.is_clicked(mouse_pos, mouse_clicked):
             return  # Return to main menu
         
         # Draw the screen with full screen gradient (no borders)
-        draw_full_screen_gradient(screen, (135, 206, 250), (100, 180, 255), animation_time)
+        draw_menu_background(screen, (135, 206, 250), (100, 180, 255), animation_time)
         
         # Draw title
-        title_text = title_font.render("Upgrades", True, (0, 0, 0))
+        title_text = render_text(title_font, "Upgrades", True, (0, 0, 0))
         screen.blit(title_text, (SCREEN_WIDTH // 2 - title_text.get_width() // 2, 50))
         
         # Draw points available
-        points_text = font.render(f"Upgrade Points Available: {upgrade_points}", True, (0, 0, 0))
+        points_text = render_text(font, f"Upgrade Points Available: {progress.upgrade_points}", True, (0, 0, 0))
         screen.blit(points_text, (SCREEN_WIDTH // 2 - points_text.get_width() // 2, 120))
         
         # Draw upgrade buttons
@@ -327,18 +348,18 @@ def upgrade_screen(screen, font):
         descriptions = [
             f"Increases bucket width by 10 and height by 5",
             f"Increases bucket speed by 1",
-            f"Adds 1 extra life (Current: {MAX_LIVES + (lives_level - 1)})",
+            f"Adds 1 extra life (Current: {progress.max_lives})",
             f"Increases points per catch by 1"
         ]
         
         y_pos = SCREEN_HEIGHT // 2 - 120
         for i, desc in enumerate(descriptions):
-            desc_text = info_font.render(desc, True, (50, 50, 50))
+            desc_text = render_text(info_font, desc, True, (50, 50, 50))
             screen.blit(desc_text, (SCREEN_WIDTH // 2 + 160, y_pos + 15))
             y_pos += 70
         
         # Add hint text
-        hint_text = info_font.render("Press ESC to return to menu", True, (80, 80, 80))
+        hint_text = render_text(info_font, "Press ESC to return to menu", True, (80, 80, 80))
         screen.blit(hint_text, (SCREEN_WIDTH // 2 - hint_text.get_width() // 2, SCREEN_HEIGHT - 40))
         
         pygame.display.flip()
@@ -346,14 +367,14 @@ def upgrade_screen(screen, font):
 
 # Game over screen
 def game_over_screen(screen, font, score):
-    global high_score
-    
     # Create buttons
     restart_button = Button(SCREEN_WIDTH // 2 - 100, SCREEN_HEIGHT // 2, 200, 60, "Play Again")
     home_button = Button(SCREEN_WIDTH // 2 - 100, SCREEN_HEIGHT // 2 + 80, 200, 60, "Return to Menu")
     
-    title_font = pygame.font.SysFont('Arial', 60, bold=True)
+    title_font = get_font('Arial', 60, bold=True)
+    hint_font = get_font('Arial', 20)
     start_time = pygame.time.get_ticks() / 1000.0  # For animations
+    submit_score(score)
     
     while True:
         current_time = pygame.time.get_ticks() / 1000.0
@@ -387,26 +408,37 @@ def game_over_screen(screen, font, score):
             return "home"  # Return to home screen
         
         # Draw the screen with full screen gradient (no borders)
-        draw_full_screen_gradient(screen, (135, 206, 250), (100, 180, 255), animation_time)
+        draw_menu_background(screen, (135, 206, 250), (100, 180, 255), animation_time)
         
         # Draw title
-        title_text = title_font.render("Game Over", True, (255, 0, 0))
+        title_text = render_text(title_font, "Game Over", True, (255, 0, 0))
         screen.blit(title_text, (SCREEN_WIDTH // 2 - title_text.get_width() // 2, SCREEN_HEIGHT // 4 - 50))
         
         # Draw score
-        score_text = font.render(f"Your Score: {score}", True, (0, 0, 0))
+        score_text = render_text(font, f"Your Score: {score}", True, (0, 0, 0))
         screen.blit(score_text, (SCREEN_WIDTH // 2 - score_text.get_width() // 2, SCREEN_HEIGHT // 3))
         
-        high_score_text = font.render(f"High Score: {high_score}", True, (0, 0, 0))
+        # The player's rank (and the leaderboard below) can change while saved scores load
+        rank = leaderboard.rank(PLAYER_NAME)
+        high_score_text = render_text(font, f"High Score: {progress.high_score}   Rank: {rank} of {len(leaderboard)}",
+                                      True, (0, 0, 0))
         screen.blit(high_score_text, (SCREEN_WIDTH // 2 - high_score_text.get_width() // 2, SCREEN_HEIGHT // 3 + 40))
         
+        # Draw the top of the leaderboard beside the buttons
+        leaders_y = SCREEN_HEIGHT // 2
+        screen.blit(render_text(hint_font, "Leaderboard", True, (0, 0, 0)), (SCREEN_WIDTH - 180, leaders_y))
+        for position, player, best in leaderboard.top(LEADERBOARD_SHOWN):
+            leaders_y += 24
+            color = (200, 0, 0) if player == PLAYER_NAME else (0, 0, 0)
+            entry_text = render_text(hint_font, f"{position}. {player}  {best}", True, color)
+            screen.blit(entry_text, (SCREEN_WIDTH - 180, leaders_y))
+        
         # Draw buttons
         restart_button.draw(screen, font)
         home_button.draw(screen, font)
         
         # Add hint text
-        hint_font = pygame.font.SysFont('Arial', 20)
-        hint_text = hint_font.render("Press R to restart or ESC to return to menu", True, (80, 80, 80))
+        hint_text = render_text(hint_font, "Press R to restart or ESC to return to menu", True, (80, 80, 80))
         screen.blit(hint_text, (SCREEN_WIDTH // 2 - hint_text.get_width() // 2, SCREEN_HEIGHT - 50))
         
         pygame.display.flip()
@@ -417,8 +449,9 @@ def quit(screen, font):
     global SCREEN_WIDTH, SCREEN_HEIGHT
 
     screen.fill((135, 206, 235))
-    font = pygame.font.SysFont('Arial', 48, bold=True)
-    text = font.render("Are you sure you want to quit?", True, (0, 0, 0))
+    font = get_font('Arial', 48, bold=True)
+    small_font = get_font('Arial', 24)
+    text = render_text(font, "Are you sure you want to quit?", True, (0, 0, 0))
     screen.blit(text, (SCREEN_WIDTH // 2 - 300, SCREEN_HEIGHT // 2 - 200))
 
     #Yes or No button
@@ -441,33 +474,32 @@ def quit(screen, font):
                     mouse_clicked = True
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_y:
-                    print("User quitting...")
+                    log.info("User quitting...")
                     return "restarting"
                 elif event.key == pygame.K_n:
-                    print("Resuming game...")
+                    log.info("Resuming game...")
                     return "resume"
 
         yes_button.check_hover(mouse_pos)
         no_button.check_hover(mouse_pos)
 
         if yes_button.is_clicked(mouse_pos, mouse_clicked):
-            print("User quitting...")
+            log.info("User quitting...")
             return "restarting"
         
         if no_button.is_clicked(mouse_pos, mouse_clicked):
-            print("Resuming game...")
+            log.info("Resuming game...")
             return "resume"
 
         yes_button.draw(screen, font)
         no_button.draw(screen, font)
 
         # Add sub under Yes button
-        small_font = pygame.font.SysFont('Arial', 24)
-        press_y_text = small_font.render("or press Y", True, (0, 0, 0))
+        press_y_text = render_text(small_font, "or press Y", True, (0, 0, 0))
         screen.blit(press_y_text, (SCREEN_WIDTH // 2 - 50, SCREEN_HEIGHT // 2 + 10))
 
         #Subs under No button
-        press_n_text = small_font.render("or press N", True, (0, 0, 0))
+        press_n_text = render_text(small_font, "or press N", True, (0, 0, 0))
         screen.blit(press_n_text, (SCREEN_WIDTH // 2 - 50, SCREEN_HEIGHT // 2 + 120))
 
         pygame.display.flip()
@@ -476,15 +508,12 @@ def quit(screen, font):
 
 
 def GameThread():
-    # """Main game thread that handles the pygame display and game logic."""
-    global bucket_x, bucket_y, target_bucket_x, target_bucket_y, game_score, prv_score, high_score, game_over, objects
-    global object_speed_multiplier, bucket_speed_multiplier, lives
-    global last_spawn_time, game_start_time, restart_requested, paused
-    global upgrade_points
-    
-    pygame.init()
+    # """Main game thread that steps the simulation and renders it with pygame."""
+    global current_state
+    # Only the subsystems the game uses; pygame.init() would also start audio and joysticks
+    pygame.display.init()
     pygame.font.init()
-    font = pygame.font.SysFont('Arial', 24)
+    font = get_font('Arial', 24)
     
     # Colors
     BLUE = (0, 120, 255)
@@ -499,16 +528,31 @@ def GameThread():
     screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
     pygame.display.set_caption('Bucket Catch Game - Server')
     
-    # Load or create game assets
-    bucket_img = pygame.Surface((BUCKET_WIDTH, BUCKET_HEIGHT))
-    bucket_img.fill(YELLOW)
-    
     # Different colors for falling objects
     object_colors = [RED, GREEN, ORANGE, BLUE]
     
     # Game clock
     clock = pygame.time.Clock()
     
+    # Full-window flips, or dirty rectangles only
+    renderer = DirtyRectRenderer(DIRTY_RECT_RENDERING)
+    
+    # Fixed simulation tick rate, independent of the rendered frame rate
+    timestep = FixedTimestep(TICK_RATE)
+    
+    # Time each phase of a frame, including the simulation's own phases
+    profiler.budget = 1.0 / FRAME_RATE if FRAME_RATE else None
+    sim.profiler = profiler
+    overlay = ProfilerOverlay(profiler, (BORDER_WIDTH + 10, 80), PROFILE_OVERLAY)
+    
+    def after_menu():
+        # A blocking menu screen returned: redraw everything, and leave the time spent in it out of
+        # the frame profile and out of the simulation (it would otherwise catch up on it in one frame)
+        renderer.invalidate()
+        profiler.skip_frame()
+        timestep.reset()
+        clock.tick()
+    
     # Animation variables
     animation_time = 0
     
@@ -517,15 +561,19 @@ def GameThread():
     while running:
         #play_screen
         play_screen(screen, font)
+        renderer.invalidate()
         
         # Initialize game variables
         reset_game()
+        game_id = sim.game_id
         animation_start_time = pygame.time.get_ticks() / 1000.0
+        timestep.reset()
+        clock.tick()
         
         # Game loop
         game_running = True
         while game_running and running:
-            current_time = pygame.time.get_ticks()
+            profiler.begin_frame()
             animation_time = pygame.time.get_ticks() / 1000.0 - animation_start_time
             
             # Handle pygame events
@@ -534,176 +582,113 @@ def GameThread():
                     running = False
                     game_running = False
                 elif event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_ESCAPE:
-                        if not game_over:
+                    if event.key == pygame.K_F3:
+                        # Show or hide the frame profiler overlay
+                        overlay.toggle()
+                        renderer.invalidate()
+                    elif event.key == pygame.K_ESCAPE:
+                        if not sim.game_over:
                             # Return to main menu if ESC is pressed during gameplay
                             game_running = False
                         else:
                             # If game is over, ESC is handled in game_over_screen
                             pass
                 
-                elif paused:
+                elif sim.paused:
                     action = quit(screen, font)
                     if action == "restarting":
-                        reset_game()
+                        # Reset after the start screen, as upgrades bought there change the new game
                         play_screen(screen, font)
-                        paused = False
+                        reset_game()
+                        game_id = sim.game_id
+                        resume_game()
                     elif action == "resume":
-                        paused = False
+                        resume_game()
                     elif action == "quit":
                         running = False
                         game_running = False
+                    after_menu()
             
-            # Check for restart request
-            if restart_requested:
-                print("Restarting Game...")
-                reset_game()
-                restart_requested = False
-                animation_start_time = pygame.time.get_ticks() / 1000.0
+            profiler.mark('events')
             
-            # If game is not over, update game state
-            if not game_over and not paused:
-                # Spawn new objects periodically
-                if current_time - last_spawn_time > 1000:  # Spawn every second
-                    spawn_object()
-                    with game_lock:
-                        last_spawn_time = current_time
-                
-                # Increase difficulty over time
-                elapsed_seconds = (current_time - game_start_time) / 1000
-                with game_lock:
-                    object_speed_multiplier = 1.0 + (elapsed_seconds * DIFFICULTY_INCREASE_RATE)
-                    bucket_speed_multiplier = 1.0 + (elapsed_seconds * DIFFICULTY_INCREASE_RATE)
-                
-                # Update object positions and check for collisions
-                with game_lock:
-                    # Precompute bucket bounds for AABB collision
-                    bucket_left = bucket_x
-                    bucket_right = bucket_x + BUCKET_WIDTH
-                    bucket_top = bucket_y
-                    bucket_bottom = bucket_y + BUCKET_HEIGHT
-
-                    updated_objects = []
-                    for obj in objects:
-                        obj_x, obj_y, obj_speed = obj
-                        
-                        # Move object down
-                        obj_y += obj_speed
-                        
-                        # Calculate object bounds for AABB collision
-                        obj_left = obj_x
-                        obj_right = obj_x + OBJECT_SIZE
-                        obj_top = obj_y
-                        obj_bottom = obj_y + OBJECT_SIZE
-                        
-                        # Check if object is caught by bucket
-                        if (obj_right > bucket_left and obj_left < bucket_right and
-                            obj_bottom > bucket_top and obj_top < bucket_bottom):
-                            game_score += 1 * catch_value_level
-                            if game_score > high_score:
-                                high_score = game_score
-                            
-                            # Every 10 points, award an upgrade point
-                            if game_score % 10 == 0 and game_score > prv_score:
-                                upgrade_points += 1
-                                prv_score = game_score
-                        else:
-                            # Keep object if it's still in play
-                            if obj_y < SCREEN_HEIGHT:
-                                updated_objects.append([obj_x, obj_y, obj_speed])
-                            else:
-                                # Object reached bottom without being caught
-                                lives -= 1
-                                if lives <= 0:
-                                    game_over = True
-                    
-                    # Update objects list
-                    objects = updated_objects
-                
-                # Smoothly move bucket towards target position (lerp)
-                with game_lock:
-                    lerp_factor = 0.2  # Adjust for smoother or more responsive movement
-                    bucket_x += (target_bucket_x - bucket_x) * lerp_factor
-                    bucket_y += (target_bucket_y - bucket_y) * lerp_factor
-                    
-                    # Ensure bucket stays within screen bounds (adjusted for borders)
-                    bucket_x = max(BORDER_WIDTH, min(bucket_x, BORDER_WIDTH + GAME_AREA_WIDTH - BUCKET_WIDTH))
-                    bucket_y = max(0, min(bucket_y, SCREEN_HEIGHT - BUCKET_HEIGHT))
+            # Run the fixed ticks covered by the last frame's real time
+            ticks = timestep.advance(clock.tick(FRAME_RATE) / 1000.0)
+            profiler.mark('idle')
+            
+            # Advance the game, applying the client commands queued before each tick
+            # (sim.step charges its commands, spawn and physics phases to the profiler)
+            for _ in range(ticks):
+                batch = commands.drain()
+                if recorder is not None:
+                    recorder.record(batch)
+                sim.step(timestep.dt, batch)
+            if ticks:
+                save_progress()  # Catches change the high score and upgrade points
             
-            # Draw solid color background first
-            screen.fill((100, 100, 150))
+            # Publish the new state; everything below only reads this immutable copy
+            if ticks:
+                current_state = sim.state()
+            state = current_state
             
-            # Draw borders (solid color)
-            draw_borders(screen, BORDER_WIDTH)
+            # Interpolate positions between the last two ticks
+            bucket_x, bucket_y = state.interpolated_bucket(timestep.alpha)
+            bucket_size = (state.bucket_width, state.bucket_height)
+            object_positions = state.interpolated_objects(timestep.alpha)
+            game_score, lives, game_over = state.score, state.lives, state.game_over
             
-            # Draw game area with gradient
-            draw_game_area_gradient(screen, BORDER_WIDTH, animation_time)
+            # Restart the animations when the game was restarted by the client
+            if state.game_id != game_id:
+                log.info("Restarting Game...")
+                game_id = state.game_id
+                animation_start_time = pygame.time.get_ticks() / 1000.0
+            profiler.mark('state')
+            
+            # Draw background, borders and game area gradient from the layer cache
+            background_key, background = get_game_background(screen.get_size(), animation_time)
+            renderer.begin_frame(screen, background, background_key)
+            profiler.mark('background')
             
             # Draw bucket with subtle animation
             bucket_wobble = math.sin(animation_time * 5) * 2
-            bucket_rect = pygame.Rect(bucket_x + bucket_wobble, bucket_y, BUCKET_WIDTH, BUCKET_HEIGHT)
-            
-            # Create gradient bucket
-            for i in range(BUCKET_HEIGHT):
-                factor = i / BUCKET_HEIGHT
-                r = min(255, int(YELLOW[0] * (1 - factor * 0.3)))
-                g = min(255, int(YELLOW[1] * (1 - factor * 0.3)))
-                b = min(255, int(YELLOW[2] * (1 - factor * 0.3)))
-                pygame.draw.line(screen, (r, g, b), 
-                                (bucket_rect.left, bucket_rect.top + i), 
-                                (bucket_rect.right, bucket_rect.top + i))
+            bucket_rect = pygame.Rect((bucket_x + bucket_wobble, bucket_y), bucket_size)
             
-            # Draw bucket border
-            pygame.draw.rect(screen, (0, 0, 0), bucket_rect, 2)
+            # Draw gradient bucket with border from the sprite cache
+            renderer.add(screen.blit(sprite_cache.shaded(YELLOW, bucket_rect.size, 0.3, 2), bucket_rect))
             
-            # Draw falling objects with animation
-            with game_lock:
-                for i, obj in enumerate(objects):
-                    obj_x, obj_y, _ = obj
-                    
-                    # Add slight horizontal movement based on sine wave
-                    obj_wobble = math.sin((animation_time * 3) + (i * 1.5)) * 3
-                    
-                    # Draw object with gradient
-                    obj_rect = pygame.Rect(obj_x + obj_wobble, obj_y, OBJECT_SIZE, OBJECT_SIZE)
-                    for j in range(OBJECT_SIZE):
-                        factor = j / OBJECT_SIZE
-                        r = min(255, int(object_colors[i % len(object_colors)][0] * (1 - factor * 0.5)))
-                        g = min(255, int(object_colors[i % len(object_colors)][1] * (1 - factor * 0.5)))
-                        b = min(255, int(object_colors[i % len(object_colors)][2] * (1 - factor * 0.5)))
-                        pygame.draw.line(screen, (r, g, b), 
-                                        (obj_rect.left, obj_rect.top + j), 
-                                        (obj_rect.right, obj_rect.top + j))
-                    
-                    # Draw object border
-                    pygame.draw.rect(screen, (0, 0, 0), obj_rect, 1)
+            # Draw falling objects with animation, one sprite blit each
+            object_sprites = [sprite_cache.shaded(color, (OBJECT_SIZE, OBJECT_SIZE), 0.5, 1) for color in object_colors]
+            object_blits = []
+            for object_id, (obj_x, obj_y) in zip(state.object_ids, object_positions):
+                # Add slight horizontal movement based on sine wave; color and phase follow the
+                # object's id, as in the client window
+                object_id = int(object_id)
+                obj_wobble = math.sin((animation_time * 3) + (object_id * 1.5)) * 3
+                object_blits.append((object_sprites[object_id % len(object_sprites)],
+                                     (int(obj_x + obj_wobble), int(obj_y))))
+            renderer.add_all(screen.blits(object_blits))
+            profiler.mark('objects')
             
             # Draw score + High score (adjusted for border)
-            score_text = font.render(f'Score: {game_score}', True, (0, 0, 0))
-            screen.blit(score_text, (BORDER_WIDTH + 10, 10))
-            high_text = font.render(f'High Score: {high_score}', True, (0, 0, 0))
-            screen.blit(high_text, (BORDER_WIDTH + 10, 40))
+            score_text = render_text(font, f'Score: {game_score}', True, (0, 0, 0))
+            renderer.add(screen.blit(score_text, (BORDER_WIDTH + 10, 10)))
+            high_text = render_text(font, f'High Score: {progress.high_score}', True, (0, 0, 0))
+            renderer.add(screen.blit(high_text, (BORDER_WIDTH + 10, 40)))
             
             # Draw health label and boxes (adjusted for border)
-            health_text = font.render("Health:", True, (0, 0, 0))
-            screen.blit(health_text, (SCREEN_WIDTH - BORDER_WIDTH - 150, 10))
+            health_text = render_text(font, "Health:", True, (0, 0, 0))
+            renderer.add(screen.blit(health_text, (SCREEN_WIDTH - BORDER_WIDTH - 150, 10)))
             
-            # Draw lives as boxes with gradient
+            # Draw lives as gradient boxes with a border from the sprite cache
+            health_sprite = sprite_cache.shaded(RED, (20, 20), 0.3, 1)
             for i in range(lives):
-                health_box = pygame.Rect(SCREEN_WIDTH - BORDER_WIDTH - 30 * (i + 1), 40, 20, 20)
-                
-                # Create gradient health box
-                for j in range(20):
-                    factor = j / 20
-                    r = min(255, int(RED[0] * (1 - factor * 0.3)))
-                    g = min(255, int(RED[1] * (1 - factor * 0.3)))
-                    b = min(255, int(RED[2] * (1 - factor * 0.3)))
-                    pygame.draw.line(screen, (r, g, b), 
-                                    (health_box.left, health_box.top + j), 
-                                    (health_box.right, health_box.top + j))
-                
-                # Draw box border
-                pygame.draw.rect(screen, (0, 0, 0), health_box, 1)
+                renderer.add(screen.blit(health_sprite, (SCREEN_WIDTH - BORDER_WIDTH - 30 * (i + 1), 40)))
+            profiler.mark('hud')
+            
+            # Draw the frame profiler overlay when enabled
+            overlay_rect = overlay.draw(screen)
+            if overlay_rect:
+                renderer.add(overlay_rect)
+            profiler.mark('overlay')
             
             # Draw game over message
             if game_over:
@@ -711,112 +696,223 @@ def GameThread():
                 action = game_over_screen(screen, font, game_score)
                 if action == "restart":
                     reset_game()
+                    game_id = sim.game_id
                     animation_start_time = pygame.time.get_ticks() / 1000.0
                 elif action == "home":
                     game_running = False  # Return to main menu
+                after_menu()
             
-            # Update the display
-            pygame.display.flip()
-            
-            # Cap the frame rate
-            clock.tick(60)
+            # Update the display (full flip or dirty rectangles)
+            renderer.present()
+            profiler.mark('flip')
+            profiler.end_frame(len(object_positions))
+        
+        save_recording()
+        renderer.report()
+        commands.report()
+        profiler.report()
     
     # Quit pygame when done
     pygame.quit()
 
 def ServerThread():
     # """Server thread that handles client connections and processes input."""
-    global bucket_x, bucket_y, target_bucket_x, target_bucket_y, game_over, restart_requested, paused
-    
-    # Get the hostname
-    host = "127.0.0.1"  # Default to localhost
+    host = SERVER_HOST
+    port = SERVER_PORT
+    
+    log.info("Server starting on %s:%s (%s)", host, port, 'UDP' if USE_UDP else 'TCP')
+    
+    # Received input is only logged at debug level, and then at most INPUT_LOG_RATE lines per second
+    input_log = game_log.RateLimitedLog(log, INPUT_LOG_RATE)
+    
+    def combined_directions(server):
+        # Direction keys held by any connected client
+        directions = 0
+        for connection in server.connections.values():
+            directions |= connection.directions
+        return directions
+    
+    def on_connect(connection):
+        log.info("Connection from: %s", connection.address)
+        connection.acked_seq = None  # Last snapshot the client applied; None gets a full snapshot
+        connection.snapshots_sent = 0
+    
+    def on_frames(connection, frames):
+        # Process received commands
+        batch = []
+        for msg_type, value in frames:
+            if msg_type == MSG_ACK:
+                # Later snapshots for this client are deltas against the one it acknowledged
+                connection.acked_seq = snapshots.resolve_ack(value)
+                continue
+            if msg_type == MSG_PING:
+                # Answer at once, with the counters load_generator.py reports
+                server.send(connection, encode_pong(value, connection.frames, connection.rejected,
+                                                    commands.drained, commands.dropped))
+                continue
+            if msg_type == MSG_INPUT_STATE:
+                # Each client reports its own keys; the game sees what all of them hold
+                connection.directions = value
+                batch.append((MSG_INPUT_STATE, combined_directions(server)))
+                continue
+            if msg_type == MSG_RESTART:  # Restart game
+                log.info("Restart requested by %s", connection.address)
+            elif msg_type == MSG_PAUSE:  # Client quitting
+                log.info("Client %s paused", connection.address)
+            batch.append((msg_type, value))
+        
+        if not batch:
+            return
+        if input_log.enabled and input_log.allow():
+            input_log.debug("From client %s: %s", connection, ', '.join(describe_frame(command) for command in batch),
+                            client=str(connection), frames=len(batch))
+        
+        # Queue every frame for the game thread's next simulation tick
+        commands.extend(batch)
+    
+    next_snapshot = time.perf_counter()
+    
+    def broadcast_snapshot():
+        # Send every client the current game state at SNAPSHOT_RATE; returns the time until the next one
+        nonlocal next_snapshot
+        if not SNAPSHOT_RATE:
+            return None
+        now = time.perf_counter()
+        if now < next_snapshot:
+            return next_snapshot - now
+        next_snapshot += 1.0 / SNAPSHOT_RATE
+        if next_snapshot < now:
+            next_snapshot = now + 1.0 / SNAPSHOT_RATE  # Fell behind; skip the missed ones
+        if not server.connections:
+            return next_snapshot - now
+        
+        snapshots.capture(current_state, TICK_RATE)
+        for connection in list(server.connections.values()):
+            if connection.outbox:
+                continue  # Still writing an earlier snapshot; the next delta covers this one too
+            server.send(connection, snapshots.message_for(connection.acked_seq))
+            connection.snapshots_sent += 1
+        return next_snapshot - time.perf_counter()
+    
+    def on_disconnect(connection):
+        # Release any keys the client was holding
+        commands.push((MSG_INPUT_STATE, combined_directions(server)))
+        
+        # One line with the connection's traffic statistics as fields
+        stats = {'client': str(connection), 'rejected': connection.rejected,
+                 'snapshots': connection.snapshots_sent, 'sent_bytes': connection.sent_bytes}
+        if isinstance(connection, UdpPeer):
+            stats.update(frames=connection.frames, recovered=connection.recovered, lost=connection.lost,
+                         stale=connection.stale, duplicates=connection.duplicates)
+        log.info("Connection with %s closed", connection.address, **stats)
     
-    # Try to get the actual IP address
     try:
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.connect(("8.8.8.8", 80))
-        host = s.getsockname()[0]
-        s.close()
-    except:
-        print("Could not determine IP address, using localhost")
-    
-    port = 5000  # Port number above 1024
-    
-    print(f"Server starting on {host}:{port}")
-    
-    server_socket = socket.socket()  # Create socket instance
-    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)  # Allow address reuse
+        # Bind host address and port; all clients are served from this thread
+        if USE_UDP:
+            server = UdpInputServer(host, port, on_frames, on_connect, on_disconnect, NETWORK_CONDITIONS)
+        else:
+            server = InputServer(host, port, on_frames, on_connect, on_disconnect)
+    except Exception as e:
+        log.error("Server error: %s", e)
+        return
     
     try:
-        # Bind host address and port
-        server_socket.bind((host, port))
-        print("Server enabled...")
-        
-        # Configure how many clients the server can listen to simultaneously
-        server_socket.listen(2)
-        print("Waiting for client connection...")
-        
-        while True:
-            conn, address = server_socket.accept()  # Accept new connection
-            print(f"Connection from: {address}")
-            
-            try:
-                # Process client input
-                while True:
-                    # Receive data stream
-                    data = conn.recv(1024).decode()
-                    if not data:
-                        break
-                    
-                    # Process received command
-                    print(f"From client: {data}")
-                    
-                    with game_lock:
-                        bucket_speed = INITIAL_BUCKET_SPEED * bucket_speed_multiplier
-                        
-                        if data == 'w':  # Move up
-                            target_bucket_y = max(SCREEN_HEIGHT // 2, target_bucket_y - bucket_speed)
-                        elif data == 's':  # Move down
-                            target_bucket_y = min(SCREEN_HEIGHT - BUCKET_HEIGHT, target_bucket_y + bucket_speed)
-                        elif data == 'a':  # Move left
-                            target_bucket_x = max(BORDER_WIDTH, target_bucket_x - bucket_speed)
-                        elif data == 'd':  # Move right
-                            target_bucket_x = min(BORDER_WIDTH + GAME_AREA_WIDTH - BUCKET_WIDTH, target_bucket_x + bucket_speed)
-                        # Handle diagonal movement
-                        elif data == 'ul':  # Up-left diagonal
-                            target_bucket_y = max(SCREEN_HEIGHT // 2, target_bucket_y - bucket_speed)
-                            target_bucket_x = max(BORDER_WIDTH, target_bucket_x - bucket_speed)
-                        elif data == 'ur':  # Up-right diagonal
-                            target_bucket_y = max(SCREEN_HEIGHT // 2, target_bucket_y - bucket_speed)
-                            target_bucket_x = min(BORDER_WIDTH + GAME_AREA_WIDTH - BUCKET_WIDTH, target_bucket_x + bucket_speed)
-                        elif data == 'dl':  # Down-left diagonal
-                            target_bucket_y = min(SCREEN_HEIGHT - BUCKET_HEIGHT, target_bucket_y + bucket_speed)
-                            target_bucket_x = max(BORDER_WIDTH, target_bucket_x - bucket_speed)
-                        elif data == 'dr':  # Down-right diagonal
-                            target_bucket_y = min(SCREEN_HEIGHT - BUCKET_HEIGHT, target_bucket_y + bucket_speed)
-                            target_bucket_x = min(BORDER_WIDTH + GAME_AREA_WIDTH - BUCKET_WIDTH, target_bucket_x + bucket_speed)
-                        elif data == 'r':  # Restart game
-                            print(f"Restart requested: {restart_requested}")
-                            restart_requested = True
-                        elif data == 'q':  # Client quitting
-                            print(f"Client {address} paused")
-                            paused = True
-            
-            except ConnectionResetError:
-                print(f"Connection with {address} was reset")
-            except Exception as e:
-                print(f"Error handling client {address}: {e}")
-            finally:
-                conn.close()
-                print(f"Connection with {address} closed")
-    
-    except Exception as e:
-        print(f"Server error: {e}")
+        log.info("Server enabled...")
+        log.info("Waiting for client connection...")
+        log_startup('waiting for client connection')
+        server.serve_forever(on_poll=broadcast_snapshot)
+    except Exception:
+        log.exception("Server error")
+        if game_log.output_path:
+            game_log.dump_recent(count=20)  # The log file has it all; show what led up to it here too
     finally:
-        server_socket.close()
-        print("Server socket closed")
+        server.close()
+        log.info("Server socket closed")
+
+def log_startup(event):
+    # Log the time from process launch to event, the first time it happens
+    elapsed = startup.mark(event)
+    if elapsed is not None:
+        log.info("Startup: %s after %.0f ms", event, elapsed * 1e3, mode='UDP' if USE_UDP else 'TCP')
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Bucket Catch Game server")
+    parser.add_argument("--config", default=None,
+                        help=f"settings file with a [server] host and port (default: {settings.CONFIG_FILE} if present)")
+    parser.add_argument("--host", default=None,
+                        help=f"address to listen on (default: {settings.DEFAULT_BIND_HOST}, all interfaces)")
+    parser.add_argument("--port", type=int, default=None,
+                        help=f"port to listen on (default: {settings.DEFAULT_PORT})")
+    parser.add_argument("--dirty-rects", action="store_true",
+                        help="only redraw the regions that changed each frame")
+    parser.add_argument("--tick-rate", type=settings.positive_int, default=TICK_RATE,
+                        help="simulation ticks per second (default: %(default)s)")
+    parser.add_argument("--fps", type=int, default=FRAME_RATE,
+                        help="rendered frames per second cap, 0 for uncapped (default: %(default)s)")
+    parser.add_argument("--snapshot-rate", type=int, default=SNAPSHOT_RATE,
+                        help="game state snapshots sent to clients per second, 0 to disable (default: %(default)s)")
+    parser.add_argument("--udp", action="store_true",
+                        help="serve clients over UDP, with sequenced and redundant input packets")
+    parser.add_argument("--loss", type=float, default=0.0,
+                        help="simulated loss rate of packets sent over UDP, e.g. 0.1 (default: %(default)s)")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="simulated one-way latency in seconds for packets sent over UDP (default: %(default)s)")
+    parser.add_argument("--jitter", type=float, default=0.0,
+                        help="simulated extra random latency in seconds over UDP (default: %(default)s)")
+    parser.add_argument("--log-level", default="info", choices=["debug", "info", "warning", "error"],
+                        help="server log level; debug includes sampled input traffic (default: %(default)s)")
+    parser.add_argument("--log-file", default=None, help="write the log to this file instead of the console")
+    parser.add_argument("--log-json", action="store_true", help="write the log as JSON lines")
+    parser.add_argument("--log-input-rate", type=int, default=INPUT_LOG_RATE,
+                        help="input traffic lines per second logged at debug level (default: %(default)s)")
+    parser.add_argument("--player", default=PLAYER_NAME,
+                        help="player whose progress is loaded and saved (default: %(default)s)")
+    parser.add_argument("--progress-db", default=PROGRESS_DB,
+                        help="SQLite file that player progress is saved to (default: %(default)s)")
+    parser.add_argument("--no-save", action="store_true", help="do not load or save player progress")
+    parser.add_argument("--record", default=None, metavar="DIR",
+                        help="record every game (seed and commands per tick) to DIR, for replay.py")
+    parser.add_argument("--profile-overlay", action="store_true",
+                        help="show the frame profiler overlay from the start (F3 toggles it in game)")
+    parser.add_argument("--metrics-file", default=None,
+                        help="write frame profiler metrics in Prometheus text format to this file")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="serve frame profiler metrics at http://127.0.0.1:PORT/metrics")
+    parser.add_argument("--metrics-interval", type=float, default=METRICS_INTERVAL,
+                        help="seconds between writes of the metrics file (default: %(default)s)")
+    return parser.parse_args()
 
 if __name__ == "__main__":
+    args = parse_args()
+    DIRTY_RECT_RENDERING = args.dirty_rects
+    TICK_RATE = args.tick_rate
+    FRAME_RATE = args.fps
+    SNAPSHOT_RATE = args.snapshot_rate
+    INPUT_LOG_RATE = args.log_input_rate
+    game_log.setup(args.log_level.upper(), args.log_file, args.log_json)
+    USE_UDP = args.udp
+    if args.loss or args.latency or args.jitter:
+        NETWORK_CONDITIONS = NetworkConditions(args.loss, args.latency, args.jitter)
+    PROFILE_OVERLAY = args.profile_overlay
+    RECORD_DIR = args.record
+    SERVER_HOST, SERVER_PORT = settings.address(settings.load_config(args.config), 'server', args.host, args.port)
+    PLAYER_NAME = args.player
+    
+    # Load and save player progress in the background
+    if not args.no_save:
+        progress_store = ProgressStore(args.progress_db)
+        progress_store.start()
+        progress_store.load(PLAYER_NAME)
+        progress_store.load_scores(leaderboard)
+    
+    # Export the frame profile for monitoring, if asked to
+    metrics = None
+    if args.metrics_file or args.metrics_port is not None:
+        metrics = MetricsExporter(profiler, args.metrics_file, args.metrics_port, args.metrics_interval)
+        metrics.start()
+        if metrics.address:
+            log.info("Serving metrics on http://%s:%d/metrics", *metrics.address)
+    
     # Start game and server threads
     game_thread = threading.Thread(target=GameThread)
     server_thread = threading.Thread(target=ServerThread)
@@ -832,6 +928,15 @@ if __name__ == "__main__":
         while game_thread.is_alive() and server_thread.is_alive():
             time.sleep(1)
     except KeyboardInterrupt:
-        print("Server shutting down...")
+        log.info("Server shutting down...")
     except Exception as e:
-        print(f"Error in main thread: {e}")
+        log.error("Error in main thread: %s", e)
+    
+    # Write the final metrics file
+    if metrics is not None:
+        metrics.stop()
+    
+    # Write the progress saved since the last flush
+    if progress_store is not None:
+        progress_store.close()
+        progress_store.report()
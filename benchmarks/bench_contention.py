@@ -0,0 +1,161 @@
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+# Import the game modules from the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import pygame
+
+from command_queue import CommandQueue
+from protocol import DOWN, LEFT, MSG_INPUT_STATE, RIGHT, UP
+from simulation import OBJECT_SIZE, SCREEN_HEIGHT, SCREEN_WIDTH, FixedTimestep, GameSimulation, PlayerProgress
+
+# How the network thread hands commands to the game thread:
+#   lock+draw  one lock, held by the game thread across stepping and the object draw loop (original)
+#   lock       one lock, held by the game thread across stepping and copying the frame's positions
+#   queue      CommandQueue, drained once per tick; rendering reads an immutable GameState
+MODES = ['lock+draw', 'lock', 'queue']
+DIRECTIONS = [0, UP, DOWN, LEFT, RIGHT, UP | LEFT, UP | RIGHT]
+
+
+# Acquires a shared lock as a context manager and records how long this side waited for it
+class LockWaits:
+    def __init__(self, lock):
+        self._lock = lock
+        self.acquires = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def __enter__(self):
+        start = time.perf_counter()
+        self._lock.acquire()
+        wait = time.perf_counter() - start
+        self.acquires += 1
+        self.total_wait += wait
+        if wait > self.max_wait:
+            self.max_wait = wait
+        return self
+
+    def __exit__(self, *exc_info):
+        self._lock.release()
+
+
+# Game thread stand-in: fixed ticks at the frame rate plus a sprite blit per object
+def game_loop(mode, sim, lock, pending, queue, stop, frame_rate, waits):
+    screen = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+    sprite = pygame.Surface((OBJECT_SIZE, OBJECT_SIZE))
+    timestep = FixedTimestep(frame_rate)
+    clock = pygame.time.Clock()
+    frames = 0
+
+    def draw(objects):
+        screen.fill((0, 0, 0))
+        for x, y in objects:
+            screen.blit(sprite, (int(x), int(y)))
+
+    while not stop.is_set():
+        ticks = timestep.advance(clock.tick(frame_rate) / 1000.0)
+        if mode == 'queue':
+            for _ in range(ticks):
+                sim.step(timestep.dt, queue.drain())
+            state = sim.state()
+            draw(state.interpolated_objects(timestep.alpha))
+        else:
+            with lock:
+                now = time.perf_counter()
+                for pushed_at, command in pending:
+                    waits.append(now - pushed_at)
+                    sim.apply_command(command)
+                pending.clear()
+                for _ in range(ticks):
+                    sim.step(timestep.dt)
+                objects = sim.state().interpolated_objects(timestep.alpha)
+                if mode == 'lock+draw':
+                    draw(objects)
+            if mode == 'lock':
+                draw(objects)
+        frames += 1
+    return frames
+
+
+def measure(mode, objects, command_rate, batch, seconds, frame_rate):
+    progress = PlayerProgress()
+    progress.lives_level = 10 ** 6
+    sim = GameSimulation(progress, rng=random.Random(1))
+    rng = random.Random(2)
+    for _ in range(objects):
+        sim.spawn_object()
+    # Spread them over the top of the screen and hold them there for the whole run
+    for i in range(sim.objects.count):
+        sim.objects.y[i] = rng.uniform(0, SCREEN_HEIGHT // 2)
+        sim.objects.speed[i] = 0.0
+
+    lock = threading.Lock()
+    game_lock, network_lock = LockWaits(lock), LockWaits(lock)
+    pending, queue, waits = [], CommandQueue(), []
+    stop = threading.Event()
+    result = {}
+    game = threading.Thread(target=lambda: result.update(
+        frames=game_loop(mode, sim, game_lock, pending, queue, stop, frame_rate, waits)))
+    game.start()
+
+    # Network thread stand-in (this thread): batches of input frames at command_rate
+    interval = batch / command_rate
+    start = next_batch = time.perf_counter()
+    pushed = 0
+    while time.perf_counter() - start < seconds:
+        commands = [(MSG_INPUT_STATE, rng.choice(DIRECTIONS)) for _ in range(batch)]
+        if mode == 'queue':
+            queue.extend(commands)
+        else:
+            now = time.perf_counter()
+            with network_lock:
+                pending.extend((now, command) for command in commands)
+        pushed += batch
+        next_batch += interval
+        time.sleep(max(0.0, next_batch - time.perf_counter()))
+
+    stop.set()
+    game.join()
+    if mode == 'queue':
+        average_age = queue.total_wait / max(1, queue.drained)
+        max_age = queue.max_wait
+        network_wait = 0.0
+        max_network_wait = 0.0
+    else:
+        average_age = sum(waits) / max(1, len(waits))
+        max_age = max(waits, default=0.0)
+        network_wait = network_lock.total_wait / max(1, network_lock.acquires)
+        max_network_wait = network_lock.max_wait
+    return result['frames'] / seconds, pushed / seconds, network_wait, max_network_wait, \
+        game_lock.total_wait, average_age, max_age
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lock wait time between the network and game threads")
+    parser.add_argument("--objects", type=int, default=500)
+    parser.add_argument("--command-rate", type=int, default=20000, help="commands per second from the network")
+    parser.add_argument("--batch", type=int, default=10, help="commands per received batch")
+    parser.add_argument("--fps", type=int, default=60)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+
+    pygame.init()
+    print(f"{args.objects} objects, {args.command_rate} commands/s in batches of {args.batch}, {args.fps} fps")
+    print(f"{'mode':>10}  {'fps':>5}  {'cmds/s':>7}  {'net wait us':>11}  {'net max ms':>10}  "
+          f"{'game wait ms/s':>14}  {'cmd age ms':>10}  {'age max ms':>10}")
+    for mode in MODES:
+        fps, rate, wait, max_wait, lock_wait, age, max_age = measure(
+            mode, args.objects, args.command_rate, args.batch, args.seconds, args.fps)
+        print(f"{mode:>10}  {fps:5.1f}  {rate:7.0f}  {wait * 1e6:11.1f}  {max_wait * 1000:10.2f}  "
+              f"{lock_wait / args.seconds * 1000:14.2f}  {age * 1000:10.2f}  {max_age * 1000:10.2f}")
+
+
+if __name__ == "__main__":
+    main()
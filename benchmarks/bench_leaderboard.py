@@ -0,0 +1,88 @@
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Import the game modules from the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from leaderboard import Leaderboard
+from progress_store import ProgressStore
+
+ENTRIES = 1000000
+QUERIES = 20000
+MAX_SCORE = 5000
+
+
+def make_rows(count, rng):
+    return [(f"player{i}", rng.randrange(MAX_SCORE), 1.7e9 + i) for i in range(count)]
+
+
+def per_call_us(function, args):
+    start = time.perf_counter()
+    for arg in args:
+        function(arg)
+    return (time.perf_counter() - start) / len(args) * 1e6
+
+
+# Leaderboard operations with ENTRIES players, against a scan of the scores for comparison
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else ENTRIES
+    rng = random.Random(1)
+    rows = make_rows(count, rng)
+    players = [rng.randrange(count) for _ in range(QUERIES)]
+
+    board = Leaderboard()
+    start = time.perf_counter()
+    board.load(rows)
+    print(f"Loaded {len(board)} entries in {time.perf_counter() - start:.2f} s")
+    expected_top = board.top(10)
+
+    names = [f"player{i}" for i in players]
+    results = [
+        ("rank", per_call_us(board.rank, names)),
+        ("top 10", per_call_us(lambda _: board.top(10), names)),
+        ("10 around a player", per_call_us(lambda name: board.around(name, 10), names)),
+        ("submit, not a best", per_call_us(lambda name: board.submit(name, 0), names)),
+        ("submit, new best", per_call_us(lambda name: board.submit(name, board.score(name) + 1), names)),
+        ("submit, new player", per_call_us(lambda i: board.submit(f"new{i}", rng.randrange(MAX_SCORE)),
+                                           range(QUERIES))),
+    ]
+
+    # What a rank costs without the index: count the better scores
+    scores = [score for _, score, _ in rows]
+    targets = [board.score(name) for name in names[:20]]
+    scan = per_call_us(lambda target: sum(1 for score in scores if score > target), targets)
+    results.append(("rank by scanning all scores", scan))
+
+    for name, micros in results:
+        print(f"{name:>28}: {micros:10.2f} us")
+
+    # Durable storage: write every entry through the progress store, then load it back
+    with tempfile.TemporaryDirectory() as directory:
+        store = ProgressStore(os.path.join(directory, "bench.db"), interval=0.1)
+        store.start()
+        start = time.perf_counter()
+        for player, score, achieved in rows:
+            store.save_score(player, score, achieved)
+        queued = time.perf_counter() - start
+        store.close()
+        written = time.perf_counter() - start
+        print(f"Saved {count} scores: {queued / count * 1e6:.2f} us per save on the caller, "
+              f"{written:.2f} s until written")
+
+        store = ProgressStore(os.path.join(directory, "bench.db"))
+        loaded = Leaderboard()
+        start = time.perf_counter()
+        store.start()
+        store.load_scores(loaded)
+        while len(loaded) < count:
+            time.sleep(0.01)
+        print(f"Loaded {len(loaded)} saved scores into a leaderboard in {time.perf_counter() - start:.2f} s")
+        store.close()
+        assert loaded.top(10) == expected_top
+
+
+if __name__ == "__main__":
+    main()
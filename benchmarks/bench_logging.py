@@ -0,0 +1,61 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+# Import the game modules from the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import game_log
+from protocol import LEFT, MSG_INPUT_STATE, MSG_PAUSE, RIGHT, describe_frame
+
+BATCH = [(MSG_INPUT_STATE, LEFT), (MSG_INPUT_STATE, LEFT | RIGHT), (MSG_PAUSE, 0)]
+CONNECTION = "127.0.0.1:50000"
+
+
+# Cost per received batch of the server's input traffic logging, in microseconds
+def time_calls(function, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        function()
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cost of logging each received input batch")
+    parser.add_argument("--calls", type=int, default=200000)
+    args = parser.parse_args()
+
+    log = game_log.get_logger('bench')
+
+    # Before: a print per batch, here into a file (a terminal is usually slower still)
+    with tempfile.TemporaryFile('w') as output, redirect_stdout(output):
+        print_cost = time_calls(lambda: print(f"From client {CONNECTION}: "
+                                              f"{', '.join(describe_frame(frame) for frame in BATCH)}"), args.calls)
+
+    def log_input(input_log):
+        if input_log.enabled and input_log.allow():
+            input_log.debug("From client %s: %s", CONNECTION, ', '.join(describe_frame(frame) for frame in BATCH),
+                            client=CONNECTION, frames=len(BATCH))
+
+    results = [('print per batch', print_cost)]
+    for level, rate, label in [('INFO', game_log.INPUT_LOG_RATE, 'debug off'),
+                               ('DEBUG', game_log.INPUT_LOG_RATE, f'debug on, {game_log.INPUT_LOG_RATE} lines/s'),
+                               ('DEBUG', 10 ** 9, 'debug on, every batch')]:
+        with tempfile.TemporaryDirectory() as directory:
+            game_log.setup(level, os.path.join(directory, 'server.log'), json_lines=True,
+                           queue_size=args.calls + 1)
+            input_log = game_log.RateLimitedLog(log, rate)
+            cost = time_calls(lambda: log_input(input_log), args.calls)
+            game_log.shutdown()
+        results.append((label, cost))
+
+    print(f"{'':>28}  {'us/batch':>8}")
+    for label, cost in results:
+        print(f"{label:>28}  {cost:8.3f}")
+
+
+if __name__ == "__main__":
+    main()
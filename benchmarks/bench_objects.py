@@ -0,0 +1,79 @@
+import os
+import random
+import sys
+import time
+
+# Import the game modules from the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import object_store
+from object_store import ObjectStore
+from simulation import OBJECT_SIZE, SCREEN_HEIGHT
+
+COUNTS = [10, 100, 1000, 10000, 100000]
+TICKS = 50
+BUCKET = (360, 500, 440, 560)  # left, top, right, bottom
+
+
+def make_objects(count):
+    rng = random.Random(count)
+    return [(rng.uniform(133, 637), rng.uniform(0, 400), rng.uniform(1, 3)) for _ in range(count)]
+
+
+# The list-of-lists update the game used before the object store
+def step_lists(objects, frames):
+    left, top, right, bottom = BUCKET
+    caught = missed = 0
+    updated_objects = []
+    for obj in objects:
+        obj_x, obj_y, obj_speed = obj
+        obj_y += obj_speed * frames
+        if (obj_x + OBJECT_SIZE > left and obj_x < right and
+                obj_y + OBJECT_SIZE > top and obj_y < bottom):
+            caught += 1
+        elif obj_y < SCREEN_HEIGHT:
+            updated_objects.append([obj_x, obj_y, obj_speed])
+        else:
+            missed += 1
+    return updated_objects, caught, missed
+
+
+def time_lists(objects):
+    objects = [list(obj) for obj in objects]
+    start = time.perf_counter()
+    for _ in range(TICKS):
+        objects, _, _ = step_lists(objects, 1.0)
+    return (time.perf_counter() - start) / TICKS * 1e6, len(objects)
+
+
+def time_store(objects, use_numpy):
+    store = ObjectStore(OBJECT_SIZE, use_numpy=use_numpy)
+    for obj in objects:
+        store.add(*obj)
+    start = time.perf_counter()
+    for _ in range(TICKS):
+        store.step(1.0, *BUCKET, SCREEN_HEIGHT)
+    return (time.perf_counter() - start) / TICKS * 1e6, len(store)
+
+
+# Per-tick cost of moving, catching and culling N objects
+def main():
+    backends = [("lists", lambda objects: time_lists(objects)),
+                ("array", lambda objects: time_store(objects, False))]
+    if object_store.numpy is not None:
+        backends.append(("numpy", lambda objects: time_store(objects, True)))
+    else:
+        print("NumPy is not installed, only the array.array store is measured")
+
+    print(f"{'objects':>8}" + "".join(f"  {name + ' us/tick':>15}" for name, _ in backends))
+    for count in COUNTS:
+        objects = make_objects(count)
+        results = [run(objects) for _, run in backends]
+
+        # Every backend must leave the same objects alive
+        assert len({remaining for _, remaining in results}) == 1
+        print(f"{count:>8}" + "".join(f"  {micros:15.1f}" for micros, _ in results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import argparse
+import os
+import sys
+import time
+
+# Import the game modules from the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from rooms import RoomManager
+from simulation import DEFAULT_TICK_RATE
+
+ROOM_COUNTS = [25, 50, 100, 200, 400, 800]
+
+
+# Load one worker process with bot-driven rooms and measure how much of a core they need
+def measure(rooms, tick_rate, seconds):
+    manager = RoomManager(workers=1, tick_rate=tick_rate)
+    try:
+        for room_id in range(rooms):
+            manager.create_room(room_id, seed=room_id, bot=True)
+        time.sleep(1.0)  # Warm up
+
+        before, start = manager.stats()[0], time.perf_counter()
+        time.sleep(seconds)
+        after, wall = manager.stats()[0], time.perf_counter() - start
+    finally:
+        manager.stop()
+
+    utilization = (after['busy_time'] - before['busy_time']) / wall
+    ticks_per_room = (after['ticks'] - before['ticks']) / rooms / wall
+    loops = after['loops'] - before['loops']
+    late = (after['late_loops'] - before['late_loops']) / max(1, loops)
+    return utilization, ticks_per_room, late
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rooms per core at a fixed tick rate")
+    parser.add_argument("--tick-rate", type=int, default=DEFAULT_TICK_RATE)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+
+    print(f"One worker process, {args.tick_rate} ticks/s per room")
+    print(f"{'rooms':>6}  {'core used':>9}  {'ticks/s/room':>12}  {'late loops':>10}  {'rooms/core':>10}")
+    for rooms in ROOM_COUNTS:
+        utilization, ticks_per_room, late = measure(rooms, args.tick_rate, args.seconds)
+        print(f"{rooms:>6}  {utilization:9.1%}  {ticks_per_room:12.1f}  {late:10.1%}  {rooms / utilization:10.0f}")
+
+        # Once the worker can't keep the tick rate the remaining counts only get worse
+        if ticks_per_room < 0.95 * args.tick_rate:
+            break
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import os
+import sys
+import time
+
+# Run headless and import the game modules from the repository root
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import pygame
+
+import shading
+
+SIZES = [(800, 600), (1280, 720), (1920, 1080), (2560, 1440)]
+FRAMES = 50
+
+
+# One frame's worth of gradient work: background, bucket, 20 objects, 5 health boxes, 5 buttons
+def draw_frame(screen, time_value):
+    width, height = screen.get_size()
+    shading.fill_wave_gradient(screen, screen.get_rect(), (135, 206, 250), (100, 180, 255), time_value)
+    shading.fill_shaded(screen, (width // 2, height - 100, 80, 60), (255, 255, 0), 0.3)
+    for i in range(20):
+        shading.fill_shaded(screen, (40 * i, (i * 37) % height, 30, 30), (255, 0, 0), 0.5)
+    for i in range(5):
+        shading.fill_shaded(screen, (width - 30 * (i + 1), 40, 20, 20), (255, 0, 0), 0.3)
+        shading.fill_shaded(screen, (width // 2 - 150, 100 + 70 * i, 300, 50), (100, 100, 255), 0.3)
+
+
+def time_frames(screen):
+    start = time.perf_counter()
+    for frame in range(FRAMES):
+        draw_frame(screen, frame / 60)
+    return (time.perf_counter() - start) / FRAMES * 1000
+
+
+def main():
+    pygame.init()
+    if shading.numpy is None:
+        print("NumPy is not installed, only the fallback loops can be measured")
+
+    print(f"{'size':>11}  {'loops ms':>9}  {'numpy ms':>9}  {'saved ms':>9}  {'speedup':>7}")
+    for size in SIZES:
+        screen = pygame.display.set_mode(size)
+
+        shading.use_numpy = False
+        loop_ms = time_frames(screen)
+
+        if shading.numpy is None:
+            print(f"{size[0]:>5}x{size[1]:<5}  {loop_ms:9.2f}")
+            continue
+
+        shading.use_numpy = True
+        numpy_ms = time_frames(screen)
+        print(f"{size[0]:>5}x{size[1]:<5}  {loop_ms:9.2f}  {numpy_ms:9.2f}  "
+              f"{loop_ms - numpy_ms:9.2f}  {loop_ms / numpy_ms:6.1f}x")
+
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
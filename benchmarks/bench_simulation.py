@@ -0,0 +1,46 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+# Import the game modules from the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from protocol import MSG_INPUT_STATE
+from simulation import MOVE_DIRECTIONS, GameSimulation
+
+TICK = 1 / 60
+
+
+# Step the headless simulation with random client input and report ticks per second
+def main():
+    parser = argparse.ArgumentParser(description="Headless game logic benchmark / soak test")
+    parser.add_argument("--ticks", type=int, default=200000, help="simulation ticks to run")
+    parser.add_argument("--seed", type=int, default=1, help="seed for spawning and input")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    sim = GameSimulation(rng=random.Random(args.seed))
+    commands = [(MSG_INPUT_STATE, directions) for directions in [0] + MOVE_DIRECTIONS]
+    games = 1
+    max_objects = 0
+
+    start = time.perf_counter()
+    for tick in range(args.ticks):
+        inputs = [rng.choice(commands)] if tick % 15 == 0 else []
+        sim.step(TICK, inputs)
+        max_objects = max(max_objects, len(sim.objects))
+        if sim.game_over:
+            sim.reset()
+            games += 1
+    elapsed = time.perf_counter() - start
+
+    print(f"{args.ticks} ticks in {elapsed:.2f} s: {args.ticks / elapsed:,.0f} ticks/s "
+          f"({args.ticks / elapsed * TICK:,.0f}x real time)")
+    print(f"{games} games, up to {max_objects} objects on screen, "
+          f"pygame imported: {'pygame' in sys.modules}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+# Import the game modules from the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from simulation import DEFAULT_TICK_RATE, GameSimulation, PlayerProgress
+from protocol import FRAME_SIZE, MAX_PAYLOAD
+from snapshot import (DEFAULT_SNAPSHOT_RATE, MAX_SNAPSHOT_OBJECTS, SnapshotHistory, SnapshotReceiver,
+                      encode_snapshot)
+
+OBJECT_COUNTS = [10, 100, 300, 1000]
+OBJECT_LIFETIME = 300  # Ticks an object takes to fall through the screen at the starting speed
+
+
+# Run a game that keeps about `objects` objects on screen and measure the snapshots sent to a
+# client whose acks arrive `ack_lag` snapshots late
+def measure(objects, snapshot_rate, tick_rate, ack_lag, seconds):
+    progress = PlayerProgress()
+    progress.lives_level = 10 ** 6  # Never run out of lives
+    sim = GameSimulation(progress, rng=random.Random(1))
+    history = SnapshotHistory()
+    receiver = SnapshotReceiver()
+    dt = 1.0 / tick_rate
+    ticks_per_snapshot = max(1, tick_rate // snapshot_rate)
+
+    spawn_rate = objects / OBJECT_LIFETIME
+    owed = 0.0
+    acks = []
+    delta_bytes = full_bytes = snapshots = 0
+    encode_time = 0.0
+    for tick in range(int((seconds + OBJECT_LIFETIME / tick_rate) * tick_rate)):
+        owed += spawn_rate
+        while owed >= 1:
+            sim.spawn_object()
+            owed -= 1
+        sim.step(dt)
+
+        if tick % ticks_per_snapshot or tick < OBJECT_LIFETIME:
+            continue  # Not a snapshot tick, or still filling the screen
+        history.capture(sim.state(), tick_rate)
+        acked = acks[-1 - ack_lag] if len(acks) > ack_lag else None
+
+        start = time.perf_counter()
+        message = history.message_for(acked)
+        encode_time += time.perf_counter() - start
+        delta_bytes += len(message)
+        full_bytes += len(encode_snapshot(history.latest))
+        snapshots += 1
+
+        # The client applies it and acks
+        snapshot = receiver.apply(message[4:], 0.0)
+        acks.append(snapshot.seq)
+
+    return len(sim.objects), delta_bytes / snapshots, full_bytes / snapshots, encode_time / snapshots
+
+
+# More objects than one message holds: every snapshot must still encode, full or delta, and the
+# client must end up with the objects the server kept
+def check_oversized(tick_rate):
+    sim = GameSimulation(rng=random.Random(1))
+    history = SnapshotHistory()
+    receiver = SnapshotReceiver()
+    for _ in range(MAX_SNAPSHOT_OBJECTS + 1000):
+        sim.spawn_object()
+    acked = None
+    for _ in range(2):
+        snapshot = history.capture(sim.state(), tick_rate)
+        assert len(snapshot.objects) == MAX_SNAPSHOT_OBJECTS
+        message = history.message_for(acked)
+        assert len(message) <= FRAME_SIZE + MAX_PAYLOAD
+        acked = receiver.apply(message[FRAME_SIZE:], 0.0).seq
+        assert receiver.latest.objects == snapshot.objects
+        # Replace every object, so the next delta removes and spawns a full snapshot's worth
+        sim.reset()
+        for _ in range(MAX_SNAPSHOT_OBJECTS + 1000):
+            sim.spawn_object()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Snapshot size and bandwidth per client")
+    parser.add_argument("--snapshot-rate", type=int, default=DEFAULT_SNAPSHOT_RATE)
+    parser.add_argument("--tick-rate", type=int, default=DEFAULT_TICK_RATE)
+    parser.add_argument("--ack-lag", type=int, default=2, help="snapshots sent before an ack arrives")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    args = parser.parse_args()
+
+    check_oversized(args.tick_rate)
+    print(f"{args.snapshot_rate} snapshots/s, acks {args.ack_lag} snapshots behind")
+    print(f"{'objects':>8}  {'delta bytes':>11}  {'full bytes':>10}  {'delta KB/s':>10}  {'full KB/s':>9}  {'encode us':>9}")
+    for objects in OBJECT_COUNTS:
+        live, delta, full, encode = measure(objects, args.snapshot_rate, args.tick_rate, args.ack_lag, args.seconds)
+        print(f"{live:>8}  {delta:11.0f}  {full:10.0f}  {delta * args.snapshot_rate / 1024:10.2f}  "
+              f"{full * args.snapshot_rate / 1024:9.2f}  {encode * 1e6:9.1f}")
+
+
+if __name__ == "__main__":
+    main()
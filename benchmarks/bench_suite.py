@@ -0,0 +1,262 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import socket
+import sys
+import threading
+import time
+
+# Run headless and import the game modules from the repository root
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import pygame
+
+import GameServer
+import shading
+import text_cache
+from frame_profiler import FrameProfiler
+from game_background import draw_game_area_gradient
+from protocol import DOWN, LEFT, MSG_INPUT_STATE, RIGHT, UP, encode_frame
+from simulation import BORDER_WIDTH, SCREEN_HEIGHT, SCREEN_WIDTH, GameSimulation, PlayerProgress
+
+# Headless benchmark suite with a JSON baseline.
+# Each metric is compared with the baseline and the run fails (exit status 1) when one is worse by
+# more than the threshold. Baselines only compare runs on the same machine, so record one per
+# machine first:
+#
+#   python benchmarks/bench_suite.py --save-baseline
+#   python benchmarks/bench_suite.py --threshold 0.2 --metric-threshold server_commands_per_s=0.5
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DEFAULT_THRESHOLD = 0.25  # Allowed slowdown as a fraction of the baseline
+OBJECT_COUNTS = [100, 500]
+GAME_FRAMES = 300  # Frames of GameThread profiled per object count
+SERVER_COMMANDS = 50000
+DIRECTIONS = [0, UP, DOWN, LEFT, RIGHT, UP | LEFT, UP | RIGHT]
+
+
+def best_of(function, repeat, number):
+    # Fastest per-call time in seconds over repeat runs of number calls (the least disturbed run)
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def freeze_objects(sim, count, rng):
+    # Spread count objects over the top half of the screen and hold them there
+    for _ in range(count):
+        sim.spawn_object()
+    for i in range(sim.objects.count):
+        sim.objects.y[i] = rng.uniform(0, SCREEN_HEIGHT // 2)
+        sim.objects.speed[i] = 0.0
+
+
+def bench_render_helpers(repeat):
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    font = text_cache.get_font('Arial', 24)
+    clock = {'t': 0.0}
+
+    def next_time():
+        clock['t'] += 1 / 60
+        return clock['t']
+
+    button = GameServer.Button(SCREEN_WIDTH // 2 - 100, 250, 200, 50, "Play")
+    hover_button = GameServer.Button(SCREEN_WIDTH // 2 - 100, 320, 200, 50, "Upgrades")
+    hover_button.is_hovered = True
+    return {
+        'game_area_gradient_ms': (best_of(lambda: draw_game_area_gradient(screen, BORDER_WIDTH, next_time()),
+                                          repeat, 20) * 1e3, 'ms', 'lower'),
+        'full_screen_gradient_ms': (best_of(lambda: GameServer.draw_full_screen_gradient(
+            screen, (135, 206, 250), (100, 180, 255), next_time()), repeat, 20) * 1e3, 'ms', 'lower'),
+        'button_draw_us': (best_of(lambda: button.draw(screen, font), repeat, 1000) * 1e6, 'us', 'lower'),
+        'button_draw_hover_us': (best_of(lambda: hover_button.draw(screen, font), repeat, 1000) * 1e6, 'us', 'lower'),
+    }
+
+
+def bench_simulation(object_counts, repeat):
+    # One fixed tick (spawning, movement, catch and miss tests) with count objects on screen
+    results = {}
+    for count in object_counts:
+        progress = PlayerProgress()
+        progress.lives_level = 10 ** 6  # Never run out of lives (a game over would end the work per tick)
+        sim = GameSimulation(progress, rng=random.Random(1))
+        freeze_objects(sim, count, random.Random(2))
+        results[f'sim_step_{count}_objects_us'] = (best_of(lambda: sim.step(1 / 60), repeat, 500) * 1e6, 'us', 'lower')
+    return results
+
+
+def bench_game_frames(object_counts, frames):
+    # Median busy time of a real GameThread frame (uncapped, no menus), from its frame profiler
+    results = {}
+    play_screen, reset_game, frame_rate = GameServer.play_screen, GameServer.reset_game, GameServer.FRAME_RATE
+    try:
+        for count in object_counts:
+            def populated_reset():
+                reset_game()
+                freeze_objects(GameServer.sim, count, random.Random(2))
+                GameServer.sim.time_since_spawn = float('-inf')  # Keep the object count fixed
+                # reset_game() published the empty game; frames before the first tick draw this
+                GameServer.current_state = GameServer.sim.state()
+
+            GameServer.play_screen = lambda screen, font: None
+            GameServer.reset_game = populated_reset
+            GameServer.FRAME_RATE = 0
+            profiler = GameServer.profiler = FrameProfiler()
+            drawn = []  # Objects in each profiled frame
+            end_frame = profiler.end_frame
+            profiler.end_frame = lambda objects: (drawn.append(objects), end_frame(objects))
+            # GameThread quits pygame when it returns, which invalidates cached fonts and surfaces
+            text_cache.fonts.clear()
+            text_cache.text_cache.clear()
+            GameServer.background_cache.clear()
+            GameServer.sprite_cache.clear()
+
+            def stop_after_frames():
+                deadline = time.perf_counter() + 60
+                while profiler.frames < frames and time.perf_counter() < deadline:
+                    time.sleep(0.01)
+                pygame.event.post(pygame.event.Event(pygame.QUIT))
+
+            threading.Thread(target=stop_after_frames, daemon=True).start()
+            with contextlib.redirect_stdout(io.StringIO()):  # The game's end-of-game reports
+                GameServer.GameThread()
+            if set(drawn) != {count}:
+                raise RuntimeError(f"frames drew {sorted(set(drawn))} objects instead of {count}")
+            results[f'game_frame_{count}_objects_ms'] = (
+                profiler.summary()['frame_quantiles'][0.5] * 1e3, 'ms', 'lower')
+    finally:
+        GameServer.play_screen, GameServer.reset_game, GameServer.FRAME_RATE = play_screen, reset_game, frame_rate
+    return results
+
+
+def bench_server(commands, repeat):
+    # Input frames per second that ServerThread decodes and queues for the game thread, sent by one
+    # TCP client over loopback as fast as it can (best of repeat rounds)
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    GameServer.SERVER_HOST, GameServer.SERVER_PORT = '127.0.0.1', port
+    GameServer.SNAPSHOT_RATE = 0
+    threading.Thread(target=GameServer.ServerThread, daemon=True).start()
+
+    client = None
+    deadline = time.perf_counter() + 5
+    while client is None:
+        try:
+            client = socket.create_connection(('127.0.0.1', port))
+        except ConnectionRefusedError:
+            if time.perf_counter() > deadline:
+                raise
+            time.sleep(0.01)
+
+    rng = random.Random(3)
+    data = b''.join(encode_frame(MSG_INPUT_STATE, rng.choice(DIRECTIONS)) for _ in range(commands))
+    best = 0.0
+    for _ in range(repeat):
+        queued = GameServer.commands.pushed
+        start = time.perf_counter()
+        client.sendall(data)
+        deadline = start + 60
+        while GameServer.commands.pushed - queued < commands and time.perf_counter() < deadline:
+            time.sleep(0.001)
+        best = max(best, (GameServer.commands.pushed - queued) / (time.perf_counter() - start))
+    client.close()
+    return {'server_commands_per_s': (best, '/s', 'higher')}
+
+
+def run(args):
+    pygame.init()
+    metrics = {}
+    metrics.update(bench_render_helpers(args.repeat))
+    metrics.update(bench_simulation(args.objects, args.repeat))
+    metrics.update(bench_game_frames(args.objects, args.frames))
+    metrics.update(bench_server(args.commands, args.repeat))
+    return {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'machine': {'platform': platform.platform(), 'python': platform.python_version(),
+                    'pygame': pygame.version.ver, 'numpy': shading.numpy is not None},
+        'metrics': {name: {'value': value, 'unit': unit, 'better': better}
+                    for name, (value, unit, better) in metrics.items()},
+    }
+
+
+def compare(results, baseline, threshold, metric_thresholds):
+    # Print each metric against the baseline; returns the names of the ones that regressed
+    regressions = []
+    print(f"{'metric':>32}  {'baseline':>12}  {'now':>12}  {'change':>8}")
+    for name, metric in results['metrics'].items():
+        value, unit = metric['value'], metric['unit']
+        base = baseline['metrics'].get(name, {}).get('value') if baseline else None
+        if not base:
+            print(f"{name:>32}  {'-':>12}  {value:10.2f}{unit:>2}  {'new':>8}")
+            continue
+        # How much worse than the baseline, as a fraction (negative when better)
+        worse = value / base - 1 if metric['better'] == 'lower' else base / value - 1
+        allowed = metric_thresholds.get(name, threshold)
+        flag = ''
+        if worse > allowed:
+            regressions.append(name)
+            flag = f'  REGRESSION (> {allowed:.0%})'
+        print(f"{name:>32}  {base:10.2f}{unit:>2}  {value:10.2f}{unit:>2}  {worse:+8.1%}{flag}")
+    return regressions
+
+
+def parse_metric_threshold(text):
+    name, _, fraction = text.partition('=')
+    try:
+        return name, float(fraction)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected NAME=FRACTION, got {text!r}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless benchmark suite with regression thresholds")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON file (default: %(default)s)")
+    parser.add_argument("--save-baseline", action="store_true", help="record this run as the new baseline")
+    parser.add_argument("--output", default=None, help="also write this run's results to a JSON file")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="fail when a metric is worse than the baseline by more than this fraction "
+                             "(default: %(default)s)")
+    parser.add_argument("--metric-threshold", type=parse_metric_threshold, action="append", default=[],
+                        metavar="NAME=FRACTION", help="threshold for one metric, e.g. server_commands_per_s=0.5")
+    parser.add_argument("--objects", type=int, nargs="+", default=OBJECT_COUNTS,
+                        help="object counts for the simulation and frame benchmarks (default: %(default)s)")
+    parser.add_argument("--frames", type=int, default=GAME_FRAMES, help="GameThread frames per object count")
+    parser.add_argument("--commands", type=int, default=SERVER_COMMANDS, help="input frames sent to ServerThread")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per micro benchmark; the fastest counts")
+    args = parser.parse_args()
+
+    results = run(args)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            json.dump(results, output, indent=2)
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+    regressions = compare(results, baseline, args.threshold, dict(args.metric_threshold))
+
+    if baseline is None:
+        with open(args.baseline, 'w', encoding='utf-8') as baseline_file:
+            json.dump(results, baseline_file, indent=2)
+        print(f"Recorded as the baseline in {args.baseline}")
+    elif regressions:
+        print(f"{len(regressions)} metric(s) regressed past the threshold: {', '.join(regressions)}")
+        sys.exit(1)
+    else:
+        print("No regressions")
+
+
+if __name__ == "__main__":
+    main()
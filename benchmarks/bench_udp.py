@@ -0,0 +1,82 @@
+import argparse
+import os
+import socket
+import sys
+import threading
+import time
+
+# Import the game modules from the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from protocol import MSG_INPUT_STATE
+from stats import percentile
+from udp_transport import InputPacketSender, NetworkConditions, UdpInputServer
+
+LOSS_RATES = [0.0, 0.05, 0.1, 0.2, 0.3]
+
+
+# Send input changes at `rate` per second over loopback through the loss and latency simulator,
+# and time each one from being sent to reaching the server's on_frames
+def measure(loss, latency, jitter, rate, seconds):
+    sent_at = {}
+    delays = []
+    applied = []
+
+    def on_frames(peer, frames):
+        now = time.perf_counter()
+        for _, value in frames:
+            delays.append(now - sent_at[value])
+            applied.append(value)
+
+    server = UdpInputServer('127.0.0.1', 0, on_frames)
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+
+    client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    packets = InputPacketSender(client, server.address, NetworkConditions(loss, latency, jitter, seed=1))
+    stopped = threading.Event()
+    threading.Thread(target=packets.run_resends, args=(stopped,), daemon=True).start()
+
+    count = int(rate * seconds)
+    start = time.perf_counter()
+    for i in range(count):
+        # Frame values double as ids; MSG_INPUT_STATE carries 16 bits
+        value = i % 0x10000
+        time.sleep(max(0.0, start + i / rate - time.perf_counter()))
+        sent_at[value] = time.perf_counter()
+        packets.send(MSG_INPUT_STATE, value)
+    time.sleep(latency + jitter + 0.3)  # Let the last packets and resends arrive
+
+    stopped.set()
+    server.stop()
+    thread.join()
+    peer = next(iter(server.connections.values()))
+    server.close()
+    client.close()
+
+    in_order = applied == sorted(applied)
+    samples = sorted(delays)
+    return (len(applied) / count, peer.recovered, peer.lost, peer.stale, peer.duplicates, in_order,
+            percentile(samples, 0.5), percentile(samples, 0.99))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="UDP input delivery under simulated packet loss (loopback)")
+    parser.add_argument("--latency", type=float, default=0.02, help="one-way latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.01, help="extra random latency in seconds")
+    parser.add_argument("--rate", type=float, default=60.0, help="input changes per second")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    print(f"{args.rate:.0f} inputs/s, {args.latency * 1000:.0f} ms latency + up to {args.jitter * 1000:.0f} ms jitter")
+    print(f"{'loss':>5}  {'delivered':>9}  {'recovered':>9}  {'lost':>5}  {'stale':>5}  {'dups':>5}  "
+          f"{'in order':>8}  {'p50 ms':>7}  {'p99 ms':>7}")
+    for loss in LOSS_RATES:
+        delivered, recovered, lost, stale, duplicates, in_order, p50, p99 = measure(
+            loss, args.latency, args.jitter, args.rate, args.seconds)
+        print(f"{loss:5.0%}  {delivered:9.1%}  {recovered:9}  {lost:5}  {stale:5}  {duplicates:5}  "
+              f"{str(in_order):>8}  {p50 * 1000:7.1f}  {p99 * 1000:7.1f}")
+
+
+if __name__ == "__main__":
+    main()
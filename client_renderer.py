@@ -0,0 +1,82 @@
+import math
+import time
+
+import pygame
+
+import startup
+from game_background import render_game_background
+from render_cache import PHASE_STEPS, SpriteCache, SurfaceCache, quantize_phase
+from simulation import BORDER_WIDTH, OBJECT_SIZE, SCREEN_HEIGHT, SCREEN_WIDTH
+from text_cache import get_font, render_text
+
+# Optional pygame view for GameClient. It draws the game the way the server window does, from the
+# snapshots the server broadcasts (see snapshot.py), interpolated to the display's frame rate.
+
+FRAME_RATE = 60
+
+# Colors
+YELLOW = (255, 255, 0)
+RED = (255, 0, 0)
+OBJECT_COLORS = [RED, (0, 255, 0), (255, 165, 0), (0, 120, 255)]
+
+
+# Draw snapshots from receiver until the window is closed or connected() turns false
+def run(receiver, connected):
+    pygame.display.init()  # Only what the view needs; pygame.init() would also start audio and joysticks
+    pygame.font.init()
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    pygame.display.set_caption('Bucket Catch Game - Client')
+    font = get_font('Arial', 24)
+    title_font = get_font('Arial', 60, bold=True)
+    clock = pygame.time.Clock()
+    backgrounds = SurfaceCache(PHASE_STEPS)
+    sprites = SpriteCache(8)
+    start = time.perf_counter()
+
+    try:
+        while connected():
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    return
+
+            now = time.perf_counter()
+            animation_time = now - start
+            step, phase_time = quantize_phase(animation_time)
+            screen.blit(backgrounds.get(step, screen.get_size(), lambda layer: render_game_background(layer, phase_time)),
+                        (0, 0))
+
+            view = receiver.view(now)
+            if view is None:
+                text = render_text(font, "Waiting for the first snapshot...", True, (0, 0, 0))
+                screen.blit(text, text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)))
+            else:
+                bucket_x, bucket_y, objects, latest = view
+
+                # Bucket and objects with the same wobble as the server window
+                bucket_wobble = math.sin(animation_time * 5) * 2
+                bucket_size = (latest.bucket_width, latest.bucket_height)
+                screen.blit(sprites.shaded(YELLOW, bucket_size, 0.3, 2), (bucket_x + bucket_wobble, bucket_y))
+
+                object_sprites = [sprites.shaded(color, (OBJECT_SIZE, OBJECT_SIZE), 0.5, 1) for color in OBJECT_COLORS]
+                screen.blits([(object_sprites[object_id % len(object_sprites)],
+                               (int(x + math.sin(animation_time * 3 + object_id * 1.5) * 3), int(y)))
+                              for object_id, x, y in objects])
+
+                # Score and lives from the newest snapshot
+                screen.blit(render_text(font, f'Score: {latest.score}', True, (0, 0, 0)), (BORDER_WIDTH + 10, 10))
+                screen.blit(render_text(font, "Health:", True, (0, 0, 0)), (SCREEN_WIDTH - BORDER_WIDTH - 150, 10))
+                health_sprite = sprites.shaded(RED, (20, 20), 0.3, 1)
+                for i in range(latest.lives):
+                    screen.blit(health_sprite, (SCREEN_WIDTH - BORDER_WIDTH - 30 * (i + 1), 40))
+
+                if latest.game_over or latest.paused:
+                    title = render_text(title_font, "Game Over" if latest.game_over else "Paused", True, (255, 0, 0))
+                    screen.blit(title, title.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 3)))
+
+            pygame.display.flip()
+            elapsed = startup.mark('first frame')
+            if elapsed is not None:
+                print(f"Startup: first frame after {elapsed * 1e3:.0f} ms")
+            clock.tick(FRAME_RATE)
+    finally:
+        pygame.quit()
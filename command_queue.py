@@ -0,0 +1,68 @@
+import time
+from collections import deque
+
+import game_log
+
+# Hand-off of client commands from network threads to the simulation without a lock.
+# deque.append and deque.popleft are atomic in CPython, so any number of producer threads can push
+# while the game thread drains, and neither ever waits for the other.
+
+COMMAND_QUEUE_SIZE = 1024  # Commands kept while the game is not ticking (menus); the oldest go first
+
+log = game_log.get_logger('commands')
+
+
+class CommandQueue:
+    def __init__(self, maxlen=COMMAND_QUEUE_SIZE):
+        self.maxlen = maxlen
+        self._items = deque(maxlen=maxlen)  # (push time, command)
+        self.pushed = 0
+        self.drained = 0
+        self.dropped = 0  # Pushed out by newer commands when full (approximate with several producers)
+        self.max_depth = 0
+        self.total_wait = 0.0  # Seconds commands spent queued
+        self.max_wait = 0.0
+
+    def __len__(self):
+        return len(self._items)
+
+    def push(self, command):
+        if len(self._items) == self.maxlen:
+            self.dropped += 1
+        self._items.append((time.perf_counter(), command))
+        self.pushed += 1
+
+    def extend(self, commands):
+        for command in commands:
+            self.push(command)
+
+    def drain(self):
+        # Every command pushed so far, oldest first
+        items = self._items
+        if not items:
+            return []
+        depth = len(items)
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+        now = time.perf_counter()
+        commands = []
+        for _ in range(depth):
+            pushed_at, command = items.popleft()
+            wait = now - pushed_at
+            self.total_wait += wait
+            if wait > self.max_wait:
+                self.max_wait = wait
+            commands.append(command)
+        self.drained += depth
+        return commands
+
+    def report(self):
+        if not self.drained:
+            return
+        average_wait_ms = self.total_wait / self.drained * 1000
+        max_wait_ms = self.max_wait * 1000
+        log.info("Command queue: %d commands, %.2f ms average wait, %.2f ms max, max depth %d, %d dropped",
+                 self.drained, average_wait_ms, max_wait_ms, self.max_depth, self.dropped, commands=self.drained,
+                 average_wait_ms=round(average_wait_ms, 3), max_wait_ms=round(max_wait_ms, 3),
+                 max_depth=self.max_depth, dropped=self.dropped)
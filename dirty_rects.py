@@ -0,0 +1,80 @@
+import time
+
+import pygame
+
+import game_log
+
+log = game_log.get_logger('render')
+
+
+# Optional dirty-rectangle renderer for the game loop.
+# In dirty mode only the regions drawn in the previous and current frame are restored from the
+# background layer and pushed to pygame.display.update(). The whole window is still repainted and
+# flipped whenever the background layer changes or after a menu has drawn over the screen.
+class DirtyRectRenderer:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._background_key = None
+        self._previous = []
+        self._current = []
+        self._full_redraw = True
+
+        # Frame time statistics for comparing the two modes
+        self._frame_start = 0
+        self.frame_count = 0
+        self.total_frame_time = 0.0
+        self.max_frame_time = 0.0
+        self.full_redraws = 0
+
+    @property
+    def mode(self):
+        return "dirty" if self.enabled else "full"
+
+    def invalidate(self):
+        # Force a full repaint on the next frame (e.g. after a menu screen)
+        self._full_redraw = True
+
+    def begin_frame(self, screen, background, background_key):
+        self._frame_start = time.perf_counter()
+
+        if not self.enabled or self._full_redraw or background_key != self._background_key:
+            screen.blit(background, (0, 0))
+            self._background_key = background_key
+            self._full_redraw = True
+        else:
+            # Erase last frame's sprites and text by restoring the background under them
+            screen.blits([(background, rect, rect) for rect in self._previous], doreturn=False)
+
+    def add(self, rect):
+        # Track a region drawn this frame
+        if rect:
+            self._current.append(pygame.Rect(rect))
+
+    def add_all(self, rects):
+        for rect in rects:
+            self.add(rect)
+
+    def present(self):
+        if self._full_redraw:
+            pygame.display.flip()
+            self.full_redraws += 1
+        else:
+            pygame.display.update(self._previous + self._current)
+
+        self._previous = self._current
+        self._current = []
+        self._full_redraw = not self.enabled
+
+        frame_time = time.perf_counter() - self._frame_start
+        self.frame_count += 1
+        self.total_frame_time += frame_time
+        self.max_frame_time = max(self.max_frame_time, frame_time)
+
+    def report(self):
+        if not self.frame_count:
+            return
+        average_ms = self.total_frame_time / self.frame_count * 1000
+        max_ms = self.max_frame_time * 1000
+        log.info("Render mode: %s, %d frames, avg %.2f ms, max %.2f ms, %d full redraws", self.mode,
+                 self.frame_count, average_ms, max_ms, self.full_redraws, mode=self.mode, frames=self.frame_count,
+                 average_ms=round(average_ms, 3), max_ms=round(max_ms, 3), full_redraws=self.full_redraws)
@@ -0,0 +1,304 @@
+import os
+import threading
+import time
+from collections import deque
+
+import pygame
+
+import game_log
+from stats import percentile
+from text_cache import get_font
+
+# Per-phase timing of the game thread's frames.
+# The game thread calls mark(phase) as each part of a frame finishes and the time since the previous
+# mark is charged to that phase. Recent frames are kept for rolling percentiles, shown by the
+# on-screen overlay and exported in Prometheus text format to a file or a loopback HTTP endpoint.
+#
+#   profiler.begin_frame()
+#   ...pump events...
+#   profiler.mark('events')
+#   ...
+#   profiler.end_frame(object_count)
+
+PHASES = ('events', 'idle', 'commands', 'spawn', 'physics', 'state',
+          'background', 'objects', 'hud', 'overlay', 'flip')
+IDLE_PHASE = 'idle'  # Waiting for the next frame; not counted as frame time
+PROFILE_WINDOW = 600  # Frames kept for the rolling percentiles (10 s at 60 fps)
+QUANTILES = (0.5, 0.9, 0.99)
+METRICS_PREFIX = 'bucket'
+METRICS_INTERVAL = 5.0  # Seconds between writes of the metrics file
+OVERLAY_REFRESH = 0.25  # Seconds between redraws of the overlay panel
+OVERLAY_WIDTH = 320
+GRAPH_HEIGHT = 60
+GRAPH_FRAMES = OVERLAY_WIDTH // 2  # Frames shown in the frame time graph, 2 pixels each
+
+log = game_log.get_logger('profiler')
+
+
+class FrameProfiler:
+    def __init__(self, budget=None, window=PROFILE_WINDOW):
+        self.budget = budget  # Seconds a frame may take (1 / frame rate), None when uncapped
+        self._lock = threading.Lock()  # Guards the windows below against readers on other threads
+        self.frame_times = deque(maxlen=window)  # Busy seconds of each recent frame
+        self.phase_times = {phase: deque(maxlen=window) for phase in PHASES}
+        self.frames = 0
+        self.frame_total = 0.0
+        self.phase_totals = dict.fromkeys(PHASES, 0.0)
+        self.over_budget = 0
+        self.skipped = 0
+        self.objects = 0
+        self._current = dict.fromkeys(PHASES, 0.0)
+        self._start = None  # None outside a frame
+        self._last = None
+
+    def begin_frame(self):
+        self._current = dict.fromkeys(PHASES, 0.0)
+        self._start = self._last = time.perf_counter()
+
+    def mark(self, phase):
+        # Charge the time since the previous mark to phase
+        if self._last is None:
+            return
+        now = time.perf_counter()
+        self._current[phase] += now - self._last
+        self._last = now
+
+    def skip_frame(self):
+        # Leave the current frame out of the statistics (it ran a menu screen)
+        if self._start is not None:
+            self.skipped += 1
+        self._start = self._last = None
+
+    def end_frame(self, objects):
+        if self._start is None:
+            return
+        current = self._current
+        frame_time = time.perf_counter() - self._start - current[IDLE_PHASE]
+        self._start = self._last = None
+        with self._lock:
+            self.frame_times.append(frame_time)
+            for phase, seconds in current.items():
+                self.phase_times[phase].append(seconds)
+                self.phase_totals[phase] += seconds
+            self.frames += 1
+            self.frame_total += frame_time
+            self.objects = objects
+            if self.budget and frame_time > self.budget:
+                self.over_budget += 1
+
+    def recent_frames(self, count):
+        with self._lock:
+            frame_times = list(self.frame_times)
+        return frame_times[-count:]
+
+    def summary(self):
+        # Rolling quantiles and running totals, safe to call from any thread
+        with self._lock:
+            frame_times = sorted(self.frame_times)
+            phase_times = {phase: list(times) for phase, times in self.phase_times.items()}
+            totals = dict(self.phase_totals)
+            frames, frame_total, over_budget, objects = self.frames, self.frame_total, self.over_budget, self.objects
+        return {
+            'frames': frames,
+            'frame_total': frame_total,
+            'frame_quantiles': {q: percentile(frame_times, q) for q in QUANTILES},
+            'phase_quantiles': {phase: {q: percentile(sorted(times), q) for q in QUANTILES}
+                                for phase, times in phase_times.items()},
+            'phase_totals': totals,
+            'over_budget': over_budget,
+            'objects': objects,
+        }
+
+    def prometheus_text(self):
+        summary = self.summary()
+        frames = summary['frames']
+        lines = [
+            f"# HELP {METRICS_PREFIX}_frame_seconds Game thread busy time per frame, excluding the wait for the next frame",
+            f"# TYPE {METRICS_PREFIX}_frame_seconds summary",
+        ]
+        for q, value in summary['frame_quantiles'].items():
+            lines.append(f'{METRICS_PREFIX}_frame_seconds{{quantile="{q}"}} {value:.9f}')
+        lines.append(f"{METRICS_PREFIX}_frame_seconds_sum {summary['frame_total']:.9f}")
+        lines.append(f"{METRICS_PREFIX}_frame_seconds_count {frames}")
+
+        lines.append(f"# HELP {METRICS_PREFIX}_frame_phase_seconds Time per frame spent in each phase of the game thread")
+        lines.append(f"# TYPE {METRICS_PREFIX}_frame_phase_seconds summary")
+        for phase, quantiles in summary['phase_quantiles'].items():
+            for q, value in quantiles.items():
+                lines.append(f'{METRICS_PREFIX}_frame_phase_seconds{{phase="{phase}",quantile="{q}"}} {value:.9f}')
+            lines.append(f'{METRICS_PREFIX}_frame_phase_seconds_sum{{phase="{phase}"}} '
+                         f"{summary['phase_totals'][phase]:.9f}")
+            lines.append(f'{METRICS_PREFIX}_frame_phase_seconds_count{{phase="{phase}"}} {frames}')
+
+        lines.append(f"# HELP {METRICS_PREFIX}_frames_over_budget_total Frames that took longer than the frame budget")
+        lines.append(f"# TYPE {METRICS_PREFIX}_frames_over_budget_total counter")
+        lines.append(f"{METRICS_PREFIX}_frames_over_budget_total {summary['over_budget']}")
+        lines.append(f"# HELP {METRICS_PREFIX}_frame_budget_seconds Frame budget at the configured frame rate, 0 when uncapped")
+        lines.append(f"# TYPE {METRICS_PREFIX}_frame_budget_seconds gauge")
+        lines.append(f"{METRICS_PREFIX}_frame_budget_seconds {self.budget or 0:.9f}")
+        lines.append(f"# HELP {METRICS_PREFIX}_objects Falling objects in the last profiled frame")
+        lines.append(f"# TYPE {METRICS_PREFIX}_objects gauge")
+        lines.append(f"{METRICS_PREFIX}_objects {summary['objects']}")
+        return '\n'.join(lines) + '\n'
+
+    def report(self):
+        if not self.frames:
+            return
+        summary = self.summary()
+        frame = summary['frame_quantiles']
+        slowest = sorted((phase for phase in PHASES if phase != IDLE_PHASE),
+                         key=lambda phase: summary['phase_totals'][phase], reverse=True)[:3]
+        phase_ms = {phase: round(summary['phase_totals'][phase] / self.frames * 1000, 3) for phase in slowest}
+        phases = ', '.join(f"{phase} {ms:.2f} ms" for phase, ms in phase_ms.items())
+        log.info("Frame profile: %d frames, p50 %.2f ms, p99 %.2f ms, %d over budget, most time in %s",
+                 self.frames, frame[0.5] * 1000, frame[0.99] * 1000, self.over_budget, phases, frames=self.frames,
+                 p50_ms=round(frame[0.5] * 1000, 3), p99_ms=round(frame[0.99] * 1000, 3),
+                 over_budget=self.over_budget, slowest_phases_ms=phase_ms)
+
+
+# HTTP server for the profiler's metrics at /metrics, on the loopback interface only.
+# http.server takes longer to import than the rest of the game's modules, so it is only imported
+# when a metrics port is asked for
+def metrics_server(profiler, port):
+    import http.server
+
+    class MetricsHandler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = profiler.prometheus_text().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Scrapes are not worth a line each
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', port), MetricsHandler)
+    server.daemon_threads = True
+    return server
+
+
+# Exports the profiler's metrics from background threads: rewritten to a file every interval
+# (for a node exporter textfile collector or a kiosk's log shipper) and/or served over HTTP on
+# the loopback interface only
+class MetricsExporter:
+    def __init__(self, profiler, path=None, port=None, interval=METRICS_INTERVAL):
+        self.profiler = profiler
+        self.path = path
+        self.port = port
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._writer = None
+        self._http = None
+
+    def start(self):
+        if self.path:
+            self._writer = threading.Thread(target=self._write_loop, name='metrics-file', daemon=True)
+            self._writer.start()
+        if self.port is not None:
+            self._http = metrics_server(self.profiler, self.port)
+            threading.Thread(target=self._http.serve_forever, name='metrics-http', daemon=True).start()
+
+    @property
+    def address(self):
+        return self._http.server_address if self._http else None
+
+    def write(self):
+        # Replace the file in one step so readers never see a partial one
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as output:
+            output.write(self.profiler.prometheus_text())
+        os.replace(temp_path, self.path)
+
+    def _write_loop(self):
+        while not self._stopped.wait(self.interval):
+            self.write()
+
+    def stop(self):
+        self._stopped.set()
+        if self._writer is not None:
+            self._writer.join()
+            self.write()
+        if self._http is not None:
+            self._http.shutdown()
+            self._http.server_close()
+
+
+# Toggleable panel with the frame time graph, frame p50/p99, object count and per-phase p50/p99.
+# The panel is redrawn a few times a second and blitted in between
+class ProfilerOverlay:
+    def __init__(self, profiler, position, visible=False):
+        self.profiler = profiler
+        self.position = position
+        self.visible = visible
+        self.font = None  # Opened when the panel is first drawn
+        self._panel = None
+        self._updated = 0.0
+
+    def toggle(self):
+        self.visible = not self.visible
+        self._panel = None
+
+    def draw(self, screen):
+        # Returns the rect drawn, or None when hidden
+        if not self.visible:
+            return None
+        now = time.perf_counter()
+        if self._panel is None or now - self._updated >= OVERLAY_REFRESH:
+            self._panel = self._render_panel()
+            self._updated = now
+        return screen.blit(self._panel, self.position)
+
+    def _render_panel(self):
+        if self.font is None:
+            self.font = get_font('Arial', 14)
+        summary = self.profiler.summary()
+        budget = self.profiler.budget
+        frame = summary['frame_quantiles']
+        line_height = self.font.get_linesize()
+        rows = (len(PHASES) + 1) // 2
+        panel = pygame.Surface((OVERLAY_WIDTH, GRAPH_HEIGHT + (rows + 3) * line_height + 12), pygame.SRCALPHA)
+        panel.fill((0, 0, 0, 170))
+
+        def text(value, x, y, color=(255, 255, 255)):
+            panel.blit(self.font.render(value, True, color), (x, y))
+
+        y = 4
+        text(f"frame p50 {frame[0.5] * 1000:5.2f} ms  p99 {frame[0.99] * 1000:5.2f} ms", 6, y)
+        y += line_height
+        budget_text = f"budget {budget * 1000:.1f} ms, {summary['over_budget']} over" if budget else "uncapped"
+        text(f"objects {summary['objects']}  {budget_text}", 6, y)
+        y += line_height + 4
+
+        # Frame time graph, scaled so the budget sits at two thirds of the height
+        scale = GRAPH_HEIGHT / (1.5 * (budget or max(frame[0.99], 0.001)))
+        graph_bottom = y + GRAPH_HEIGHT
+        for i, frame_time in enumerate(self.profiler.recent_frames(GRAPH_FRAMES)):
+            height = min(GRAPH_HEIGHT, max(1, int(frame_time * scale)))
+            color = (255, 80, 80) if budget and frame_time > budget else (80, 220, 80)
+            pygame.draw.line(panel, color, (i * 2, graph_bottom), (i * 2, graph_bottom - height))
+        if budget:
+            budget_y = graph_bottom - int(budget * scale)
+            pygame.draw.line(panel, (255, 255, 0), (0, budget_y), (OVERLAY_WIDTH, budget_y))
+        y = graph_bottom + 4
+
+        # Per-phase table in two columns of name, p50 and p99 (ms), each field at a fixed x
+        header = (200, 200, 200)
+        for x in (6, OVERLAY_WIDTH // 2 + 6):
+            text("phase", x, y, header)
+            text("p50", x + 80, y, header)
+            text("p99", x + 118, y, header)
+        y += line_height
+        for i, phase in enumerate(PHASES):
+            quantiles = summary['phase_quantiles'][phase]
+            x = 6 if i < rows else OVERLAY_WIDTH // 2 + 6
+            row_y = y + (i % rows) * line_height
+            color = (150, 150, 150) if phase == IDLE_PHASE else (255, 255, 255)
+            text(phase, x, row_y, color)
+            text(f"{quantiles[0.5] * 1000:.2f}", x + 80, row_y, color)
+            text(f"{quantiles[0.99] * 1000:.2f}", x + 118, row_y, color)
+        return panel
@@ -0,0 +1,37 @@
+import pygame
+
+import shading
+from simulation import BORDER_WIDTH, SCREEN_HEIGHT, SCREEN_WIDTH
+
+# In-game background, drawn the same way by the server window (GameServer.py) and the client's
+# view (client_renderer.py): a solid fill, a border on each side and the animated game area
+# gradient. Both cache the result per wave phase (see render_cache.py).
+#
+#   step, phase_time = quantize_phase(animation_time)
+#   layer = cache.get(step, size, lambda layer: render_game_background(layer, phase_time))
+
+BACKGROUND_COLOR = (100, 100, 150)
+BORDER_COLOR = (80, 80, 120)
+BORDER_OUTLINE_COLOR = (40, 40, 80)
+GAME_AREA_TOP = (135, 206, 250)  # Light blue
+GAME_AREA_BOTTOM = (115, 186, 240)  # Slightly darker
+
+
+def draw_game_area_gradient(screen, border_width, time_value):
+    # Vertical gradient with subtle animation, for the game area only
+    game_area_rect = pygame.Rect(border_width, 0, SCREEN_WIDTH - 2 * border_width, SCREEN_HEIGHT)
+    shading.fill_wave_gradient(screen, game_area_rect, GAME_AREA_TOP, GAME_AREA_BOTTOM, time_value)
+
+
+def draw_borders(screen, border_width):
+    # Solid borders with an outline on both sides of the game area
+    for border in (pygame.Rect(0, 0, border_width, SCREEN_HEIGHT),
+                   pygame.Rect(SCREEN_WIDTH - border_width, 0, border_width, SCREEN_HEIGHT)):
+        pygame.draw.rect(screen, BORDER_COLOR, border)
+        pygame.draw.rect(screen, BORDER_OUTLINE_COLOR, border, 2)
+
+
+def render_game_background(layer, time_value):
+    layer.fill(BACKGROUND_COLOR)
+    draw_borders(layer, BORDER_WIDTH)
+    draw_game_area_gradient(layer, BORDER_WIDTH, time_value)
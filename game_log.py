@@ -0,0 +1,217 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+from collections import deque
+
+# Logging for the game server, built on the standard logging package.
+# Threads that log only put the record on a bounded queue; a background thread formats and writes
+# it (console or file, plain text or JSON lines), so a slow terminal never holds up the network or
+# game thread. The most recent records are also kept in memory for dumping after a failure.
+#
+#   log = game_log.get_logger('server')
+#   log.info("Connection from %s", address, client=str(connection))  # Keyword arguments become fields
+
+LOGGER_NAME = 'bucket'
+QUEUE_SIZE = 10000  # Records waiting for the writer thread before new ones are dropped
+RING_SIZE = 1000  # Recent records kept in memory
+INPUT_LOG_RATE = 10  # Input traffic debug lines per second (the rest are counted, not written)
+
+DEBUG = logging.DEBUG
+INFO = logging.INFO
+WARNING = logging.WARNING
+ERROR = logging.ERROR
+
+
+# Logger with structured fields: keyword arguments of a log call end up in the output as fields
+class GameLogger:
+    def __init__(self, logger):
+        self.logger = logger
+
+    def is_enabled(self, level):
+        return self.logger.isEnabledFor(level)
+
+    def log(self, level, message, *args, **fields):
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, message, *args, extra={'fields': fields})
+
+    def debug(self, message, *args, **fields):
+        self.log(DEBUG, message, *args, **fields)
+
+    def info(self, message, *args, **fields):
+        self.log(INFO, message, *args, **fields)
+
+    def warning(self, message, *args, **fields):
+        self.log(WARNING, message, *args, **fields)
+
+    def error(self, message, *args, **fields):
+        self.log(ERROR, message, *args, **fields)
+
+    def exception(self, message, *args, **fields):
+        self.logger.exception(message, *args, extra={'fields': fields})
+
+
+def get_logger(name):
+    return GameLogger(logging.getLogger(f"{LOGGER_NAME}.{name}"))
+
+
+# Token bucket limiting a high-volume debug log (such as every input frame) to rate lines per
+# second. With debug logging off, checking `enabled` is all the hot path pays:
+#
+#   if input_log.enabled and input_log.allow():
+#       input_log.debug("From client %s: %s", connection, describe(frames))
+class RateLimitedLog:
+    def __init__(self, logger, rate=INPUT_LOG_RATE, burst=None):
+        self.logger = logger
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1, rate)
+        self.tokens = self.burst
+        self.last = time.monotonic()
+        self.suppressed = 0  # Lines dropped since the last one written
+
+    @property
+    def enabled(self):
+        return self.rate > 0 and self.logger.is_enabled(DEBUG)
+
+    def allow(self):
+        # Whether the next line may be written; the ones that may not are counted
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        if self.tokens < 1:
+            self.suppressed += 1
+            return False
+        self.tokens -= 1
+        return True
+
+    def debug(self, message, *args, **fields):
+        # Write a line allow() let through, with the number suppressed before it
+        if self.suppressed:
+            fields['suppressed'] = self.suppressed
+            self.suppressed = 0
+        self.logger.log(DEBUG, message, *args, **fields)
+
+
+def exception_text(record, formatter):
+    # Traceback of a record, already formatted for records that went through the queue
+    if record.exc_info:
+        return formatter.formatException(record.exc_info)
+    return record.exc_text
+
+
+# Plain text: the message, then any fields as key=value
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        text = record.getMessage()
+        fields = getattr(record, 'fields', None)
+        if fields:
+            text += '  ' + ' '.join(f"{key}={value}" for key, value in fields.items())
+        exc_text = exception_text(record, self)
+        if exc_text:
+            text += '\n' + exc_text
+        return text
+
+
+# One JSON object per line
+class JsonLinesFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {'time': round(record.created, 6), 'level': record.levelname, 'logger': record.name,
+                 'thread': record.threadName, 'message': record.getMessage()}
+        entry.update(getattr(record, 'fields', None) or {})
+        exc_text = exception_text(record, self)
+        if exc_text:
+            entry['exception'] = exc_text
+        return json.dumps(entry, default=str)
+
+
+# Keeps the most recent records in memory
+class RingBufferHandler(logging.Handler):
+    def __init__(self, capacity=RING_SIZE):
+        super().__init__()
+        self.records = deque(maxlen=capacity)
+
+    def emit(self, record):
+        self.records.append(record)
+
+    def recent(self, count=None):
+        records = list(self.records)
+        return records[-count:] if count else records
+
+
+# QueueHandler that drops records (counting them) instead of blocking when the writer falls behind
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, record_queue):
+        super().__init__(record_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Resolve the message and traceback on the logging thread, so the queued record holds
+        # plain strings only; formatting into text or JSON is left to the writer thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_lock = threading.Lock()
+_listener = None
+_queue_handler = None
+output_path = None  # Log file set up by setup(), None for the console
+ring = RingBufferHandler()
+
+
+def setup(level=INFO, path=None, json_lines=False, queue_size=QUEUE_SIZE):
+    # Route the game's loggers through the background writer. Call once at startup
+    global _listener, _queue_handler, output_path
+    with _lock:
+        shutdown()
+        output_path = path
+        formatter = JsonLinesFormatter() if json_lines else TextFormatter()
+        output = logging.FileHandler(path, encoding='utf-8') if path else logging.StreamHandler(sys.stdout)
+        output.setFormatter(formatter)
+        ring.setFormatter(formatter)
+
+        record_queue = queue.Queue(queue_size)
+        _queue_handler = DroppingQueueHandler(record_queue)
+        _listener = logging.handlers.QueueListener(record_queue, output)
+        _listener.start()
+
+        logger = logging.getLogger(LOGGER_NAME)
+        logger.handlers = [_queue_handler, ring]
+        logger.setLevel(level)
+        logger.propagate = False
+
+
+def shutdown():
+    # Write out everything still queued and stop the writer thread
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+        if _queue_handler is not None and _queue_handler.dropped:
+            print(f"Logging dropped {_queue_handler.dropped} records", file=sys.stderr)
+
+
+def dump_recent(stream=sys.stderr, count=None):
+    # Write the records kept in memory, e.g. after an error
+    for record in ring.recent(count):
+        stream.write(ring.format(record) + '\n')
+
+
+atexit.register(shutdown)
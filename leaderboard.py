@@ -0,0 +1,82 @@
+import threading
+import time
+
+from sortedcontainers import SortedList
+
+# Leaderboard of each player's best score across sessions.
+# Entries are kept in an ordered index (a SortedList of (-score, time achieved, player), so the
+# best score comes first and ties go to whoever got there first) next to a dict from player to
+# entry. Submitting a score and looking up a player's rank are O(log n) and the top K is
+# O(log n + K), however many players there are. Durable storage is the progress store's scores
+# table (see progress_store.py), which loads the saved entries in the background.
+#
+#   board = Leaderboard()
+#   board.submit('alice', 42)  # True when it is alice's new best
+#   board.rank('alice')  # 1-based, None for players without a score
+#   board.top(10)  # [(rank, player, score), ...]
+
+
+class Leaderboard:
+    def __init__(self):
+        self._lock = threading.Lock()  # Scores come from the game thread, queries from any thread
+        self._index = SortedList()
+        self._entries = {}  # Player: their key in the index
+
+    def submit(self, player, score, achieved=None):
+        # Record a finished game's score; returns True when it is the player's best
+        key = (-score, achieved if achieved is not None else time.time(), player)
+        with self._lock:
+            old = self._entries.get(player)
+            if old is not None and old[0] <= key[0]:
+                return False
+            if old is not None:
+                self._index.remove(old)
+            self._index.add(key)
+            self._entries[player] = key
+        return True
+
+    def load(self, rows):
+        # Add saved (player, score, achieved) rows, keeping each player's best. The index is built
+        # without holding the lock, so games can end while a large leaderboard loads
+        entries = {player: (-score, achieved, player) for player, score, achieved in rows}
+        index = SortedList(entries.values())
+        with self._lock:
+            # Scores submitted while loading win when they are better
+            for player, key in self._entries.items():
+                saved = entries.get(player)
+                if saved is None or key < saved:
+                    if saved is not None:
+                        index.remove(saved)
+                    index.add(key)
+                    entries[player] = key
+            self._index, self._entries = index, entries
+
+    def rank(self, player):
+        with self._lock:
+            key = self._entries.get(player)
+            return self._index.index(key) + 1 if key is not None else None
+
+    def score(self, player):
+        with self._lock:
+            key = self._entries.get(player)
+            return -key[0] if key is not None else None
+
+    def top(self, count):
+        # The count best players as (rank, player, score)
+        with self._lock:
+            return [(rank, player, -negative_score)
+                    for rank, (negative_score, _, player) in enumerate(self._index.islice(0, count), 1)]
+
+    def around(self, player, count):
+        # Up to count entries centred on player, as (rank, player, score)
+        with self._lock:
+            key = self._entries.get(player)
+            if key is None:
+                return []
+            start = max(0, self._index.index(key) - count // 2)
+            return [(rank, name, -negative_score)
+                    for rank, (negative_score, _, name) in enumerate(self._index.islice(start, start + count),
+                                                                     start + 1)]
+
+    def __len__(self):
+        return len(self._index)
@@ -0,0 +1,419 @@
+import argparse
+import heapq
+import random
+import selectors
+import socket
+import threading
+import time
+from collections import deque
+
+from GameClient import InputSender, UdpInputSender
+from protocol import (COUNTER_MODULO, DOWN, LEFT, MESSAGE_NAMES, MSG_INPUT_STATE, MSG_PING, MSG_PONG, MSG_SNAPSHOT,
+                      RIGHT, UP, MessageDecoder, decode_pong, encode_frame)
+from simulation import FixedTimestep
+from snapshot import SnapshotReceiver
+from stats import percentile
+from udp_transport import RECV_SIZE, RESEND_INTERVAL, InputPacketSender, NetworkConditions
+
+# Synthetic clients for load testing GameServer over loopback.
+# Opens M connections (spread over an optional ramp-up), sends each one's scripted or random input
+# at N Hz, reads and acknowledges snapshots like GameClient does and pings the server. Pongs carry
+# the server's counters, so the report covers both ends: the message rate achieved, the rate the
+# game applied commands at, messages dropped or rejected on the way and round-trip latency.
+#
+#   python load_generator.py --serve --connections 200 --rate 30 --ramp-up 5
+#   python load_generator.py --port 5000 --script inputs.txt   # against a running GameServer
+
+PING_INTERVAL = 0.1  # Seconds between pings on each connection
+FINAL_PING_TIMEOUT = 2.0  # Seconds to wait for the answers to the last pings
+RANDOM_DIRECTIONS = [0, UP, DOWN, LEFT, RIGHT, UP | LEFT, UP | RIGHT, DOWN | LEFT, DOWN | RIGHT]
+DIRECTION_LETTERS = {'u': UP, 'd': DOWN, 'l': LEFT, 'r': RIGHT}
+MESSAGE_TYPES = {name: msg_type for msg_type, name in MESSAGE_NAMES.items()}
+
+
+def parse_frame(text):
+    # Inverse of protocol.describe_frame for script lines, e.g. "input ul", "move r", "restart"
+    name, _, value = text.strip().partition(' ')
+    msg_type = MESSAGE_TYPES.get(name)
+    if msg_type is None:
+        raise ValueError(f"unknown message {name!r}")
+    value = value.strip()
+    if value.isdigit():
+        return msg_type, int(value)
+    directions = 0
+    for letter in value.replace('-', ''):
+        if letter not in DIRECTION_LETTERS:
+            raise ValueError(f"bad value {value!r} in {text.strip()!r}")
+        directions |= DIRECTION_LETTERS[letter]
+    return msg_type, directions
+
+
+def load_script(path):
+    # One frame per line; blank lines and lines starting with # are skipped
+    with open(path, encoding='utf-8') as script:
+        frames = [parse_frame(line) for line in script if line.strip() and not line.lstrip().startswith('#')]
+    if not frames:
+        raise ValueError(f"{path} has no frames")
+    return frames
+
+
+# One synthetic client. Sends happen on the scheduler thread and acks on the receive thread; the
+# lock keeps the frame count exact
+class LoadClient:
+    def __init__(self, index, sock, sender, packets=None):
+        self.index = index
+        self.sock = sock
+        self.sender = sender
+        self.packets = packets  # InputPacketSender over UDP, None over TCP
+        self.lock = threading.Lock()
+        self.decoder = MessageDecoder()
+        self.receiver = SnapshotReceiver()
+        self.sent = 0  # Frames sent: input, acks and pings
+        self.inputs = 0
+        self.send_errors = 0
+        self.next_token = 0
+        self.pings = {}  # Token -> send time of the pings not answered yet
+        self.final_token = None  # Last ping, sent after the input stopped
+        self.final_sent = None  # Frames sent up to and including the last ping
+        self.final_pong = None
+        self.closed = False
+
+    def send(self, msg_type, value=0):
+        with self.lock:
+            try:
+                self.sender.send_command(msg_type, value)
+            except OSError:
+                self.send_errors += 1
+                return False
+            self.sent += 1
+            return True
+
+    def ack(self, seq):
+        with self.lock:
+            try:
+                self.sender.send_ack(seq)
+            except OSError:
+                self.send_errors += 1
+                return
+            self.sent += 1
+
+    def ping(self, final=False):
+        # Over UDP pings go as single frames, so a lost one is not repeated later with a stale time
+        with self.lock:
+            token = self.next_token
+            self.next_token = (self.next_token + 1) % 0x10000
+            if final:
+                # Set before sending: the pong can come back before this returns
+                self.final_token, self.final_sent = token, self.sent + 1
+            self.pings[token] = time.perf_counter()
+            try:
+                if self.packets is not None:
+                    self.packets.send_frame(encode_frame(MSG_PING, token))
+                else:
+                    self.sender.send_command(MSG_PING, token)
+            except OSError:
+                self.send_errors += 1
+                self.final_token = None if final else self.final_token
+                return
+            self.sent += 1
+
+
+class LoadGenerator:
+    def __init__(self, host, port, connections, rate, ramp_up, seconds, script=None, udp=False, conditions=None,
+                 ping_interval=PING_INTERVAL, seed=None):
+        self.address = (host, port)
+        self.connections = connections
+        self.rate = rate
+        self.ramp_up = ramp_up
+        self.seconds = seconds
+        self.script = script
+        self.udp = udp
+        self.conditions = conditions
+        self.ping_interval = ping_interval
+        self.rng = random.Random(seed)
+        self.clients = []
+        self.failed = 0  # Connections that could not be opened
+        self.selector = selectors.DefaultSelector()
+        self.new_clients = deque()  # Opened by the scheduler, registered by the receive thread
+        self.stopped = threading.Event()
+        self.round_trips = []  # Seconds from ping to pong
+        self.first_pong = None  # (time, applied, dropped) from the first and latest pongs
+        self.last_pong = None
+        self.messages_rejected = 0  # Server messages this side could not decode
+
+    def open(self, index):
+        try:
+            if self.udp:
+                sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                sock.connect(self.address)  # Only take datagrams from the server
+                packets = InputPacketSender(sock, self.address, self.conditions)
+                client = LoadClient(index, sock, UdpInputSender(packets), packets)
+            else:
+                sock = socket.create_connection(self.address)
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                client = LoadClient(index, sock, InputSender(sock))
+        except OSError:
+            self.failed += 1
+            return None
+        self.clients.append(client)
+        self.new_clients.append(client)
+        return client
+
+    def next_frame(self, client):
+        if self.script:
+            # Each client plays the script from its own offset, so they do not move in lockstep
+            return self.script[(client.index + client.inputs) % len(self.script)]
+        return MSG_INPUT_STATE, self.rng.choice(RANDOM_DIRECTIONS)
+
+    def run_schedule(self, start, end):
+        # Scheduler thread: opens the connections and sends every input, ping and resend on time
+        events = [(start + self.ramp_up * i / self.connections, 'open', i) for i in range(self.connections)]
+        heapq.heapify(events)
+        clients = {}
+        while events and not self.stopped.is_set():
+            when, kind, index = heapq.heappop(events)
+            if when >= end:
+                break
+            time.sleep(max(0.0, when - time.perf_counter()))
+            if kind == 'open':
+                client = clients[index] = self.open(index)
+                if client is None:
+                    continue
+                client.send(MSG_INPUT_STATE, 0)  # Introduces a UDP client to the server
+                heapq.heappush(events, (when + self.rng.random() / self.rate, 'input', index))
+                heapq.heappush(events, (when + self.rng.random() * self.ping_interval, 'ping', index))
+                if self.udp:
+                    heapq.heappush(events, (when + RESEND_INTERVAL, 'resend', index))
+                continue
+
+            client = clients[index]
+            if client.closed:
+                continue
+            if kind == 'input':
+                if client.send(*self.next_frame(client)):
+                    client.inputs += 1
+                heapq.heappush(events, (when + 1.0 / self.rate, kind, index))
+            elif kind == 'ping':
+                client.ping()
+                heapq.heappush(events, (when + self.ping_interval, kind, index))
+            elif kind == 'resend':
+                try:
+                    client.packets.resend()
+                except OSError:
+                    client.send_errors += 1
+                heapq.heappush(events, (when + RESEND_INTERVAL, kind, index))
+
+    def run_receive(self):
+        # Receive thread: snapshots are applied and acknowledged, pongs timed
+        while not self.stopped.is_set():
+            while self.new_clients:
+                client = self.new_clients.popleft()
+                self.selector.register(client.sock, selectors.EVENT_READ, client)
+            for key, _ in self.selector.select(timeout=0.05):
+                client = key.data
+                try:
+                    data = client.sock.recv(RECV_SIZE)
+                except ConnectionRefusedError:
+                    continue  # UDP: the server is not there (yet)
+                except OSError:
+                    data = b''
+                if not data:
+                    client.closed = True
+                    self.selector.unregister(client.sock)
+                    continue
+                now = time.perf_counter()
+                for msg_type, payload in client.decoder.feed(data):
+                    if msg_type == MSG_SNAPSHOT:
+                        snapshot = client.receiver.apply(payload, now)
+                        if snapshot is not None:
+                            client.ack(snapshot.seq)
+                    elif msg_type == MSG_PONG:
+                        self.on_pong(client, payload, now)
+
+    def on_pong(self, client, payload, now):
+        pong = decode_pong(payload)
+        if pong is None:
+            self.messages_rejected += 1
+            return
+        token, frames, rejected, applied, dropped = pong
+        sent_at = client.pings.pop(token, None)
+        if sent_at is None:
+            return  # Duplicate, or answered after it was given up on
+        self.round_trips.append(now - sent_at)
+        if self.first_pong is None:
+            self.first_pong = (now, applied, dropped)
+        self.last_pong = (now, applied, dropped)
+        if token == client.final_token:
+            client.final_pong = pong
+
+    def server_counts(self):
+        # Commands the server applied and dropped between the first and latest pongs, and the seconds between them
+        if self.first_pong is None:
+            return 0, 0, 0.0
+        first_time, first_applied, first_dropped = self.first_pong
+        last_time, last_applied, last_dropped = self.last_pong
+        return ((last_applied - first_applied) % COUNTER_MODULO, (last_dropped - first_dropped) % COUNTER_MODULO,
+                last_time - first_time)
+
+    def run(self, progress_interval=1.0):
+        start = time.perf_counter() + 0.1
+        end = start + self.ramp_up + self.seconds
+        receiving = threading.Thread(target=self.run_receive, name='load-receive', daemon=True)
+        scheduling = threading.Thread(target=self.run_schedule, args=(start, end), name='load-schedule', daemon=True)
+        receiving.start()
+        scheduling.start()
+
+        # Progress once a second: connections, send rate, the server's apply rate and round trips
+        last_time, last_inputs, last_applied, last_trips = start, 0, 0, 0
+        while scheduling.is_alive():
+            scheduling.join(progress_interval)
+            now = time.perf_counter()
+            inputs = sum(client.inputs for client in self.clients)
+            applied, _, _ = self.server_counts()
+            trips = sorted(self.round_trips[last_trips:])
+            rtt = f"rtt p50 {percentile(trips, 0.5) * 1000:.2f} ms p99 {percentile(trips, 0.99) * 1000:.2f} ms" \
+                if trips else "no pongs"
+            print(f"{now - start:6.1f} s  {len(self.clients) - sum(c.closed for c in self.clients):5} connections  "
+                  f"{(inputs - last_inputs) / (now - last_time):9.0f} inputs/s  "
+                  f"{(applied - last_applied) / (now - last_time):9.0f} applied/s  {rtt}")
+            last_time, last_inputs, last_applied, last_trips = now, inputs, applied, len(self.round_trips)
+        sent_seconds = time.perf_counter() - start
+
+        # Last ping on every connection, answered after all the input before it
+        for client in self.clients:
+            if not client.closed:
+                client.ping(final=True)
+        deadline = time.perf_counter() + FINAL_PING_TIMEOUT
+        while time.perf_counter() < deadline and any(
+                client.final_pong is None for client in self.clients if client.final_token is not None):
+            time.sleep(0.01)
+        self.stopped.set()
+        receiving.join()
+        for client in self.clients:
+            client.sock.close()
+        self.report(sent_seconds)
+
+    def report(self, seconds):
+        clients = self.clients
+        inputs = sum(client.inputs for client in clients)
+        target = self.connections * self.rate
+        print(f"{len(clients)} connections over {'UDP' if self.udp else 'TCP'} ({self.failed} failed, "
+              f"{sum(client.closed for client in clients)} closed by the server), "
+              f"{self.rate:g} Hz each, {self.ramp_up:g} s ramp-up")
+        print(f"Sent {inputs} inputs: {inputs / seconds:.0f}/s (target {target:.0f}/s at full load), "
+              f"{sum(client.send_errors for client in clients)} send errors")
+
+        applied, dropped, pong_seconds = self.server_counts()
+        if pong_seconds > 0:
+            print(f"Server applied {applied} commands: {applied / pong_seconds:.0f}/s, "
+                  f"{dropped} dropped by its command queue")
+        else:
+            print("No answer from the server to measure its apply rate (is it running a game?)")
+
+        # Frames the server never got or could not parse, counted up to each connection's last ping
+        answered = [client for client in clients if client.final_pong is not None]
+        missing = sum(client.final_sent - client.final_pong[1] - client.final_pong[2] for client in answered)
+        rejected = sum(client.final_pong[2] for client in answered)
+        print(f"Server rejected {rejected} frames as unparsable, {missing} never arrived "
+              f"({len(answered)} of {len(clients)} connections counted), "
+              f"{self.messages_rejected + sum(client.decoder.rejected for client in clients)} server messages "
+              f"unparsable here")
+
+        trips = sorted(self.round_trips)
+        unanswered = sum(len(client.pings) for client in clients)
+        if trips:
+            print(f"Round trip over {len(trips)} pings ({unanswered} unanswered): "
+                  f"p50 {percentile(trips, 0.5) * 1000:.2f} ms, p90 {percentile(trips, 0.9) * 1000:.2f} ms, "
+                  f"p99 {percentile(trips, 0.99) * 1000:.2f} ms, max {trips[-1] * 1000:.2f} ms")
+        snapshots = sum(client.receiver.received for client in clients)
+        if snapshots:
+            print(f"Received {snapshots} snapshots ({sum(client.receiver.full for client in clients)} full), "
+                  f"{sum(client.receiver.received_bytes for client in clients) / seconds / 1024:.0f} KB/s in total")
+        if self.conditions is not None:
+            print(f"Simulated network dropped {self.conditions.dropped} of {self.conditions.sent} packets")
+
+
+def run_headless_game(stopped):
+    # Stand-in for GameServer's GameThread without a window or menus: ticks the game at the tick
+    # rate, applying the queued commands, and publishes the state for snapshots
+    import GameServer
+    timestep = FixedTimestep(GameServer.TICK_RATE)
+    GameServer.reset_game()
+    last = time.perf_counter()
+    while not stopped.wait(timestep.dt / 2):
+        now = time.perf_counter()
+        ticks = timestep.advance(now - last)
+        last = now
+        for _ in range(ticks):
+            GameServer.sim.step(timestep.dt, GameServer.commands.drain())
+        if GameServer.sim.game_over:
+            GameServer.reset_game()  # Keep playing; nobody is there to press restart
+        GameServer.sim.paused = False  # There is no pause menu to leave either
+        if ticks:
+            GameServer.current_state = GameServer.sim.state()
+
+
+def serve(port, udp, stopped):
+    # Host GameServer's ServerThread in this process on a loopback port, with a headless game
+    import GameServer
+    GameServer.SERVER_HOST, GameServer.SERVER_PORT, GameServer.USE_UDP = '127.0.0.1', port, udp
+    threading.Thread(target=GameServer.ServerThread, name='server', daemon=True).start()
+    threading.Thread(target=run_headless_game, args=(stopped,), name='game', daemon=True).start()
+    if not udp:
+        # Wait until it accepts connections
+        deadline = time.perf_counter() + 5
+        while True:
+            try:
+                socket.create_connection(('127.0.0.1', port)).close()
+                return
+            except ConnectionRefusedError:
+                if time.perf_counter() > deadline:
+                    raise
+                time.sleep(0.01)
+    time.sleep(0.2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test GameServer with synthetic clients over loopback")
+    parser.add_argument("--connections", "-m", type=int, default=50, help="concurrent connections (default: %(default)s)")
+    parser.add_argument("--rate", "-n", type=float, default=20.0,
+                        help="input messages per second on each connection (default: %(default)s)")
+    parser.add_argument("--ramp-up", type=float, default=0.0,
+                        help="seconds over which the connections are opened (default: %(default)s)")
+    parser.add_argument("--seconds", type=float, default=10.0,
+                        help="seconds of full load after the ramp-up (default: %(default)s)")
+    parser.add_argument("--script", default=None,
+                        help="file with one frame per line (e.g. 'input ul', 'move r', 'restart') played in a "
+                             "loop instead of random input")
+    parser.add_argument("--ping-interval", type=float, default=PING_INTERVAL,
+                        help="seconds between round-trip pings on each connection (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=5000, help="server port on 127.0.0.1 (default: %(default)s)")
+    parser.add_argument("--serve", action="store_true",
+                        help="host the server in this process (ServerThread plus a headless game) on the port")
+    parser.add_argument("--udp", action="store_true", help="send input over UDP (the server needs --udp too)")
+    parser.add_argument("--loss", type=float, default=0.0, help="simulated loss rate of packets sent over UDP")
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated one-way latency in seconds over UDP")
+    parser.add_argument("--jitter", type=float, default=0.0, help="simulated extra random latency in seconds over UDP")
+    parser.add_argument("--seed", type=int, default=None, help="seed for the random input")
+    args = parser.parse_args()
+
+    script = load_script(args.script) if args.script else None
+    conditions = None
+    if args.loss or args.latency or args.jitter:
+        conditions = NetworkConditions(args.loss, args.latency, args.jitter, seed=args.seed)
+    server_stopped = threading.Event()
+    if args.serve:
+        serve(args.port, args.udp, server_stopped)
+
+    generator = LoadGenerator('127.0.0.1', args.port, args.connections, args.rate, args.ramp_up, args.seconds,
+                              script, args.udp, conditions, args.ping_interval, args.seed)
+    try:
+        generator.run()
+    except KeyboardInterrupt:
+        generator.stopped.set()
+    finally:
+        server_stopped.set()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import selectors
+import socket
+
+from protocol import FrameDecoder
+
+LISTEN_BACKLOG = 128
+RECV_SIZE = 4096
+MAX_OUTBOX = 64 * 1024  # Bytes queued for a slow client before send() starts refusing more
+
+
+# One connected client: its socket, read and write buffers and last reported input state
+class ClientConnection:
+    def __init__(self, sock, address):
+        self.sock = sock
+        self.address = address
+        self.decoder = FrameDecoder()  # Per-connection read buffer
+        self.directions = 0  # Direction keys this client is holding
+        self.outbox = bytearray()  # Data the socket has not taken yet
+        self.events = selectors.EVENT_READ
+        self.sent_bytes = 0
+
+    @property
+    def frames(self):
+        # Valid frames received from this client
+        return self.decoder.frames
+
+    @property
+    def rejected(self):
+        # Invalid frames received from this client
+        return self.decoder.rejected
+
+    def __repr__(self):
+        return f"{self.address[0]}:{self.address[1]}"
+
+
+# Non-blocking TCP server for game clients built on selectors.
+# All connections are served from one thread; decoded frames are handed to on_frames(connection, frames)
+# and send() queues data that is written whenever the client's socket can take it
+class InputServer:
+    def __init__(self, host, port, on_frames, on_connect=None, on_disconnect=None):
+        self.on_frames = on_frames
+        self.on_connect = on_connect
+        self.on_disconnect = on_disconnect
+        self.connections = {}
+        self.running = False
+
+        self.selector = selectors.DefaultSelector()
+        self.server_socket = socket.socket()
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)  # Allow address reuse
+        self.server_socket.bind((host, port))
+        self.server_socket.listen(LISTEN_BACKLOG)
+        self.server_socket.setblocking(False)
+        self.selector.register(self.server_socket, selectors.EVENT_READ)
+
+    @property
+    def address(self):
+        return self.server_socket.getsockname()
+
+    def serve_forever(self, poll_interval=0.5, on_poll=None):
+        # on_poll() runs after every select round and returns the longest time to wait for the
+        # next one (None for poll_interval), for periodic work such as broadcasting snapshots
+        self.running = True
+        timeout = poll_interval
+        while self.running:
+            for key, mask in self.selector.select(timeout=timeout):
+                if key.fileobj is self.server_socket:
+                    self._accept()
+                    continue
+                connection = key.data
+                if mask & selectors.EVENT_READ:
+                    self._read(connection)
+                if mask & selectors.EVENT_WRITE and connection.sock in self.connections:
+                    self._write(connection)
+
+            timeout = poll_interval
+            if on_poll:
+                wait = on_poll()
+                if wait is not None:
+                    timeout = min(poll_interval, max(0.0, wait))
+
+    def stop(self):
+        self.running = False
+
+    def close(self):
+        for connection in list(self.connections.values()):
+            self.disconnect(connection)
+        self.selector.unregister(self.server_socket)
+        self.server_socket.close()
+        self.selector.close()
+
+    def _accept(self):
+        try:
+            sock, address = self.server_socket.accept()
+        except BlockingIOError:
+            return
+        sock.setblocking(False)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        connection = ClientConnection(sock, address)
+        self.connections[sock] = connection
+        self.selector.register(sock, selectors.EVENT_READ, connection)
+        if self.on_connect:
+            self.on_connect(connection)
+
+    def _read(self, connection):
+        try:
+            data = connection.sock.recv(RECV_SIZE)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b''  # Reset by the client
+
+        if not data:
+            self.disconnect(connection)
+            return
+
+        frames = connection.decoder.feed(data)
+        if frames:
+            self.on_frames(connection, frames)
+
+    def send(self, connection, data):
+        # Queue data for a client and write what its socket takes right away. Returns False,
+        # dropping the data, when the client already has MAX_OUTBOX bytes waiting
+        if len(connection.outbox) >= MAX_OUTBOX:
+            return False
+        connection.outbox += data
+        self._write(connection)
+        return True
+
+    def _write(self, connection):
+        try:
+            sent = connection.sock.send(connection.outbox)
+        except BlockingIOError:
+            sent = 0
+        except OSError:
+            self.disconnect(connection)
+            return
+        del connection.outbox[:sent]
+        connection.sent_bytes += sent
+
+        # Only wait for writability while there is something left to write
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if connection.outbox else 0)
+        if events != connection.events:
+            connection.events = events
+            self.selector.modify(connection.sock, events, connection)
+
+    def disconnect(self, connection):
+        if self.connections.pop(connection.sock, None) is None:
+            return
+        self.selector.unregister(connection.sock)
+        connection.sock.close()
+        if self.on_disconnect:
+            self.on_disconnect(connection)
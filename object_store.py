@@ -0,0 +1,128 @@
+from array import array
+
+# NumPy is optional: without it the columns are array.array and updates run as one Python loop
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+INITIAL_CAPACITY = 64
+
+# Below this many objects NumPy's per-call overhead costs more than a plain loop saves
+VECTORIZE_THRESHOLD = 48
+
+
+# Falling objects stored as columns (x, y, speed) instead of a list of [x, y, speed] lists.
+# Rows 0..count-1 are live; removed objects are compacted away in place, keeping their order.
+# Every object also carries an id (the renderers pick its color by it) and the tick it was
+# spawned on, which is all a snapshot client needs to follow it (see snapshot.py)
+class ObjectStore:
+    COLUMNS = ('x', 'y', 'speed', 'ids', 'born')
+
+    def __init__(self, object_size, capacity=INITIAL_CAPACITY, use_numpy=None):
+        self.object_size = object_size
+        self.use_numpy = numpy is not None if use_numpy is None else use_numpy
+        self.count = 0
+        self.x = self._column(capacity)
+        self.y = self._column(capacity)
+        self.speed = self._column(capacity)
+        self.ids = self._column(capacity)
+        self.born = self._column(capacity)
+
+    def _column(self, capacity):
+        if self.use_numpy:
+            return numpy.zeros(capacity)
+        return array('d', bytes(8 * capacity))
+
+    def _grow(self):
+        capacity = 2 * len(self.x)
+        for name in self.COLUMNS:
+            column = self._column(capacity)
+            column[:self.count] = getattr(self, name)[:self.count]
+            setattr(self, name, column)
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        # (x, y, speed) for every live object
+        return zip(self.x[:self.count].tolist(), self.y[:self.count].tolist(), self.speed[:self.count].tolist())
+
+    def clear(self):
+        self.count = 0
+
+    def add(self, x, y, speed, object_id=0, born=0):
+        if self.count == len(self.x):
+            self._grow()
+        self.x[self.count] = x
+        self.y[self.count] = y
+        self.speed[self.count] = speed
+        self.ids[self.count] = object_id
+        self.born[self.count] = born
+        self.count += 1
+
+    def step(self, frames, left, top, right, bottom, floor):
+        # Move every object down, then remove the ones that overlap the (left, top, right, bottom)
+        # box or reached floor. Returns (caught, missed) counts
+        if self.use_numpy and self.count >= VECTORIZE_THRESHOLD:
+            return self._step_numpy(frames, left, top, right, bottom, floor)
+        return self._step_loop(frames, left, top, right, bottom, floor)
+
+    def _step_numpy(self, frames, left, top, right, bottom, floor):
+        n = self.count
+        size = self.object_size
+        x = self.x[:n]
+        y = self.y[:n]
+        speed = self.speed[:n]
+
+        y += speed * frames
+        caught = (x + size > left) & (x < right) & (y + size > top) & (y < bottom)
+        missed = ~caught & (y >= floor)
+        keep = ~(caught | missed)
+
+        kept = int(numpy.count_nonzero(keep))
+        if kept != n:
+            x[:kept] = x[keep]
+            y[:kept] = y[keep]
+            speed[:kept] = speed[keep]
+            self.ids[:kept] = self.ids[:n][keep]
+            self.born[:kept] = self.born[:n][keep]
+            self.count = kept
+        missed_count = int(numpy.count_nonzero(missed))
+        return n - kept - missed_count, missed_count
+
+    def _step_loop(self, frames, left, top, right, bottom, floor):
+        size = self.object_size
+        n = self.count
+        if self.use_numpy:
+            # Element access on NumPy arrays is slow: work on plain lists and write the live rows back
+            xs, ys, speeds = self.x[:n].tolist(), self.y[:n].tolist(), self.speed[:n].tolist()
+        else:
+            xs, ys, speeds = self.x, self.y, self.speed  # array.array columns are updated in place
+        ids, born = self.ids, self.born
+        caught = missed = kept = 0
+
+        for i in range(n):
+            x = xs[i]
+            y = ys[i] + speeds[i] * frames
+            if x + size > left and x < right and y + size > top and y < bottom:
+                caught += 1
+            elif y >= floor:
+                missed += 1
+            else:
+                # Compact kept objects towards the front
+                if kept != i:
+                    xs[kept] = x
+                    speeds[kept] = speeds[i]
+                    ids[kept] = ids[i]
+                    born[kept] = born[i]
+                ys[kept] = y
+                kept += 1
+
+        if self.use_numpy:
+            self.y[:kept] = ys[:kept]
+            if kept != n:
+                self.x[:kept] = xs[:kept]
+                self.speed[:kept] = speeds[:kept]
+        self.count = kept
+        return caught, missed
@@ -0,0 +1,232 @@
+import sqlite3
+import threading
+import time
+
+import game_log
+
+# Persistent player progress (high score, upgrade points and upgrade levels) and leaderboard
+# scores in SQLite.
+# The game thread never touches the database: save() copies the values into a dict of pending
+# rows, where later saves for the same player replace earlier ones, and a background writer
+# thread writes the pending rows in one transaction every interval and when the store is closed.
+# The same thread opens the database and reads saved progress, so a load never holds up the
+# first frame either; restore() applies it once it has arrived. Leaderboard scores are saved the
+# same way (keeping each player's best) and load_scores() fills a Leaderboard in the background.
+#
+#   store = ProgressStore('progress.db')
+#   store.start()
+#   store.load('alice')
+#   ...
+#   store.restore('alice', progress)  # True once the saved progress (if any) has been applied
+#   store.save('alice', progress)
+#   store.close()  # Final flush
+
+PROGRESS_DB = 'progress.db'
+FLUSH_INTERVAL = 2.0  # Seconds between writes of pending progress
+LOAD_TIMEOUT = 2.0  # Seconds a menu waits for saved progress before playing without it
+FIELDS = ('high_score', 'upgrade_points', 'bucket_size_level', 'bucket_speed_level', 'lives_level',
+          'catch_value_level')
+
+SCHEMA = f"""CREATE TABLE IF NOT EXISTS progress (
+    player TEXT PRIMARY KEY,
+    {', '.join(f'{field} INTEGER NOT NULL' for field in FIELDS)},
+    updated REAL NOT NULL
+)"""
+UPSERT = (f"INSERT INTO progress (player, {', '.join(FIELDS)}, updated) "
+          f"VALUES ({', '.join('?' * (len(FIELDS) + 2))}) "
+          f"ON CONFLICT (player) DO UPDATE SET {', '.join(f'{field} = excluded.{field}' for field in FIELDS)}, "
+          f"updated = excluded.updated")
+SELECT = f"SELECT {', '.join(FIELDS)} FROM progress WHERE player = ?"
+
+SCORES_SCHEMA = """CREATE TABLE IF NOT EXISTS scores (
+    player TEXT PRIMARY KEY,
+    score INTEGER NOT NULL,
+    achieved REAL NOT NULL
+)"""
+SCORES_INDEX = "CREATE INDEX IF NOT EXISTS scores_by_rank ON scores (score DESC, achieved)"
+SCORE_UPSERT = ("INSERT INTO scores (player, score, achieved) VALUES (?, ?, ?) "
+                "ON CONFLICT (player) DO UPDATE SET score = excluded.score, achieved = excluded.achieved "
+                "WHERE excluded.score > scores.score")
+SELECT_SCORES = "SELECT player, score, achieved FROM scores"
+
+log = game_log.get_logger('progress')
+
+
+def progress_values(progress):
+    return tuple(getattr(progress, field) for field in FIELDS)
+
+
+class ProgressStore:
+    def __init__(self, path=PROGRESS_DB, interval=FLUSH_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.saves = 0  # save() calls that changed something
+        self.scores_saved = 0
+        self.rows_written = 0
+        self.flushes = 0
+        self.errors = 0
+        self.last_error = None
+        self._lock = threading.Lock()  # Only held to swap the pending dicts, never during I/O
+        self._pending = {}  # Player: (values, time saved)
+        self._pending_scores = {}  # Player: (best score, time achieved)
+        self._loads = []  # Players to read, in request order
+        self._leaderboards = []  # Leaderboards waiting for the saved scores
+        self._loaded = {}  # Player: saved values, or None for a new player
+        self._arrived = threading.Condition(self._lock)
+        self._last_saved = {}  # Player: values last passed to the writer (game thread only)
+        self._wake = threading.Event()
+        self._stopped = False
+        self._writer = None
+
+    def start(self):
+        self._writer = threading.Thread(target=self._run, name='progress-writer', daemon=True)
+        self._writer.start()
+
+    def load(self, player):
+        # Read the player's saved progress in the background
+        with self._lock:
+            self._loads.append(player)
+        self._wake.set()
+
+    def restore(self, player, progress, timeout=0.0):
+        # Copy the player's saved progress into progress once it has been read. Returns False while
+        # it has not arrived (waiting up to timeout seconds for it) and True once it has
+        with self._arrived:
+            if player not in self._loaded and timeout > 0:
+                self._arrived.wait_for(lambda: player in self._loaded or self._stopped, timeout)
+            if player not in self._loaded:
+                return False
+            values = self._loaded[player]
+        if values is not None:
+            for field, value in zip(FIELDS, values):
+                setattr(progress, field, value)
+            self._last_saved[player] = values
+        return True
+
+    def save(self, player, progress):
+        # Cheap enough to call every frame: nothing happens unless the values changed
+        values = progress_values(progress)
+        if self._last_saved.get(player) == values:
+            return
+        self._last_saved[player] = values
+        self.saves += 1
+        with self._lock:
+            self._pending[player] = (values, time.time())
+
+    def save_score(self, player, score, achieved):
+        # Keep a finished game's score for the leaderboard; the stored score only ever goes up
+        self.scores_saved += 1
+        with self._lock:
+            pending = self._pending_scores.get(player)
+            if pending is None or score > pending[0]:
+                self._pending_scores[player] = (score, achieved)
+
+    def load_scores(self, leaderboard):
+        # Add every saved score to leaderboard in the background
+        with self._lock:
+            self._leaderboards.append(leaderboard)
+        self._wake.set()
+
+    def close(self):
+        # Stop the writer after it has written everything saved so far
+        if self._writer is None:
+            return
+        with self._lock:
+            self._stopped = True
+        self._wake.set()
+        self._writer.join()
+        self._writer = None
+
+    def _run(self):
+        connection = None
+        try:
+            connection = sqlite3.connect(self.path)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")  # Durable at checkpoints; a crash loses at most the last flush
+            connection.execute(SCHEMA)
+            connection.execute(SCORES_SCHEMA)
+            connection.execute(SCORES_INDEX)
+        except sqlite3.Error as e:
+            self._failed(e)
+            if connection is not None:
+                connection.close()
+                connection = None
+        while True:
+            with self._lock:
+                stopped = self._stopped
+            if connection is not None:
+                self._read(connection)
+                self._flush(connection)
+            elif stopped or self._loads:
+                # No database: report every load as a new player, so nothing waits for it
+                with self._arrived:
+                    for player in self._loads:
+                        self._loaded.setdefault(player, None)
+                    self._loads = []
+                    self._leaderboards = []
+                    self._arrived.notify_all()
+            if stopped:
+                break
+            self._wake.wait(self.interval)
+            self._wake.clear()
+        if connection is not None:
+            connection.close()
+
+    def _read(self, connection):
+        with self._lock:
+            players, self._loads = self._loads, []
+            leaderboards, self._leaderboards = self._leaderboards, []
+        for player in players:
+            try:
+                values = connection.execute(SELECT, (player,)).fetchone()
+            except sqlite3.Error as e:
+                self._failed(e)
+                values = None
+            with self._arrived:
+                self._loaded[player] = values
+                self._arrived.notify_all()
+        # After the players' progress, which the menus wait for
+        for leaderboard in leaderboards:
+            try:
+                leaderboard.load(connection.execute(SELECT_SCORES).fetchall())
+            except sqlite3.Error as e:
+                self._failed(e)
+
+    def _flush(self, connection):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            scores, self._pending_scores = self._pending_scores, {}
+        if not pending and not scores:
+            return
+        try:
+            with connection:
+                connection.executemany(UPSERT, [(player, *values, saved)
+                                                for player, (values, saved) in pending.items()])
+                connection.executemany(SCORE_UPSERT, [(player, score, achieved)
+                                                      for player, (score, achieved) in scores.items()])
+        except sqlite3.Error as e:
+            self._failed(e)
+            with self._lock:
+                # Retry with the next flush, unless the player has been saved again since
+                for player, row in pending.items():
+                    self._pending.setdefault(player, row)
+                for player, row in scores.items():
+                    if player not in self._pending_scores or row[0] > self._pending_scores[player][0]:
+                        self._pending_scores[player] = row
+            return
+        self.flushes += 1
+        self.rows_written += len(pending) + len(scores)
+
+    def _failed(self, error):
+        self.errors += 1
+        self.last_error = str(error)
+
+    def report(self):
+        if not self.saves and not self.scores_saved and not self.errors:
+            return
+        log.info("Progress store: %d saves and %d scores written as %d rows in %d flushes",
+                 self.saves, self.scores_saved, self.rows_written, self.flushes, saves=self.saves,
+                 scores=self.scores_saved, rows_written=self.rows_written, flushes=self.flushes)
+        if self.errors:
+            log.warning("Progress store: %d errors (last: %s)", self.errors, self.last_error, errors=self.errors,
+                        last_error=self.last_error)
@@ -0,0 +1,175 @@
+import struct
+
+# Wire protocol between GameClient and GameServer.
+# Every client message is one fixed-size frame: version byte, message type byte and a 16-bit value
+# (a direction bitmask for movement). TCP may split or coalesce sends, so receivers feed raw
+# bytes into a FrameDecoder and get back every complete frame.
+# Server messages start with the same header, with the value holding the length of the payload
+# that follows it (see MessageDecoder).
+# Over UDP (udp_transport.py) client input travels in input packets instead: a header with a
+# sequence number followed by the newest few client frames, so a lost packet is made up for by
+# the next one. Acks and server messages are sent as one frame or message per datagram.
+
+PROTOCOL_VERSION = 1
+
+FRAME = struct.Struct('!BBH')
+FRAME_SIZE = FRAME.size
+
+# Message types (client to server)
+MSG_MOVE = 1  # value: direction bitmask, move the bucket target once (only sent by old clients)
+MSG_RESTART = 2
+MSG_PAUSE = 3
+MSG_INPUT_STATE = 4  # value: bitmask of the held direction keys, sent whenever it changes
+MSG_JOIN = 5  # value: room id to play in (room servers only, sent first)
+MSG_ACK = 6  # value: low 16 bits of the sequence number of the last snapshot the client applied
+MSG_PING = 8  # value: token the server echoes in a MSG_PONG straight away
+
+MESSAGE_NAMES = {MSG_MOVE: 'move', MSG_RESTART: 'restart', MSG_PAUSE: 'pause', MSG_INPUT_STATE: 'input',
+                 MSG_JOIN: 'join', MSG_ACK: 'ack', MSG_PING: 'ping'}
+
+# UDP input packet: version, MSG_INPUT_PACKET, sequence number of the newest frame, frame count,
+# then (message type, value) per frame, newest first. Frame i has sequence number seq - i
+MSG_INPUT_PACKET = 7
+INPUT_PACKET = struct.Struct('!BBHB')
+INPUT_ENTRY = struct.Struct('!BH')
+SEQ_MODULO = 0x10000
+
+# Message types (server to client)
+MSG_SNAPSHOT = 16  # payload: game state snapshot, see snapshot.py
+MSG_PONG = 17  # payload: PONG, the answer to a MSG_PING
+
+SERVER_MESSAGE_NAMES = {MSG_SNAPSHOT: 'snapshot', MSG_PONG: 'pong'}
+MAX_PAYLOAD = 0xFFFF
+
+# Pong payload: the ping's token, then server counters (modulo 2**32) for load testing: frames
+# received from and rejected for this client, and commands applied and dropped by the game
+PONG = struct.Struct('!HIIII')
+COUNTER_MODULO = 0x100000000
+
+# Direction bits
+UP = 1
+DOWN = 2
+LEFT = 4
+RIGHT = 8
+
+
+def encode_frame(msg_type, value=0):
+    return FRAME.pack(PROTOCOL_VERSION, msg_type, value)
+
+
+def direction_name(mask):
+    # Readable form of a direction bitmask, e.g. 'ul' for UP | LEFT
+    name = ('u' if mask & UP else '') + ('d' if mask & DOWN else '') + \
+           ('l' if mask & LEFT else '') + ('r' if mask & RIGHT else '')
+    return name or '-'
+
+
+def describe_frame(frame):
+    msg_type, value = frame
+    name = MESSAGE_NAMES.get(msg_type, f"type {msg_type}")
+    if msg_type in (MSG_MOVE, MSG_INPUT_STATE):
+        return f"{name} {direction_name(value)}"
+    return f"{name} {value}" if msg_type in (MSG_JOIN, MSG_ACK, MSG_PING) else name
+
+
+def encode_message(msg_type, payload):
+    # Server message: frame header with the payload length, then the payload
+    if len(payload) > MAX_PAYLOAD:
+        raise ValueError(f"payload of {len(payload)} bytes does not fit in one message")
+    return FRAME.pack(PROTOCOL_VERSION, msg_type, len(payload)) + payload
+
+
+def encode_pong(token, frames, rejected, applied, dropped):
+    return encode_message(MSG_PONG, PONG.pack(token, frames % COUNTER_MODULO, rejected % COUNTER_MODULO,
+                                              applied % COUNTER_MODULO, dropped % COUNTER_MODULO))
+
+
+def decode_pong(payload):
+    # (token, frames, rejected, applied, dropped), or None for a malformed payload
+    if len(payload) != PONG.size:
+        return None
+    return PONG.unpack(payload)
+
+
+def encode_input_packet(seq, frames):
+    # frames: the newest (message type, value) frames, newest first
+    return INPUT_PACKET.pack(PROTOCOL_VERSION, MSG_INPUT_PACKET, seq % SEQ_MODULO, len(frames)) + \
+        b''.join(INPUT_ENTRY.pack(msg_type, value) for msg_type, value in frames)
+
+
+def decode_input_packet(data):
+    # (seq, frames newest first), or None for anything that is not a valid input packet
+    if len(data) < INPUT_PACKET.size:
+        return None
+    version, packet_type, seq, count = INPUT_PACKET.unpack_from(data)
+    if version != PROTOCOL_VERSION or packet_type != MSG_INPUT_PACKET or \
+            len(data) != INPUT_PACKET.size + count * INPUT_ENTRY.size:
+        return None
+    frames = list(INPUT_ENTRY.iter_unpack(data[INPUT_PACKET.size:]))
+    if any(msg_type not in MESSAGE_NAMES for msg_type, _ in frames):
+        return None
+    return seq, frames
+
+
+def seq_newer(seq, than):
+    # Whether 16-bit sequence number seq comes after than, allowing for wrap-around
+    return 0 < (seq - than) % SEQ_MODULO < SEQ_MODULO // 2
+
+
+# Splits a byte stream into (message type, value) frames
+class FrameDecoder:
+    def __init__(self):
+        self._buffer = bytearray()
+        self.frames = 0
+        self.rejected = 0  # Frames dropped for a wrong version or unknown message type
+
+    def feed(self, data):
+        # Add received bytes and return every complete frame they finish
+        buffer = self._buffer
+        buffer += data
+        complete = len(buffer) - len(buffer) % FRAME_SIZE
+
+        frames = []
+        for version, msg_type, value in FRAME.iter_unpack(bytes(buffer[:complete])):
+            if version != PROTOCOL_VERSION or msg_type not in MESSAGE_NAMES:
+                self.rejected += 1
+                continue
+            frames.append((msg_type, value))
+
+        del buffer[:complete]
+        self.frames += len(frames)
+        return frames
+
+    @property
+    def pending(self):
+        # Bytes of an incomplete frame waiting for the rest of it
+        return len(self._buffer)
+
+
+# Splits the server's byte stream into (message type, payload) messages
+class MessageDecoder:
+    def __init__(self):
+        self._buffer = bytearray()
+        self.messages = 0
+        self.rejected = 0
+
+    def feed(self, data):
+        buffer = self._buffer
+        buffer += data
+
+        messages = []
+        offset = 0
+        while len(buffer) - offset >= FRAME_SIZE:
+            version, msg_type, length = FRAME.unpack_from(buffer, offset)
+            end = offset + FRAME_SIZE + length
+            if end > len(buffer):
+                break  # Rest of the payload still in flight
+            if version != PROTOCOL_VERSION or msg_type not in SERVER_MESSAGE_NAMES:
+                self.rejected += 1
+            else:
+                messages.append((msg_type, bytes(buffer[offset + FRAME_SIZE:end])))
+            offset = end
+
+        del buffer[:offset]
+        self.messages += len(messages)
+        return messages
@@ -0,0 +1,64 @@
+import math
+from collections import OrderedDict
+
+import pygame
+
+import shading
+
+# The animated backgrounds use sin(time_value * 0.5 + ...), so the wave repeats every 4*pi seconds
+WAVE_PERIOD = 4 * math.pi
+
+# Number of pre-rendered backgrounds per wave period. The wave only moves the colors by
+# 2.5 units over a whole period, so 16 steps are indistinguishable from per-frame rendering
+PHASE_STEPS = 16
+
+
+def quantize_phase(time_value, steps=PHASE_STEPS):
+    # Snap an animation time to the nearest cached phase step.
+    # Returns the step index (for cache keys) and the time value to render that step with
+    step = int(round((time_value % WAVE_PERIOD) / WAVE_PERIOD * steps)) % steps
+    return step, step * WAVE_PERIOD / steps
+
+
+# Bounded LRU cache of pre-rendered surfaces
+class SurfaceCache:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._surfaces = OrderedDict()
+
+    def get(self, key, size, render):
+        # Return the cached surface for key, calling render(surface) to build it on a miss
+        surface = self._surfaces.get(key)
+        if surface is not None:
+            self._surfaces.move_to_end(key)
+            self.hits += 1
+            return surface
+
+        self.misses += 1
+        surface = pygame.Surface(size)
+        render(surface)
+        self._surfaces[key] = surface
+
+        # Evict the least recently used surface once over capacity
+        if len(self._surfaces) > self.capacity:
+            self._surfaces.popitem(last=False)
+        return surface
+
+    def clear(self):
+        self._surfaces.clear()
+
+    def __len__(self):
+        return len(self._surfaces)
+
+
+# Pre-rendered gradient sprites with a border (falling objects, bucket), keyed by color and size.
+# A sprite is only re-rendered when its size changes, e.g. after a bucket size upgrade
+class SpriteCache(SurfaceCache):
+    def shaded(self, color, size, darken, border_width):
+        def render(sprite):
+            shading.fill_shaded(sprite, sprite.get_rect(), color, darken)
+            pygame.draw.rect(sprite, (0, 0, 0), sprite.get_rect(), border_width)
+
+        return self.get((color, size, darken, border_width), size, render)
@@ -0,0 +1,216 @@
+import argparse
+import os
+import random
+import struct
+import sys
+import time
+import zlib
+
+from simulation import GameSimulation, PlayerProgress
+
+# Deterministic recording and replay of games.
+# A recording holds the seed of the game's RNG, the state a game starts from that reset() does not
+# set (upgrades, input keys held over from the last game) and the client commands applied before
+# each tick. Replaying it steps a fresh GameSimulation through the same ticks headless, either in
+# real time or as fast as it goes, and checks the final state against the one recorded.
+#
+#   python replay.py recordings/game-20250101-120000-1.replay --repeat 5
+#
+# File layout (little endian): HEADER, then for every tick with commands the number of ticks since
+# the previous such tick and the command count (both LEB128 varints) followed by the commands as
+# COMMAND entries, then FOOTER with the final state.
+
+MAGIC = b'BKRP'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sBHQHHHHIIIIBB')
+COMMAND = struct.Struct('<BH')
+FOOTER = struct.Struct('<IIiBBIIddI')
+RESUME = 0xFF  # Not a client message: the server's pause menu resumed the game before this tick
+RECORDING_SUFFIX = '.replay'
+
+
+def encode_varint(value, out):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_varint(data, offset):
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def object_digest(state):
+    # CRC32 of every object's position, speed, id and spawn tick, packed so that the result does
+    # not depend on whether the object store uses NumPy
+    count = len(state.object_ids)
+    floats = struct.pack(f'<{3 * count}d', *state.object_x, *state.object_y, *state.object_speed)
+    ints = struct.pack(f'<{2 * count}q', *map(int, state.object_ids), *map(int, state.object_born))
+    return zlib.crc32(ints, zlib.crc32(floats))
+
+
+def final_state(sim, steps):
+    # The values a replay has to reproduce, in FOOTER order
+    state = sim.state()
+    return (steps, state.score, state.lives, state.game_over, state.paused, state.ticks, len(state.object_ids),
+            state.bucket_x, state.bucket_y, object_digest(state))
+
+
+FINAL_STATE_FIELDS = ('steps', 'score', 'lives', 'game_over', 'paused', 'ticks', 'objects',
+                      'bucket_x', 'bucket_y', 'object_digest')
+
+
+# Records one game: create it right after the game is reset, then call record() with each tick's
+# commands before they go to sim.step
+class Recorder:
+    def __init__(self, sim, tick_rate, seed=None):
+        self.seed = seed if seed is not None else random.SystemRandom().getrandbits(64)
+        sim.rng.seed(self.seed)
+        progress = sim.progress
+        self.header = HEADER.pack(MAGIC, FORMAT_VERSION, tick_rate, self.seed,
+                                  progress.bucket_size_level, progress.bucket_speed_level, progress.lives_level,
+                                  progress.catch_value_level, progress.high_score, progress.upgrade_points,
+                                  sim.prv_score, sim.next_object_id, sim.input_directions, sim.paused)
+        self.body = bytearray()
+        self.ticks = 0
+        self.last_recorded = 0  # Tick of the last entry in the body
+        self.pending = []  # Events from outside the simulation, recorded with the next tick
+
+    def resume(self):
+        self.pending.append((RESUME, 0))
+
+    def record(self, commands):
+        if self.pending:
+            commands = self.pending + commands
+            self.pending = []
+        if commands:
+            encode_varint(self.ticks - self.last_recorded, self.body)
+            encode_varint(len(commands), self.body)
+            for msg_type, value in commands:
+                self.body += COMMAND.pack(msg_type, value)
+            self.last_recorded = self.ticks
+        self.ticks += 1
+
+    def finish(self, sim):
+        # The complete recording, ending with the game's current state
+        return self.header + bytes(self.body) + FOOTER.pack(*final_state(sim, self.ticks))
+
+    def save(self, directory, sim):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"game-{time.strftime('%Y%m%d-%H%M%S')}-{sim.game_id}{RECORDING_SUFFIX}")
+        data = self.finish(sim)
+        with open(path, 'wb') as output:
+            output.write(data)
+        return path
+
+
+class Recording:
+    def __init__(self, data):
+        if len(data) < HEADER.size + FOOTER.size:
+            raise ValueError("too short for a recording")
+        (magic, version, self.tick_rate, self.seed, self.bucket_size_level, self.bucket_speed_level,
+         self.lives_level, self.catch_value_level, self.high_score, self.upgrade_points, self.prv_score,
+         self.next_object_id, self.input_directions, self.paused) = HEADER.unpack_from(data)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError("not a recording, or one from an incompatible version")
+        self.body = data[HEADER.size:len(data) - FOOTER.size]
+        self.final = FOOTER.unpack_from(data, len(data) - FOOTER.size)
+        self.steps = self.final[0]
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as recording:
+            return cls(recording.read())
+
+    def commands(self):
+        # (tick, commands) for every tick that had commands
+        body = self.body
+        offset = tick = 0
+        while offset < len(body):
+            delta, offset = decode_varint(body, offset)
+            count, offset = decode_varint(body, offset)
+            tick += delta
+            commands = [COMMAND.unpack_from(body, offset + i * COMMAND.size) for i in range(count)]
+            offset += count * COMMAND.size
+            yield tick, commands
+
+    def new_game(self):
+        # A simulation in the state the recorded game started from
+        progress = PlayerProgress()
+        progress.bucket_size_level = self.bucket_size_level
+        progress.bucket_speed_level = self.bucket_speed_level
+        progress.lives_level = self.lives_level
+        progress.catch_value_level = self.catch_value_level
+        progress.high_score = self.high_score
+        progress.upgrade_points = self.upgrade_points
+        sim = GameSimulation(progress, rng=random.Random(self.seed))
+        sim.prv_score = self.prv_score
+        sim.next_object_id = self.next_object_id
+        sim.input_directions = self.input_directions
+        sim.paused = bool(self.paused)
+        return sim
+
+
+def replay(recording, realtime=False):
+    # Step a new game through the recorded ticks; returns the simulation and the seconds it took
+    sim = recording.new_game()
+    dt = 1.0 / recording.tick_rate
+    entries = recording.commands()
+    next_entry = next(entries, None)
+    start = time.perf_counter()
+    for tick in range(recording.steps):
+        if realtime:
+            time.sleep(max(0.0, start + tick * dt - time.perf_counter()))
+        commands = ()
+        if next_entry is not None and next_entry[0] == tick:
+            commands = next_entry[1]
+            if any(msg_type == RESUME for msg_type, _ in commands):
+                sim.paused = False
+                commands = [command for command in commands if command[0] != RESUME]
+            next_entry = next(entries, None)
+        sim.step(dt, commands)
+    return sim, time.perf_counter() - start
+
+
+def compare(recording, sim):
+    # Names, recorded and replayed values of the final state fields that differ
+    replayed = final_state(sim, recording.steps)
+    return [(name, expected, actual) for name, expected, actual in zip(FINAL_STATE_FIELDS, recording.final, replayed)
+            if expected != actual]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded games headless and verify their final state")
+    parser.add_argument("recordings", nargs="+", help="recording files (GameServer.py --record DIR)")
+    parser.add_argument("--realtime", action="store_true", help="replay at the recorded tick rate")
+    parser.add_argument("--repeat", type=int, default=1, help="replays per recording; the fastest is reported")
+    args = parser.parse_args()
+
+    failed = 0
+    for path in args.recordings:
+        recording = Recording.load(path)
+        seconds = float('inf')
+        for _ in range(args.repeat):
+            sim, elapsed = replay(recording, args.realtime)
+            seconds = min(seconds, elapsed)
+        mismatches = compare(recording, sim)
+        print(f"{path}: {recording.steps} ticks ({recording.steps / recording.tick_rate:.1f} s of play) "
+              f"in {seconds:.3f} s, {recording.steps / max(seconds, 1e-9):,.0f} ticks/s, "
+              f"score {sim.score}, lives {sim.lives}, {len(sim.objects)} objects: "
+              f"{'MISMATCH' if mismatches else 'ok'}")
+        for name, expected, actual in mismatches:
+            print(f"    {name}: recorded {expected}, replayed {actual}")
+        failed += bool(mismatches)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
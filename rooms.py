@@ -0,0 +1,270 @@
+import argparse
+import itertools
+import multiprocessing
+import os
+import queue
+import random
+import time
+
+import game_log
+import settings
+from network_server import InputServer
+from protocol import DOWN, LEFT, MSG_INPUT_STATE, MSG_JOIN, RIGHT, UP
+from simulation import DEFAULT_TICK_RATE, FixedTimestep, GameSimulation, PlayerProgress
+
+# Headless multi-room hosting. Every room is an independent game with its own state, RNG and
+# fixed timestep. A RoomManager spreads rooms over a pool of worker processes (one per core by
+# default) and the front-end routes each client connection to the worker that owns its room.
+
+log = game_log.get_logger('rooms')
+
+DEFAULT_ROOM = 0  # Room for clients that start sending input without joining one
+BOT_INPUT_INTERVAL = 15  # Ticks between direction changes of a bot player
+
+
+# One independent game session
+class Room:
+    def __init__(self, room_id, seed=None, tick_rate=DEFAULT_TICK_RATE, bot=False):
+        self.room_id = room_id
+        self.rng = random.Random(seed)
+        self.sim = GameSimulation(PlayerProgress(), rng=self.rng)
+        self.timestep = FixedTimestep(tick_rate)
+        self.client_directions = {}  # Held direction keys per connected client
+        self.pending_commands = []
+        self.ticks = 0
+
+        # Bot rooms drive themselves with random input and restart when the game ends (benchmarks)
+        self.bot = random.Random(seed) if bot else None
+
+    def join(self, client_id):
+        self.client_directions[client_id] = 0
+
+    def leave(self, client_id):
+        self.client_directions.pop(client_id, None)
+        self.pending_commands.append((MSG_INPUT_STATE, self.combined_directions()))
+
+    @property
+    def empty(self):
+        return not self.client_directions and self.bot is None
+
+    def combined_directions(self):
+        directions = 0
+        for client_directions in self.client_directions.values():
+            directions |= client_directions
+        return directions
+
+    def queue_frames(self, client_id, frames):
+        for msg_type, value in frames:
+            if msg_type == MSG_INPUT_STATE:
+                self.client_directions[client_id] = value
+                value = self.combined_directions()
+            self.pending_commands.append((msg_type, value))
+
+    def update(self, elapsed):
+        # Run the fixed ticks covered by elapsed seconds of real time
+        for _ in range(self.timestep.advance(elapsed)):
+            self.tick()
+
+    def tick(self):
+        commands, self.pending_commands = self.pending_commands, []
+        if self.bot is not None and self.ticks % BOT_INPUT_INTERVAL == 0:
+            commands.append((MSG_INPUT_STATE, self.bot.choice([0, UP, DOWN, LEFT, RIGHT, UP | LEFT, UP | RIGHT])))
+
+        self.sim.step(self.timestep.dt, commands)
+        self.ticks += 1
+
+        if self.bot is not None and self.sim.game_over:
+            self.sim.reset()
+
+
+# Main loop of a worker process: apply routed messages, then update every room it owns
+def run_worker(worker_id, inbox, results, tick_rate):
+    rooms = {}
+    interval = 1.0 / tick_rate
+    busy_time = 0.0
+    loops = 0
+    late_loops = 0
+
+    last_update = time.perf_counter()
+    next_loop = last_update
+    while True:
+        # Apply everything the front-end routed here since the last loop
+        while True:
+            try:
+                message = inbox.get_nowait()
+            except queue.Empty:
+                break
+
+            kind, room_id = message[0], message[1]
+            if kind == 'frames':
+                room = rooms.get(room_id)
+                if room is not None:
+                    room.queue_frames(message[2], message[3])
+            elif kind == 'create':
+                rooms[room_id] = Room(room_id, seed=message[2], tick_rate=tick_rate, bot=message[3])
+            elif kind == 'join':
+                rooms[room_id].join(message[2])
+            elif kind == 'leave':
+                room = rooms.get(room_id)
+                if room is not None:
+                    room.leave(message[2])
+                    if room.empty:
+                        del rooms[room_id]
+            elif kind == 'stats':
+                results.put({'worker': worker_id, 'rooms': len(rooms), 'loops': loops,
+                             'late_loops': late_loops, 'busy_time': busy_time,
+                             'ticks': sum(room.ticks for room in rooms.values())})
+            elif kind == 'stop':
+                return
+
+        start = time.perf_counter()
+        elapsed, last_update = start - last_update, start
+        for room in rooms.values():
+            room.update(elapsed)
+        busy_time += time.perf_counter() - start
+        loops += 1
+
+        # Sleep until the next loop; when running behind, start over from now instead of bursting
+        next_loop += interval
+        delay = next_loop - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            late_loops += 1
+            next_loop = time.perf_counter()
+
+
+# Assigns rooms to a pool of worker processes and routes client messages to them
+class RoomManager:
+    def __init__(self, workers=None, tick_rate=DEFAULT_TICK_RATE):
+        self.tick_rate = tick_rate
+        self.results = multiprocessing.Queue()
+        self.inboxes = []
+        self.processes = []
+        for worker_id in range(workers or os.cpu_count() or 1):
+            inbox = multiprocessing.Queue()
+            process = multiprocessing.Process(target=run_worker, args=(worker_id, inbox, self.results, tick_rate),
+                                              daemon=True)
+            process.start()
+            self.inboxes.append(inbox)
+            self.processes.append(process)
+
+        self.room_workers = {}  # Room id -> worker index
+        self.room_clients = {}  # Room id -> connected client ids
+        self.worker_rooms = [0] * len(self.processes)
+
+    def create_room(self, room_id, seed=None, bot=False):
+        # Place a new room on the worker with the fewest rooms
+        worker = min(range(len(self.worker_rooms)), key=self.worker_rooms.__getitem__)
+        self.room_workers[room_id] = worker
+        self.room_clients[room_id] = set()
+        self.worker_rooms[worker] += 1
+        self.inboxes[worker].put(('create', room_id, seed, bot))
+
+    def join(self, room_id, client_id):
+        if room_id not in self.room_workers:
+            self.create_room(room_id)
+        self.room_clients[room_id].add(client_id)
+        self._send(room_id, ('join', room_id, client_id))
+
+    def leave(self, room_id, client_id):
+        clients = self.room_clients.get(room_id)
+        if clients is None:
+            return
+        clients.discard(client_id)
+        self._send(room_id, ('leave', room_id, client_id))
+        if not clients:
+            # The worker drops the room once its last client is gone
+            self.worker_rooms[self.room_workers.pop(room_id)] -= 1
+            del self.room_clients[room_id]
+
+    def send_frames(self, room_id, client_id, frames):
+        self._send(room_id, ('frames', room_id, client_id, frames))
+
+    def _send(self, room_id, message):
+        self.inboxes[self.room_workers[room_id]].put(message)
+
+    def stats(self, timeout=5.0):
+        # Collect a stats snapshot from every worker
+        for inbox in self.inboxes:
+            inbox.put(('stats', None))
+        return sorted((self.results.get(timeout=timeout) for _ in self.inboxes), key=lambda stats: stats['worker'])
+
+    def stop(self):
+        for inbox in self.inboxes:
+            inbox.put(('stop', None))
+        for process in self.processes:
+            process.join(timeout=5)
+
+
+def serve(host, port, workers, tick_rate):
+    manager = RoomManager(workers, tick_rate)
+    client_ids = itertools.count(1)
+
+    def on_connect(connection):
+        connection.client_id = next(client_ids)
+        connection.room_id = None
+
+    def on_frames(connection, frames):
+        # Forward frames to the connection's room; a join frame switches rooms first
+        batch = []
+        for msg_type, value in frames:
+            if msg_type == MSG_JOIN:
+                if batch:
+                    manager.send_frames(connection.room_id, connection.client_id, batch)
+                    batch = []
+                if connection.room_id is not None:
+                    manager.leave(connection.room_id, connection.client_id)
+                connection.room_id = value
+                manager.join(value, connection.client_id)
+                log.info("Client %s joined room %d", connection, value, client=connection.client_id, room=value)
+                continue
+
+            if connection.room_id is None:
+                connection.room_id = DEFAULT_ROOM
+                manager.join(DEFAULT_ROOM, connection.client_id)
+            batch.append((msg_type, value))
+
+        if batch:
+            manager.send_frames(connection.room_id, connection.client_id, batch)
+
+    def on_disconnect(connection):
+        if connection.room_id is not None:
+            manager.leave(connection.room_id, connection.client_id)
+        log.info("Connection with %s closed", connection.address, client=connection.client_id)
+
+    server = InputServer(host, port, on_frames, on_connect, on_disconnect)
+    log.info("Room server on %s:%s with %d workers at %d ticks/s", host, port, len(manager.processes), tick_rate)
+    log.info("Waiting for client connection...")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        log.info("Server shutting down...")
+    finally:
+        server.close()
+        manager.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless multi-room Bucket Catch Game server")
+    parser.add_argument("--config", default=None,
+                        help=f"settings file with a [server] host and port (default: {settings.CONFIG_FILE} if present)")
+    parser.add_argument("--host", default=None,
+                        help=f"address to listen on (default: {settings.DEFAULT_BIND_HOST})")
+    parser.add_argument("--port", type=int, default=None, help=f"port to listen on (default: {settings.DEFAULT_PORT})")
+    parser.add_argument("--workers", type=settings.positive_int, default=None,
+                        help="worker processes (default: one per core)")
+    parser.add_argument("--tick-rate", type=settings.positive_int, default=DEFAULT_TICK_RATE,
+                        help="simulation ticks per second (default: %(default)s)")
+    parser.add_argument("--log-level", default="info", choices=["debug", "info", "warning", "error"],
+                        help="log level (default: %(default)s)")
+    parser.add_argument("--log-file", default=None, help="write the log to this file instead of the console")
+    parser.add_argument("--log-json", action="store_true", help="write the log as JSON lines")
+    args = parser.parse_args()
+    game_log.setup(args.log_level.upper(), args.log_file, args.log_json)
+    host, port = settings.address(settings.load_config(args.config), 'server', args.host, args.port)
+    serve(host, port, args.workers, args.tick_rate)
+
+
+if __name__ == "__main__":
+    main()
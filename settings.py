@@ -0,0 +1,47 @@
+import argparse
+import configparser
+import os
+
+# Addresses for the server and client, from an optional INI file. Command-line options override it:
+#
+#   [server]
+#   host = 0.0.0.0      ; address to listen on
+#   port = 5000
+#
+#   [client]
+#   host = 192.168.1.20 ; server to connect to
+#   port = 5000
+
+CONFIG_FILE = 'bucket.ini'  # Read from the working directory unless --config names another file
+DEFAULT_PORT = 5000
+DEFAULT_BIND_HOST = '0.0.0.0'  # Servers listen on every interface, loopback included
+DEFAULT_CONNECT_HOST = '127.0.0.1'  # Clients connect to a server on the same machine
+
+
+def load_config(path=None):
+    # A missing default file just means defaults; a missing file named on the command line is an error
+    config = configparser.ConfigParser()
+    if path is not None:
+        with open(path, encoding='utf-8') as config_file:
+            config.read_file(config_file)
+    elif os.path.exists(CONFIG_FILE):
+        config.read(CONFIG_FILE, encoding='utf-8')
+    return config
+
+
+def positive_int(text):
+    # argparse type for counts and rates that must be at least 1
+    value = int(text)
+    if value <= 0:
+        raise argparse.ArgumentTypeError(f"must be a positive integer, got {text}")
+    return value
+
+
+def address(config, section, host=None, port=None):
+    # (host, port) from the options given, else the config section, else the defaults
+    default_host = DEFAULT_BIND_HOST if section == 'server' else DEFAULT_CONNECT_HOST
+    if host is None:
+        host = config.get(section, 'host', fallback=default_host)
+    if port is None:
+        port = config.getint(section, 'port', fallback=DEFAULT_PORT)
+    return host, port
@@ -0,0 +1,77 @@
+import math
+
+import pygame
+
+# NumPy is optional: without it every gradient falls back to one pygame.draw.line per row
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+use_numpy = numpy is not None
+
+
+# Row colors fading from color to color * (1 - darken) from top to bottom
+def shaded_rows(color, height, darken):
+    if use_numpy:
+        factor = numpy.arange(height) / height
+        rows = numpy.outer(1 - factor * darken, numpy.asarray(color, dtype=float))
+        return numpy.minimum(255, rows.astype(int)).astype(numpy.uint8)
+
+    rows = []
+    for i in range(height):
+        factor = i / height
+        rows.append(tuple(min(255, int(c * (1 - factor * darken))) for c in color))
+    return rows
+
+
+# Row colors blending top_color into bottom_color with the animated background wave on top
+def wave_rows(top_color, bottom_color, height, time_value):
+    if use_numpy:
+        factor = numpy.arange(height) / height
+        wave = (numpy.sin(time_value * 0.5 + factor * 2) + 1) / 8
+        top = numpy.asarray(top_color, dtype=float)
+        bottom = numpy.asarray(bottom_color, dtype=float)
+        rows = numpy.outer(1 - factor, top) + numpy.outer(factor, bottom) + (10 * wave)[:, None]
+        return numpy.clip(rows.astype(int), 0, 255).astype(numpy.uint8)
+
+    rows = []
+    for y in range(height):
+        factor = y / height
+        wave = (math.sin(time_value * 0.5 + factor * 2) + 1) / 8
+        rows.append(tuple(min(255, max(0, int(top * (1 - factor) + bottom * factor + 10 * wave)))
+                          for top, bottom in zip(top_color, bottom_color)))
+    return rows
+
+
+# Paint rows[i] across row i of rect, clipped to the surface
+def fill_rows(surface, rect, rows):
+    rect = pygame.Rect(rect)
+    clipped = rect.clip(surface.get_clip())
+    if not clipped.width or not clipped.height:
+        return
+
+    if use_numpy:
+        # Build a one pixel wide column and let SDL stretch it across the rect
+        first = clipped.top - rect.top
+        column = pygame.surfarray.make_surface(rows[None, first:first + clipped.height])
+        surface.blit(pygame.transform.scale(column, clipped.size), clipped)
+        return
+
+    for i in range(clipped.height):
+        color = rows[clipped.top - rect.top + i]
+        pygame.draw.line(surface, tuple(int(c) for c in color),
+                         (clipped.left, clipped.top + i),
+                         (clipped.right - 1, clipped.top + i))
+
+
+# Vertical gradient that darkens towards the bottom (buttons, bucket, objects, health boxes)
+def fill_shaded(surface, rect, color, darken):
+    rect = pygame.Rect(rect)
+    fill_rows(surface, rect, shaded_rows(color, rect.height, darken))
+
+
+# Animated two-color background gradient (game area and menus)
+def fill_wave_gradient(surface, rect, top_color, bottom_color, time_value):
+    rect = pygame.Rect(rect)
+    fill_rows(surface, rect, wave_rows(top_color, bottom_color, rect.height, time_value))
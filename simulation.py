@@ -0,0 +1,293 @@
+import random
+from collections import namedtuple
+
+from object_store import ObjectStore
+from protocol import DOWN, LEFT, MSG_INPUT_STATE, MSG_MOVE, MSG_PAUSE, MSG_RESTART, RIGHT, UP
+
+# Headless game rules for the bucket catch game. Nothing in here depends on pygame, so the
+# simulation can be stepped on machines without a display (CI boxes, benchmarks, soak tests).
+
+# Screen and game area geometry
+SCREEN_WIDTH = 800
+SCREEN_HEIGHT = 600
+BORDER_WIDTH = SCREEN_WIDTH // 6  # 1/6 of screen width for each border
+GAME_AREA_WIDTH = SCREEN_WIDTH - (2 * BORDER_WIDTH)  # 4/6 of screen width for game area
+
+# Game variables
+BUCKET_WIDTH = 80
+BUCKET_HEIGHT = 60
+OBJECT_SIZE = 30
+INITIAL_OBJECT_SPEED = 2
+INITIAL_BUCKET_SPEED = 8
+DIFFICULTY_INCREASE_RATE = 0.1  # Speed increase per second
+MAX_LIVES = 3
+SPAWN_INTERVAL = 1.0  # Seconds between spawned objects
+BUCKET_MOVE_RATE = 16  # Bucket speed steps per second while a direction is held (the old client's key repeat rate)
+
+# Object speeds and the bucket lerp were tuned per frame at 60 fps
+BASE_FRAME_RATE = 60
+BUCKET_LERP_FACTOR = 0.2
+
+# Fixed timestep defaults
+DEFAULT_TICK_RATE = 60  # Simulation ticks per second
+MAX_FRAME_CATCH_UP = 0.25  # Most simulated time (seconds) run for one rendered frame
+
+# Direction bitmasks a client can send (single keys and diagonals)
+MOVE_DIRECTIONS = [UP, DOWN, LEFT, RIGHT, UP | LEFT, UP | RIGHT, DOWN | LEFT, DOWN | RIGHT]
+
+
+# Upgrades, points and high score carried over between games
+class PlayerProgress:
+    UPGRADES = ('bucket_size', 'bucket_speed', 'lives', 'catch_value')
+
+    def __init__(self):
+        self.high_score = 0
+        self.upgrade_points = 0
+        self.bucket_size_level = 1
+        self.bucket_speed_level = 1
+        self.lives_level = 1
+        self.catch_value_level = 1
+
+    @property
+    def bucket_width(self):
+        return BUCKET_WIDTH + (self.bucket_size_level - 1) * 10
+
+    @property
+    def bucket_height(self):
+        return BUCKET_HEIGHT + (self.bucket_size_level - 1) * 5
+
+    @property
+    def bucket_speed(self):
+        return INITIAL_BUCKET_SPEED + (self.bucket_speed_level - 1) * 1
+
+    @property
+    def max_lives(self):
+        return MAX_LIVES + (self.lives_level - 1)
+
+    @property
+    def catch_value(self):
+        return 1 * self.catch_value_level
+
+    def buy_upgrade(self, upgrade):
+        # Spend one upgrade point on the named upgrade. Returns False if no points are left
+        if upgrade not in self.UPGRADES:
+            raise ValueError(f"Unknown upgrade: {upgrade}")
+        if self.upgrade_points <= 0:
+            return False
+        self.upgrade_points -= 1
+        setattr(self, f"{upgrade}_level", getattr(self, f"{upgrade}_level") + 1)
+        return True
+
+
+# Read-only copy of a game after a step, for renderers and snapshots on other threads.
+# Object columns are tuples of x, y, speed, id and spawn tick per object
+class GameState(namedtuple('GameState', ['game_id', 'ticks', 'bucket_x', 'bucket_y', 'prev_bucket_x', 'prev_bucket_y',
+                                         'bucket_width', 'bucket_height', 'last_frames', 'score', 'lives',
+                                         'game_over', 'paused', 'object_x', 'object_y', 'object_speed',
+                                         'object_ids', 'object_born'])):
+    __slots__ = ()
+
+    def interpolated_bucket(self, alpha):
+        # Bucket position alpha of the way from the previous step to the current one
+        return (self.prev_bucket_x + (self.bucket_x - self.prev_bucket_x) * alpha,
+                self.prev_bucket_y + (self.bucket_y - self.prev_bucket_y) * alpha)
+
+    def interpolated_objects(self, alpha):
+        # Object positions alpha of the way from the previous step to the current one
+        back_frames = (1 - alpha) * self.last_frames
+        return [(x, y - speed * back_frames) for x, y, speed in zip(self.object_x, self.object_y, self.object_speed)]
+
+
+# State and rules of one game
+class GameSimulation:
+    def __init__(self, progress=None, rng=None):
+        self.progress = progress if progress is not None else PlayerProgress()
+        self.rng = rng if rng is not None else random.Random()
+        self.game_id = 0  # Incremented on every reset, so renderers can restart their animations
+        self.prv_score = 0  # Score at which the last upgrade point was awarded (kept across games)
+        self.paused = False
+        self.input_directions = 0  # Direction keys the client is holding down
+        self.next_object_id = 1  # Object ids are never reused, not even across games
+        self.objects = ObjectStore(OBJECT_SIZE)  # Falling objects as x, y and speed columns
+        self.profiler = None  # Optional FrameProfiler that step() reports its phases to
+        self.reset()
+
+    def reset(self):
+        # Reset the game state for a new game
+        self.bucket_width = self.progress.bucket_width
+        self.bucket_height = self.progress.bucket_height
+        self.bucket_x = BORDER_WIDTH + (GAME_AREA_WIDTH // 2) - (self.bucket_width // 2)  # Center in game area
+        self.bucket_y = SCREEN_HEIGHT - 100
+        self.prev_bucket_x = self.bucket_x  # Position before the last step, for render interpolation
+        self.prev_bucket_y = self.bucket_y
+        self.last_frames = 0.0  # Base frames covered by the last step
+        self.target_bucket_x = self.bucket_x  # For smooth lerp movement
+        self.target_bucket_y = self.bucket_y
+        self.score = 0
+        self.game_over = False
+        self.objects.clear()
+        self.object_speed_multiplier = 1.0
+        self.bucket_speed_multiplier = 1.0
+        self.lives = self.progress.max_lives
+        self.elapsed = 0.0
+        self.ticks = 0  # Steps that advanced the game (not paused or over)
+        self.time_since_spawn = 0.0
+        self.restart_requested = False
+        self.game_id += 1
+
+    def spawn_object(self):
+        # Spawn a new falling object at a random x position, avoiding corners
+        margin = self.bucket_width // 2  # Prevent spawning too close to edges
+        x = self.rng.randint(BORDER_WIDTH + OBJECT_SIZE + margin, BORDER_WIDTH + GAME_AREA_WIDTH - OBJECT_SIZE - margin)
+        # Objects only ever move by speed per tick, so an object spawned at tick n is at
+        # y = speed * frames * (ticks - n) from then on
+        self.objects.add(x, 0, INITIAL_OBJECT_SPEED * self.object_speed_multiplier, self.next_object_id, self.ticks)
+        self.next_object_id += 1
+
+    def apply_command(self, command):
+        # Apply one decoded client frame, a (message type, value) pair from protocol.py
+        msg_type, value = command
+        if msg_type == MSG_INPUT_STATE:
+            self.input_directions = value
+        elif msg_type == MSG_MOVE:  # Kept for old clients; current ones send MSG_INPUT_STATE
+            self.move_target(value, self.progress.bucket_speed * self.bucket_speed_multiplier)
+        elif msg_type == MSG_RESTART:  # Restart game
+            self.restart_requested = True
+        elif msg_type == MSG_PAUSE:  # Client paused
+            self.paused = True
+
+    def move_target(self, directions, bucket_speed):
+        # Move the bucket target bucket_speed pixels in the given direction bits (opposite bits cancel out)
+        dx = bool(directions & RIGHT) - bool(directions & LEFT)
+        dy = bool(directions & DOWN) - bool(directions & UP)
+        if dx < 0:
+            self.target_bucket_x = max(BORDER_WIDTH, self.target_bucket_x - bucket_speed)
+        elif dx > 0:
+            self.target_bucket_x = min(BORDER_WIDTH + GAME_AREA_WIDTH - self.bucket_width, self.target_bucket_x + bucket_speed)
+        if dy < 0:
+            self.target_bucket_y = max(SCREEN_HEIGHT // 2, self.target_bucket_y - bucket_speed)
+        elif dy > 0:
+            self.target_bucket_y = min(SCREEN_HEIGHT - self.bucket_height, self.target_bucket_y + bucket_speed)
+
+    def step(self, dt, inputs=()):
+        # Advance the game by dt seconds after applying the given client commands
+        profiler = self.profiler
+        for command in inputs:
+            self.apply_command(command)
+
+        if self.restart_requested:
+            self.reset()
+        if profiler is not None:
+            profiler.mark('commands')
+
+        self.prev_bucket_x = self.bucket_x
+        self.prev_bucket_y = self.bucket_y
+        self.last_frames = 0.0
+
+        if self.game_over or self.paused:
+            return
+
+        # Movement was tuned per frame at BASE_FRAME_RATE, so scale it by the number of frames dt covers
+        frames = dt * BASE_FRAME_RATE
+        self.last_frames = frames
+
+        # Spawn new objects periodically
+        self.time_since_spawn += dt
+        if self.time_since_spawn > SPAWN_INTERVAL:
+            self.spawn_object()
+            self.time_since_spawn = 0.0
+
+        # Increase difficulty over time
+        self.elapsed += dt
+        self.object_speed_multiplier = 1.0 + (self.elapsed * DIFFICULTY_INCREASE_RATE)
+        self.bucket_speed_multiplier = 1.0 + (self.elapsed * DIFFICULTY_INCREASE_RATE)
+
+        # Integrate bucket movement from the held direction keys
+        if self.input_directions:
+            bucket_speed = self.progress.bucket_speed * self.bucket_speed_multiplier
+            self.move_target(self.input_directions, bucket_speed * BUCKET_MOVE_RATE * dt)
+        if profiler is not None:
+            profiler.mark('spawn')  # Spawning, difficulty and held keys
+
+        self.update_objects(frames)
+        self.update_bucket(frames)
+        self.ticks += 1
+        if profiler is not None:
+            profiler.mark('physics')  # Movement, collisions and the bucket
+
+    def update_objects(self, frames):
+        # Move objects down, then handle catches and misses with an AABB test against the bucket,
+        # each as one batched operation over the object store
+        caught, missed = self.objects.step(frames, self.bucket_x, self.bucket_y,
+                                           self.bucket_x + self.bucket_width,
+                                           self.bucket_y + self.bucket_height, SCREEN_HEIGHT)
+        for _ in range(caught):
+            self.catch()
+        for _ in range(missed):
+            # Object reached bottom without being caught
+            self.miss()
+
+    def catch(self):
+        progress = self.progress
+        self.score += progress.catch_value
+        if self.score > progress.high_score:
+            progress.high_score = self.score
+
+        # Every 10 points, award an upgrade point
+        if self.score % 10 == 0 and self.score > self.prv_score:
+            progress.upgrade_points += 1
+            self.prv_score = self.score
+
+    def miss(self):
+        self.lives -= 1
+        if self.lives <= 0:
+            self.game_over = True
+
+    def update_bucket(self, frames):
+        # Smoothly move bucket towards target position (lerp), independent of the step size
+        lerp_factor = 1 - (1 - BUCKET_LERP_FACTOR) ** frames
+        self.bucket_x += (self.target_bucket_x - self.bucket_x) * lerp_factor
+        self.bucket_y += (self.target_bucket_y - self.bucket_y) * lerp_factor
+
+        # Ensure bucket stays within screen bounds (adjusted for borders)
+        self.bucket_x = max(BORDER_WIDTH, min(self.bucket_x, BORDER_WIDTH + GAME_AREA_WIDTH - self.bucket_width))
+        self.bucket_y = max(0, min(self.bucket_y, SCREEN_HEIGHT - self.bucket_height))
+
+    def state(self):
+        # Immutable GameState of the game as it is now
+        objects = self.objects
+        n = objects.count
+        return GameState(self.game_id, self.ticks, self.bucket_x, self.bucket_y, self.prev_bucket_x, self.prev_bucket_y,
+                         self.bucket_width, self.bucket_height, self.last_frames, self.score, self.lives,
+                         self.game_over, self.paused, tuple(objects.x[:n].tolist()), tuple(objects.y[:n].tolist()),
+                         tuple(objects.speed[:n].tolist()), tuple(objects.ids[:n].tolist()),
+                         tuple(objects.born[:n].tolist()))
+
+
+# Accumulator for running the simulation at a fixed tick rate, independent of the frame rate.
+# Slow frames run several ticks to catch up; fast frames run none and interpolate instead
+class FixedTimestep:
+    def __init__(self, tick_rate=DEFAULT_TICK_RATE, max_catch_up=MAX_FRAME_CATCH_UP):
+        self.tick_rate = tick_rate
+        self.dt = 1.0 / tick_rate
+        self.max_catch_up = max_catch_up
+        self.accumulator = 0.0
+        self.dropped_time = 0.0  # Simulated time given up because frames were too slow to catch up
+
+    def reset(self):
+        self.accumulator = 0.0
+
+    def advance(self, frame_time):
+        # Add a frame's real time and return how many fixed ticks to run
+        if frame_time > self.max_catch_up:
+            self.dropped_time += frame_time - self.max_catch_up
+            frame_time = self.max_catch_up
+        self.accumulator += frame_time
+        ticks = int(self.accumulator / self.dt)
+        self.accumulator -= ticks * self.dt
+        return ticks
+
+    @property
+    def alpha(self):
+        # Fraction of a tick left in the accumulator, used to interpolate rendering
+        return self.accumulator / self.dt
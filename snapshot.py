@@ -0,0 +1,214 @@
+import struct
+from collections import OrderedDict, deque
+
+from protocol import MAX_PAYLOAD, MSG_SNAPSHOT, encode_message
+from simulation import BASE_FRAME_RATE
+
+# Authoritative game state snapshots sent from the server to its clients.
+# Objects only ever fall at a constant speed, so a client can place every object from its id,
+# x, speed and spawn tick alone. Snapshots therefore never carry object positions: a delta
+# against a snapshot the client acknowledged lists only the objects spawned and removed since,
+# and its size depends on how much happened rather than on how many objects are on screen.
+# A snapshot carries at most MAX_SNAPSHOT_OBJECTS objects, so that a full snapshot always fits
+# in one message; a delta too large for one is sent as a full snapshot instead.
+
+DEFAULT_SNAPSHOT_RATE = 20  # Snapshots per second
+SNAPSHOT_HISTORY = 64  # Snapshots kept on both ends to delta against; older acks get a full snapshot
+INTERPOLATION_DELAY = 0.1  # Seconds clients render behind the newest snapshot (two intervals at 20 Hz)
+TIMELINE_LENGTH = 32  # Received snapshots kept for interpolation
+
+# seq, base seq (0 = full snapshot), tick, tick rate, bucket x/y/width/height, score, lives, flags,
+# spawned object count, removed object count
+HEADER = struct.Struct('!IIIHffHHIBBHH')
+SPAWNED = struct.Struct('!IHfI')  # Object id, x, speed, spawn tick
+REMOVED = struct.Struct('!I')  # Object id
+MAX_SNAPSHOT_OBJECTS = (MAX_PAYLOAD - HEADER.size) // SPAWNED.size  # Objects a full snapshot has room for
+
+FLAG_GAME_OVER = 1
+FLAG_PAUSED = 2
+
+
+# Game state at one tick. objects maps object id -> (x, speed, spawn tick)
+class Snapshot:
+    __slots__ = ('seq', 'tick', 'tick_rate', 'bucket_x', 'bucket_y', 'bucket_width', 'bucket_height',
+                 'score', 'lives', 'flags', 'objects')
+
+    def __init__(self, seq, tick, tick_rate, bucket_x, bucket_y, bucket_width, bucket_height,
+                 score, lives, flags, objects):
+        self.seq = seq
+        self.tick = tick
+        self.tick_rate = tick_rate
+        self.bucket_x = bucket_x
+        self.bucket_y = bucket_y
+        self.bucket_width = bucket_width
+        self.bucket_height = bucket_height
+        self.score = score
+        self.lives = lives
+        self.flags = flags
+        self.objects = objects
+
+    @property
+    def game_over(self):
+        return bool(self.flags & FLAG_GAME_OVER)
+
+    @property
+    def paused(self):
+        return bool(self.flags & FLAG_PAUSED)
+
+    def object_positions(self, tick):
+        # (object id, x, y) of every object at a (possibly fractional) tick of this game
+        frames = BASE_FRAME_RATE / self.tick_rate
+        return [(object_id, x, speed * frames * (tick - born))
+                for object_id, (x, speed, born) in sorted(self.objects.items())]
+
+
+def capture(state, seq, tick_rate):
+    # Snapshot of a GameState (see GameSimulation.state)
+    objects = dict(zip(map(int, state.object_ids),
+                       zip(map(int, state.object_x), state.object_speed, map(int, state.object_born))))
+    if len(objects) > MAX_SNAPSHOT_OBJECTS:
+        # More than one message holds: keep the oldest objects, which have fallen furthest
+        objects = {object_id: objects[object_id] for object_id in sorted(objects)[:MAX_SNAPSHOT_OBJECTS]}
+    flags = (FLAG_GAME_OVER if state.game_over else 0) | (FLAG_PAUSED if state.paused else 0)
+    return Snapshot(seq, state.ticks, tick_rate, state.bucket_x, state.bucket_y, state.bucket_width,
+                    state.bucket_height, state.score, min(255, max(0, state.lives)), flags, objects)
+
+
+def encode_snapshot(snapshot, base=None):
+    # Snapshot message, as a delta against base or as a full snapshot when base is None
+    if base is None:
+        spawned = snapshot.objects.items()
+        removed = ()
+    else:
+        base_objects = base.objects
+        spawned = [item for item in snapshot.objects.items() if item[0] not in base_objects]
+        removed = [object_id for object_id in base_objects if object_id not in snapshot.objects]
+        if HEADER.size + len(spawned) * SPAWNED.size + len(removed) * REMOVED.size > MAX_PAYLOAD:
+            return encode_snapshot(snapshot)  # The delta would not fit in a message; a full snapshot always does
+
+    parts = [HEADER.pack(snapshot.seq, base.seq if base is not None else 0, snapshot.tick, snapshot.tick_rate,
+                         snapshot.bucket_x, snapshot.bucket_y, snapshot.bucket_width, snapshot.bucket_height,
+                         snapshot.score, snapshot.lives, snapshot.flags, len(spawned), len(removed))]
+    parts.extend(SPAWNED.pack(object_id, x, speed, born) for object_id, (x, speed, born) in spawned)
+    parts.extend(REMOVED.pack(object_id) for object_id in removed)
+    return encode_message(MSG_SNAPSHOT, b''.join(parts))
+
+
+# Server side: numbers the snapshots, keeps recent ones and encodes each client's delta against
+# the last snapshot it acknowledged
+class SnapshotHistory:
+    def __init__(self, length=SNAPSHOT_HISTORY):
+        self.length = length
+        self.snapshots = OrderedDict()  # seq -> Snapshot, oldest first
+        self.seq = 0
+        self._messages = {}  # Base seq -> encoded message for the newest snapshot
+
+    def capture(self, state, tick_rate):
+        self.seq += 1
+        snapshot = capture(state, self.seq, tick_rate)
+        self.snapshots[snapshot.seq] = snapshot
+        if len(self.snapshots) > self.length:
+            self.snapshots.popitem(last=False)
+        self._messages = {}
+        return snapshot
+
+    @property
+    def latest(self):
+        return self.snapshots[self.seq] if self.seq else None
+
+    def resolve_ack(self, value):
+        # Full sequence number of a kept snapshot from the 16-bit value of an ack frame
+        for seq in reversed(self.snapshots):
+            if seq & 0xFFFF == value:
+                return seq
+        return None
+
+    def message_for(self, acked_seq):
+        # Newest snapshot encoded for a client that acknowledged acked_seq (None for nothing yet).
+        # Clients acking the same snapshot share one encoding
+        base = self.snapshots.get(acked_seq)
+        key = base.seq if base is not None else 0
+        message = self._messages.get(key)
+        if message is None:
+            message = self._messages[key] = encode_snapshot(self.latest, base)
+        return message
+
+
+# Client side: rebuilds snapshots from full and delta messages and interpolates between them
+class SnapshotReceiver:
+    def __init__(self, length=SNAPSHOT_HISTORY, interpolation_delay=INTERPOLATION_DELAY):
+        self.length = length
+        self.interpolation_delay = interpolation_delay
+        self.snapshots = OrderedDict()  # seq -> Snapshot, for resolving deltas
+        self.timeline = deque(maxlen=TIMELINE_LENGTH)  # (receive time, Snapshot) for rendering
+        self.received = 0
+        self.received_bytes = 0
+        self.full = 0
+        self.unresolved = 0  # Deltas against a snapshot we no longer have
+        self.out_of_order = 0
+
+    @property
+    def latest(self):
+        return self.timeline[-1][1] if self.timeline else None
+
+    def apply(self, payload, now):
+        # Decode one snapshot payload received at time now; returns the Snapshot, or None if its
+        # base is unknown or a newer one was applied already
+        (seq, base_seq, tick, tick_rate, bucket_x, bucket_y, bucket_width, bucket_height,
+         score, lives, flags, spawned, removed) = HEADER.unpack_from(payload)
+        self.received += 1
+        self.received_bytes += len(payload)
+        if self.timeline and seq <= self.timeline[-1][1].seq:
+            self.out_of_order += 1
+            return None  # Overtaken by a newer snapshot (UDP may reorder them)
+
+        if base_seq:
+            base = self.snapshots.get(base_seq)
+            if base is None:
+                self.unresolved += 1
+                return None
+            objects = dict(base.objects)
+        else:
+            self.full += 1
+            objects = {}
+
+        offset = HEADER.size
+        for object_id, x, speed, born in SPAWNED.iter_unpack(payload[offset:offset + spawned * SPAWNED.size]):
+            objects[object_id] = (x, speed, born)
+        offset += spawned * SPAWNED.size
+        for (object_id,) in REMOVED.iter_unpack(payload[offset:offset + removed * REMOVED.size]):
+            objects.pop(object_id, None)
+
+        snapshot = Snapshot(seq, tick, tick_rate, bucket_x, bucket_y, bucket_width, bucket_height,
+                            score, lives, flags, objects)
+        self.snapshots[seq] = snapshot
+        if len(self.snapshots) > self.length:
+            self.snapshots.popitem(last=False)
+        self.timeline.append((now, snapshot))
+        return snapshot
+
+    def view(self, now):
+        # (bucket x, bucket y, object positions, newest snapshot) to draw at time now, interpolated
+        # between the two snapshots around now - interpolation_delay
+        timeline = list(self.timeline)
+        if not timeline:
+            return None
+        render_time = now - self.interpolation_delay
+
+        older = newer = timeline[-1]
+        for i in range(len(timeline) - 1, 0, -1):
+            if timeline[i - 1][0] <= render_time:
+                older, newer = timeline[i - 1], timeline[i]
+                break
+        else:
+            older = newer = timeline[0]
+
+        (t0, a), (t1, b) = older, newer
+        alpha = min(1.0, (render_time - t0) / (t1 - t0)) if t1 > t0 else 1.0
+        if alpha >= 1.0 or b.tick < a.tick:
+            a, alpha = b, 1.0  # Caught up with the newer snapshot, or a new game started in between
+
+        bucket_x = a.bucket_x + (b.bucket_x - a.bucket_x) * alpha
+        bucket_y = a.bucket_y + (b.bucket_y - a.bucket_y) * alpha
+        objects = a.object_positions(a.tick + (b.tick - a.tick) * alpha)
+        return bucket_x, bucket_y, objects, timeline[-1][1]
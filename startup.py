@@ -0,0 +1,48 @@
+import os
+import threading
+import time
+
+# Startup time measurement: seconds from process launch to milestones such as the first frame.
+# The launch time comes from the kernel (/proc/self/stat, 10 ms resolution) so that the interpreter
+# start and module imports are included; without /proc it falls back to when this module was
+# imported, so import it first.
+#
+#   elapsed = startup.mark('first frame')  # None when the milestone was already reached
+
+IMPORTED = time.perf_counter()
+
+
+def process_start():
+    # perf_counter() value at process launch
+    try:
+        with open('/proc/self/stat') as stat_file:
+            # Fields after the command name, which is in parentheses and may contain spaces
+            fields = stat_file.read().rpartition(')')[2].split()
+        with open('/proc/uptime') as uptime_file:
+            uptime = float(uptime_file.read().split()[0])
+        now = time.perf_counter()
+        started = int(fields[19]) / os.sysconf('SC_CLK_TCK')  # starttime, in clock ticks since boot
+    except (OSError, ValueError, IndexError, AttributeError):
+        return IMPORTED
+    return min(IMPORTED, now - (uptime - started))
+
+
+PROCESS_START = process_start()
+
+_lock = threading.Lock()
+_marks = {}  # Milestone name: seconds after launch
+
+
+def mark(event):
+    # Seconds from launch to the first time event happens; None on later calls
+    elapsed = time.perf_counter() - PROCESS_START
+    with _lock:
+        if event in _marks:
+            return None
+        _marks[event] = elapsed
+    return elapsed
+
+
+def marks():
+    with _lock:
+        return dict(_marks)
@@ -0,0 +1,8 @@
+# Summary statistics shared by the profiler, the client's latency report and the load tools
+
+
+def percentile(samples, fraction):
+    # Nearest-rank percentile of an already sorted list of samples, 0.0 when there are none
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(fraction * len(samples)))]
@@ -0,0 +1,116 @@
+import json
+import os
+from collections import OrderedDict
+
+import pygame
+
+TEXT_CACHE_SIZE = 128  # Rendered strings kept before the least recently used one is dropped
+FONT_PATH_CACHE = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+                               'bucket-catch', 'fonts.json')  # Font files SysFont resolved, kept between runs
+
+
+# Font files resolved by pygame's system font lookup, persisted so that later runs open the file
+# directly instead of scanning the system fonts again. Each (name, bold, italic) maps to the file
+# (None for pygame's default font) and whether bold or italic has to be synthesised.
+class FontPathCache:
+    def __init__(self, path=FONT_PATH_CACHE):
+        self.path = path
+        self._paths = None  # Loaded on first use
+
+    def _load(self):
+        self._paths = {}
+        try:
+            with open(self.path, encoding='utf-8') as cache_file:
+                self._paths = json.load(cache_file)
+        except (OSError, ValueError):
+            pass  # No cache yet, or an unreadable one that the next save replaces
+
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temporary = self.path + '.tmp'
+            with open(temporary, 'w', encoding='utf-8') as cache_file:
+                json.dump(self._paths, cache_file, indent=1, sort_keys=True)
+            os.replace(temporary, self.path)
+        except OSError:
+            pass  # A read-only home only costs the system font scan next time
+
+    def open(self, name, size, bold=False, italic=False):
+        if self._paths is None:
+            self._load()
+        key = f"{name}|{int(bold)}|{int(italic)}"
+        entry = self._paths.get(key)
+        # Resolve again when the font file has been removed since it was cached
+        if entry is None or (entry[0] is not None and not os.path.exists(entry[0])):
+            entry = pygame.font.SysFont(name, size, bold=bold, italic=italic,
+                                        constructor=lambda path, _size, set_bold, set_italic:
+                                        [path, set_bold, set_italic])
+            self._paths[key] = entry
+            self._save()
+        path, set_bold, set_italic = entry
+        font = pygame.font.Font(path, size)
+        font.set_bold(set_bold)
+        font.set_italic(set_italic)
+        return font
+
+
+# Resolves each (name, size, bold, italic) font only once
+class FontRegistry:
+    def __init__(self, paths=None):
+        self._fonts = {}
+        self.paths = paths if paths is not None else FontPathCache()
+
+    def get(self, name, size, bold=False, italic=False):
+        key = (name, size, bold, italic)
+        font = self._fonts.get(key)
+        if font is None:
+            font = self.paths.open(name, size, bold=bold, italic=italic)
+            self._fonts[key] = font
+        return font
+
+    def clear(self):
+        self._fonts.clear()
+
+
+# LRU cache of rendered text surfaces, so a string is only rendered again when its value changes
+class TextCache:
+    def __init__(self, capacity=TEXT_CACHE_SIZE):
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._surfaces = OrderedDict()
+
+    # Same arguments as font.render, with the font first
+    def render(self, font, text, antialias, color):
+        key = (font, text, antialias, color)
+        surface = self._surfaces.get(key)
+        if surface is not None:
+            self._surfaces.move_to_end(key)
+            self.hits += 1
+            return surface
+
+        self.misses += 1
+        surface = font.render(text, antialias, color)
+        self._surfaces[key] = surface
+        if len(self._surfaces) > self.capacity:
+            self._surfaces.popitem(last=False)
+        return surface
+
+    def clear(self):
+        self._surfaces.clear()
+
+    def __len__(self):
+        return len(self._surfaces)
+
+
+# Shared instances used by the game screens
+fonts = FontRegistry()
+text_cache = TextCache()
+
+
+def get_font(name, size, bold=False, italic=False):
+    return fonts.get(name, size, bold=bold, italic=italic)
+
+
+def render_text(font, text, antialias, color):
+    return text_cache.render(font, text, antialias, color)
@@ -0,0 +1,258 @@
+import heapq
+import random
+import selectors
+import socket
+import threading
+import time
+from collections import deque
+
+from protocol import FRAME, FRAME_SIZE, MESSAGE_NAMES, PROTOCOL_VERSION, SEQ_MODULO, decode_input_packet, \
+    encode_input_packet, seq_newer
+
+# Optional UDP transport between GameClient and GameServer.
+# A lost TCP segment holds back every frame behind it until it is retransmitted. Over UDP each input
+# packet instead repeats the newest REDUNDANCY frames, so a lost packet is recovered from the next
+# one, and the server drops packets older than what it already applied. The client also repeats its
+# newest packet every RESEND_INTERVAL, which covers losing the last packet and keeps the peer alive.
+
+REDUNDANCY = 4  # Frames per input packet
+RESEND_INTERVAL = 0.1  # Seconds between repeats of the newest input packet
+PEER_TIMEOUT = 5.0  # Seconds of silence after which the server forgets a client
+RECV_SIZE = 65535
+
+
+# Packet loss and latency simulator for testing over loopback. Packets handed to sendto() are
+# dropped with probability loss, or delivered after latency plus up to jitter seconds (so
+# jitter can also reorder them) by a background thread
+class NetworkConditions:
+    def __init__(self, loss=0.0, latency=0.0, jitter=0.0, seed=None):
+        self.loss = loss
+        self.latency = latency
+        self.jitter = jitter
+        self.rng = random.Random(seed)
+        self.sent = 0
+        self.dropped = 0
+        self._queue = []  # Heap of (delivery time, order, socket, data, address)
+        self._order = 0
+        self._wakeup = threading.Condition()
+        if latency or jitter:
+            threading.Thread(target=self._deliver, daemon=True).start()
+
+    def sendto(self, sock, data, address):
+        self.sent += 1
+        if self.loss and self.rng.random() < self.loss:
+            self.dropped += 1
+            return
+        if not (self.latency or self.jitter):
+            sock.sendto(data, address)
+            return
+        with self._wakeup:
+            delivery = time.perf_counter() + self.latency + self.rng.uniform(0, self.jitter)
+            heapq.heappush(self._queue, (delivery, self._order, sock, data, address))
+            self._order += 1
+            self._wakeup.notify()
+
+    def _deliver(self):
+        with self._wakeup:
+            while True:
+                delay = self._queue[0][0] - time.perf_counter() if self._queue else None
+                if delay is None or delay > 0:
+                    self._wakeup.wait(delay)
+                    continue
+                _, _, sock, data, address = heapq.heappop(self._queue)
+                try:
+                    sock.sendto(data, address)
+                except OSError:
+                    pass  # Socket closed while the packet was in flight
+
+
+# One client of a UdpInputServer, identified by its address. Compatible with ClientConnection
+# as far as GameServer's callbacks go
+class UdpPeer:
+    def __init__(self, address):
+        self.address = address
+        self.directions = 0  # Direction keys this client is holding
+        self.last_seq = None  # Sequence number of the newest frame applied
+        self.last_seen = time.perf_counter()
+        self.outbox = b''  # Datagrams are never queued
+        self.sent_bytes = 0
+        self.frames = 0  # Frames applied, from input packets and single frames
+        self.recovered = 0  # Frames applied from the repeats in a later packet
+        self.lost = 0  # Frames that were lost together with all their repeats
+        self.duplicates = 0  # Packets already applied (including the client's periodic repeats)
+        self.stale = 0  # Packets older than the newest applied one
+        self.rejected = 0
+
+    def __repr__(self):
+        return f"{self.address[0]}:{self.address[1]}"
+
+    def receive(self, data):
+        # Frames from one datagram that have not been applied yet, oldest first
+        if len(data) == FRAME_SIZE:
+            version, msg_type, value = FRAME.unpack(data)
+            if version == PROTOCOL_VERSION and msg_type in MESSAGE_NAMES:
+                self.frames += 1
+                return [(msg_type, value)]
+            self.rejected += 1
+            return []
+
+        packet = decode_input_packet(data)
+        if packet is None:
+            self.rejected += 1
+            return []
+        seq, frames = packet
+        if self.last_seq is not None and not seq_newer(seq, self.last_seq):
+            if seq == self.last_seq:
+                self.duplicates += 1
+            else:
+                self.stale += 1
+            return []
+
+        # Frames after the newest applied one. From a new peer (or one re-created after a timeout or a
+        # server restart) the repeated frames may have been applied already, so only the newest is
+        if self.last_seq is None:
+            self.last_seq = seq
+            self.frames += 1
+            return frames[:1]
+        new = (seq - self.last_seq) % SEQ_MODULO
+        if new > len(frames):
+            self.lost += new - len(frames)
+            new = len(frames)
+        self.recovered += new - 1
+        self.last_seq = seq
+        self.frames += new
+        return frames[new - 1::-1]
+
+
+# Server for UDP input packets with the same interface as network_server.InputServer: frames that
+# have not been applied yet are handed to on_frames(peer, frames) and send() answers a peer
+class UdpInputServer:
+    def __init__(self, host, port, on_frames, on_connect=None, on_disconnect=None, conditions=None):
+        self.on_frames = on_frames
+        self.on_connect = on_connect
+        self.on_disconnect = on_disconnect
+        self.connections = {}  # Address -> UdpPeer
+        self.running = False
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.sock.setblocking(False)
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.sock, selectors.EVENT_READ)
+        self.conditions = conditions  # Optional NetworkConditions for everything sent
+
+    @property
+    def address(self):
+        return self.sock.getsockname()
+
+    def serve_forever(self, poll_interval=0.5, on_poll=None):
+        # on_poll() as for InputServer.serve_forever
+        self.running = True
+        timeout = poll_interval
+        next_expiry = time.perf_counter() + PEER_TIMEOUT
+        while self.running:
+            if self.selector.select(timeout=timeout):
+                self._read()
+
+            now = time.perf_counter()
+            if now >= next_expiry:
+                next_expiry = now + 1.0
+                for peer in [peer for peer in self.connections.values() if now - peer.last_seen > PEER_TIMEOUT]:
+                    self.disconnect(peer)
+
+            timeout = poll_interval
+            if on_poll:
+                wait = on_poll()
+                if wait is not None:
+                    timeout = min(poll_interval, max(0.0, wait))
+
+    def stop(self):
+        self.running = False
+
+    def close(self):
+        for peer in list(self.connections.values()):
+            self.disconnect(peer)
+        self.selector.close()
+        self.sock.close()
+
+    def _read(self):
+        # Drain every datagram that has arrived
+        while True:
+            try:
+                data, address = self.sock.recvfrom(RECV_SIZE)
+            except ConnectionResetError:
+                continue  # ICMP error for an earlier send (Windows reports those here)
+            except OSError:
+                return
+
+            peer = self.connections.get(address)
+            if peer is None:
+                peer = self.connections[address] = UdpPeer(address)
+                if self.on_connect:
+                    self.on_connect(peer)
+            peer.last_seen = time.perf_counter()
+
+            frames = peer.receive(data)
+            if frames:
+                self.on_frames(peer, frames)
+
+    def send(self, peer, data):
+        try:
+            if self.conditions is not None:
+                self.conditions.sendto(self.sock, data, peer.address)
+            else:
+                self.sock.sendto(data, peer.address)
+        except OSError:
+            return False
+        peer.sent_bytes += len(data)
+        return True
+
+    def disconnect(self, peer):
+        if self.connections.pop(peer.address, None) is not None and self.on_disconnect:
+            self.on_disconnect(peer)
+
+
+# Client side: numbers the frames and sends each one in a packet together with the frames before
+# it. Sends go through an optional NetworkConditions
+class InputPacketSender:
+    def __init__(self, sock, address, conditions=None):
+        self.sock = sock
+        self.address = address
+        self.conditions = conditions
+        self.lock = threading.Lock()
+        self.seq = 0
+        self.recent = deque(maxlen=REDUNDANCY)  # Newest frames, newest first
+        self.packet = None  # Newest packet, repeated every RESEND_INTERVAL
+        self.packets = 0
+
+    def _sendto(self, data):
+        if self.conditions is not None:
+            self.conditions.sendto(self.sock, data, self.address)
+        else:
+            self.sock.sendto(data, self.address)
+
+    def send(self, msg_type, value=0):
+        with self.lock:
+            self.seq = (self.seq + 1) % SEQ_MODULO
+            self.recent.appendleft((msg_type, value))
+            self.packet = encode_input_packet(self.seq, list(self.recent))
+            self._sendto(self.packet)
+            self.packets += 1
+
+    def send_frame(self, frame):
+        # Unsequenced single frame, e.g. a snapshot ack (a newer ack supersedes a lost one)
+        with self.lock:
+            self._sendto(frame)
+
+    def resend(self):
+        with self.lock:
+            if self.packet is not None:
+                self._sendto(self.packet)
+
+    def run_resends(self, stopped):
+        # Repeat the newest packet until the stopped event is set (run on a background thread)
+        while not stopped.wait(RESEND_INTERVAL):
+            try:
+                self.resend()
+            except OSError:
+                return